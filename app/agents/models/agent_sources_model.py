@@ -31,6 +31,14 @@ class VideoSource(BaseModel):
     description: str | None = None
 
 
+class AnalysisInfo(BaseModel):
+    """What the video analysis cache needs to reuse this source, stages maps each finished stage to its version"""
+
+    mediaSha256: str | None = None
+    pipelineVersion: int | None = None
+    stages: dict[str, int] = {}
+
+
 class AgentSource(BaseModel):
     _id: ObjectId | None = None
     id: str | None = None
@@ -45,4 +53,7 @@ class AgentSource(BaseModel):
     assets: Optional[dict[str, CloudStorageDataDict]] = None
     status: Optional[str] = None
     statusDescription: Optional[str] = None
+    progress: Optional[float] = None  # 0 to 100 while a pipeline runs
     relationId: Optional[str] = None
+    timings: Optional[dict[str, float]] = None  # seconds per pipeline stage, plus total
+    analysis: Optional[AnalysisInfo] = None
@@ -1,10 +1,20 @@
 # from app.modules.mongo.mongo import db
 
 from dataclouder_mongo import mongo
+from pymongo import IndexModel
 
 from app.agents.models.agent_sources_model import AgentSource
+from app.modules.mongo import indexes
+from app.modules.mongo.collection_registry import CollectionName
 
-collection = "agent_sources"
+collection = CollectionName.AGENT_SOURCES
+
+indexes.register_id_index(collection)
+indexes.register_indexes(
+    collection,
+    [IndexModel("video.idPlatform"), IndexModel("analysis.mediaSha256")],
+    [{"name": "by video platform id", "filter": {"video.idPlatform": "0"}}, {"name": "by media hash", "filter": {"analysis.mediaSha256": "0"}}],
+)
 
 
 def save_source(source: AgentSource, return_dict: bool = False) -> dict | AgentSource:
@@ -15,11 +25,27 @@ def save_source(source: AgentSource, return_dict: bool = False) -> dict | AgentS
         return AgentSource(**response["document"])
 
 
+def get_source(source_id: str) -> AgentSource | None:
+    document = mongo.get_document_by_id(collection, source_id)
+    return AgentSource(**document) if document else None
+
+
+def update_source_fields(source_id: str, fields: dict) -> bool:
+    """$set of a few fields (status, progress...) without rewriting frames and transcription"""
+    return mongo.update_with_operator(source_id, collection, {"$set": fields})
+
+
 def get_resource(resource_id: str) -> dict:
     return mongo.get_document(collection, {"type": "notion"})
 
 
 def find_sources_by_video_platform_id(platform_id: str) -> list[dict]:
+    """Raw documents (ObjectId _id), serialize them with MongoJSONResponse"""
+    db = mongo.get_db()
+    return list(db[collection].find({"video.idPlatform": platform_id}))
+
+
+def find_sources_by_media_hash(media_sha256: str) -> list[dict]:
+    """Raw documents of the sources analysed from the same media bytes"""
     db = mongo.get_db()
-    result = list(db[collection].find({"video.idPlatform": platform_id}))
-    return mongo.transform_object_id_to_string(result)
+    return list(db[collection].find({"analysis.mediaSha256": media_sha256}))
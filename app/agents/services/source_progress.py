@@ -0,0 +1,92 @@
+"""Progress reporting of an AgentSource while a pipeline runs
+
+Status messages are small `$set` patches of status, statusDescription and progress, debounced: the first message goes
+out at once, the ones that arrive within SOURCE_PROGRESS_INTERVAL_SECONDS (1) are merged and only the last one is
+written when the interval is over. The whole document (frames, transcription...) is written only at stage boundaries
+with checkpoint(). Writes go through the io pool one at a time, so a late patch can't overwrite a newer full save.
+
+    progress = ProgressReporter(agent_source)
+    progress.report("Extracting frames...", progress=40)
+    await progress.checkpoint("Frames uploaded", progress=60)     # full save, includes the pending patch
+    await progress.close()                                        # on failure, before writing the error
+"""
+
+import asyncio
+import os
+import time
+from collections.abc import Callable
+
+from app.agents.models.agent_sources_model import AgentSource
+from app.agents.repositories import agent_sources_repository
+from app.modules.execution import executors
+
+
+def get_interval() -> float:
+    return float(os.getenv("SOURCE_PROGRESS_INTERVAL_SECONDS", 1))
+
+
+class ProgressReporter:
+    def __init__(
+        self,
+        agent_source: AgentSource,
+        interval_seconds: float | None = None,
+        patch_writer: Callable[[str, dict], object] = agent_sources_repository.update_source_fields,
+        full_writer: Callable[[AgentSource], object] = agent_sources_repository.save_source,
+    ) -> None:
+        self.agent_source = agent_source
+        self.interval_seconds = get_interval() if interval_seconds is None else interval_seconds
+        self.patch_writer = patch_writer
+        self.full_writer = full_writer
+        self.pending: dict = {}
+        self.last_write = 0.0
+        self.writes = {"patch": 0, "full": 0}
+        self._flush_task: asyncio.Task | None = None
+        self._write_lock = asyncio.Lock()
+
+    def report(self, description: str, progress: float | None = None, status: str | None = None) -> None:
+        """Updates the in-memory source and schedules a debounced patch, never blocks"""
+        self.agent_source.statusDescription = description
+        self.pending["statusDescription"] = description
+        if progress is not None:
+            self.agent_source.progress = self.pending["progress"] = round(progress, 1)
+        if status is not None:
+            self.agent_source.status = self.pending["status"] = status
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(max(self.last_write + self.interval_seconds - time.monotonic(), 0))
+        await self.flush()
+
+    async def flush(self) -> None:
+        async with self._write_lock:
+            patch, self.pending = self.pending, {}
+            if patch:
+                await executors.run_io(self.patch_writer, self.agent_source.id, patch)
+                self.writes["patch"] += 1
+                self.last_write = time.monotonic()
+
+    async def close(self) -> None:
+        """Drops the pending patch and waits for a write in flight. Call it before another writer takes over the source
+        (the job failure handler), a debounced patch landing later would overwrite its status"""
+        self.pending = {}
+        task, self._flush_task = self._flush_task, None
+        if task is not None and not task.done():
+            if not self._write_lock.locked():
+                task.cancel()  # still sleeping, nothing was sent
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def checkpoint(self, description: str | None = None, progress: float | None = None, status: str | None = None) -> AgentSource:
+        """Stage boundary, writes the whole source with the latest status"""
+        if description is not None:
+            self.agent_source.statusDescription = description
+        if progress is not None:
+            self.agent_source.progress = round(progress, 1)
+        if status is not None:
+            self.agent_source.status = status
+        async with self._write_lock:
+            self.pending = {}  # a scheduled flush wakes up to an empty patch
+            await executors.run_io(self.full_writer, self.agent_source.model_copy(deep=True))
+            self.writes["full"] += 1
+            self.last_write = time.monotonic()
+        return self.agent_source
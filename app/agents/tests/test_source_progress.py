@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from app.agents.models.agent_sources_model import AgentSource
+from app.agents.services.source_progress import ProgressReporter
+from app.modules.execution import executors
+from app.modules.execution.executors import ExecutorSettings
+
+
+@pytest.fixture(autouse=True)
+def pools():  # noqa: ANN201
+    executors.set_pools(executors.create_pools(ExecutorSettings(io_threads=2, cpu_workers=1, cpu_mode="thread")))
+    yield
+    executors.shutdown()
+
+
+class Writes:
+    def __init__(self) -> None:
+        self.log: list[tuple[str, object]] = []
+
+    def patch(self, source_id: str, fields: dict) -> None:
+        self.log.append(("patch", dict(fields)))
+
+    def full(self, source: AgentSource) -> None:
+        self.log.append(("full", source.statusDescription))
+
+
+def _reporter(writes: Writes, interval: float) -> ProgressReporter:
+    return ProgressReporter(AgentSource(id="source-1"), interval, writes.patch, writes.full)
+
+
+def test_reports_are_debounced_into_small_patches() -> None:
+    writes = Writes()
+
+    async def main() -> ProgressReporter:
+        progress = _reporter(writes, 0.05)
+        for step in range(20):
+            progress.report(f"step {step}", progress=step * 5)
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.1)
+        return progress
+
+    progress = asyncio.run(main())
+    patches = [fields for kind, fields in writes.log if kind == "patch"]
+    assert 2 <= len(patches) <= 5
+    assert patches[0] == {"statusDescription": "step 0", "progress": 0}
+    assert patches[-1] == {"statusDescription": "step 19", "progress": 95}
+    assert progress.writes == {"patch": len(patches), "full": 0}
+
+
+def test_checkpoint_writes_the_whole_source_and_drops_the_pending_patch() -> None:
+    writes = Writes()
+
+    async def main() -> AgentSource:
+        progress = _reporter(writes, 10)
+        progress.report("uploading", progress=10)
+        await asyncio.sleep(0.01)  # first patch goes out at once
+        progress.report("extracting frames", progress=20, status="processing")
+        source = await progress.checkpoint("frames uploaded", progress=50)
+        await asyncio.sleep(0.01)
+        return source
+
+    source = asyncio.run(main())
+    assert writes.log == [("patch", {"statusDescription": "uploading", "progress": 10}), ("full", "frames uploaded")]
+    assert source.progress == 50 and source.status == "processing"
+
+
+def test_close_drops_the_pending_patch_before_the_failure_is_written() -> None:
+    writes = Writes()
+
+    async def main() -> None:
+        progress = _reporter(writes, 0.05)
+        progress.report("uploading", progress=10)
+        await asyncio.sleep(0.01)
+        progress.report("extracting frames", progress=20)  # debounced, would land after the failure
+        await progress.close()
+        writes.log.append(("failure", "Error during analysis"))
+        await asyncio.sleep(0.1)
+
+    asyncio.run(main())
+    assert writes.log == [("patch", {"statusDescription": "uploading", "progress": 10}), ("failure", "Error during analysis")]
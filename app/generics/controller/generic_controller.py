@@ -1,9 +1,10 @@
 from dataclouder_core.exception import handler_exception
-from dataclouder_core.models.models import FiltersConfig
 from fastapi import APIRouter
 
 from app.generics.models.generic_model import GenericModel
 from app.generics.services import generic_service
+from app.modules.mongo.mongo_json import MongoJSONResponse
+from app.modules.mongo.pagination import PageFiltersConfig
 
 router = APIRouter(prefix="/api/generics", tags=["Generics"])
 
@@ -20,16 +21,15 @@ async def get_generic_by_id(id: str) -> dict:
     return {"id": id}
 
 
-@router.post("/")
+@router.post("/", response_class=MongoJSONResponse)
 @handler_exception
-async def save_generic(generic: GenericModel) -> GenericModel:
+async def save_generic(generic: GenericModel) -> MongoJSONResponse:
     generic = generic_service.save_generic(generic)
-    return generic
+    return MongoJSONResponse(generic)
 
 
-@router.post("/query")
+@router.post("/query", response_class=MongoJSONResponse)
 @handler_exception
-async def find_filtered_generics(filters: FiltersConfig) -> list:
-    print(filters)
+async def find_filtered_generics(filters: PageFiltersConfig) -> MongoJSONResponse:
     generic = generic_service.find_filtered_generics(filters)
-    return generic
+    return MongoJSONResponse(generic)
@@ -2,30 +2,30 @@ from bson import ObjectId
 from dataclouder_core.models.models import FiltersConfig
 
 from app.generics.models.generic_model import GenericModel
-from app.modules.mongo.mongo import db
+from app.modules.mongo import pagination
+from app.modules.mongo.collection_registry import CollectionName
+from app.modules.mongo.mongo import get_collection
+from app.modules.mongo.pagination import PageResult
 
-col_name = "generics"
+col_name = CollectionName.GENERICS
 
 
 def find_generics(id: str) -> dict:
     """Get words"""
-    collection = db[col_name]
+    collection = get_collection(col_name)
     result = collection.find_one({"_id": ObjectId(id)})
 
     return result
 
 
-def find_filtered_generics(filters: FiltersConfig) -> list:
-    """Get words"""
-    print(filters)
-    collection = db[col_name]
-    result = collection.find(filters.model_dump())
-    return result
+def find_filtered_generics(filters: FiltersConfig) -> PageResult:
+    """Get a page of generics, send nextCursor back in filters.cursor to get the next one"""
+    return pagination.paginate(col_name, filters)
 
 
 def save_generic(generic: GenericModel) -> GenericModel:
     """Save generic insert if not exists, or update if exists"""
-    collection = db[col_name]
+    collection = get_collection(col_name)
 
     # Convert the model to dict for manipulation
     generic_dict = generic.model_dump()
@@ -40,12 +40,11 @@ def save_generic(generic: GenericModel) -> GenericModel:
         query = {"_id": ObjectId()}
 
     result = collection.find_one_and_replace(query, generic_dict, upsert=True, return_document=True)
-    result["_id"] = str(result["_id"])
     return result
 
 
 def delete_generic(id: str) -> GenericModel:
     """Delete generic"""
-    collection = db[col_name]
+    collection = get_collection(col_name)
     collection.delete_one({"_id": ObjectId(id)})
     return {"message": "Generic deleted"}
@@ -2,13 +2,14 @@ from dataclouder_core.models.models import FiltersConfig
 
 from app.generics.models.generic_model import GenericModel
 from app.generics.repositories import generic_repository
+from app.modules.mongo.pagination import PageResult
 
 
 def save_generic(generic: GenericModel) -> GenericModel:
     return generic_repository.save_generic(generic)
 
 
-def find_filtered_generics(filters: FiltersConfig) -> GenericModel:
+def find_filtered_generics(filters: FiltersConfig) -> PageResult:
     return generic_repository.find_filtered_generics(filters)
 
 
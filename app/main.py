@@ -1,3 +1,4 @@
+import logging
 import os
 
 from dotenv import load_dotenv
@@ -13,13 +14,17 @@ from fastapi.responses import HTMLResponse
 from app.generics.controller import generic_controller
 from app.image_gen import image_gen
 from app.llm import llm_router
-from app.modules.mongo import mongo_controller
+from app.modules.execution import execution_controller, executors
+from app.modules.jobs import worker
+from app.modules.mongo import collection_registry, indexes, mongo_cache, mongo_client, mongo_controller
 from app.tts import tts_router
 
 # TODO: refactor this come from another service. 
 # from app.video_analizer.controllers import tiktok_controller, video_analizer_controller
 # from app.video_generator.controller import video_controller
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI()
 
 app.add_middleware(
@@ -36,6 +41,7 @@ app.include_router(tts_router.router)
 app.include_router(image_gen.router)
 app.include_router(llm_router.router)
 app.include_router(mongo_controller.router)
+app.include_router(execution_controller.router)
 app.include_router(agent_controller.router)
 app.include_router(generic_controller.router)
 app.include_router(tts_controller.router)
@@ -44,6 +50,38 @@ app.include_router(tts_controller.router)
 # app.include_router(video_controller.router)
 
 
+@app.on_event("startup")
+def ensure_mongo_indexes() -> None:
+    indexes.load_repositories()
+    # unknown names fail here and not on the first request that uses them
+    collection_registry.check_names([*indexes.get_registered_indexes(), *mongo_cache.get_collections()])
+    if indexes.should_ensure_on_startup():
+        logger.info("Mongo collections %s", collection_registry.ensure_collections())
+        logger.info("Mongo indexes %s", indexes.ensure_indexes())
+
+
+@app.on_event("startup")
+async def start_job_worker() -> None:
+    # JOB_WORKER_IN_APP=false when the workers run as their own service (python -m app.modules.jobs.worker)
+    if await worker.start_in_app():
+        logger.info("Job worker started in the API process")
+
+
+@app.on_event("shutdown")
+async def stop_job_worker() -> None:
+    await worker.stop_in_app()
+
+
+@app.on_event("shutdown")
+async def close_mongo_clients() -> None:
+    await mongo_client.close_clients()
+
+
+@app.on_event("shutdown")
+def shutdown_executors() -> None:
+    executors.shutdown()
+
+
 @app.get("/", response_class=HTMLResponse)
 def read_root() -> str:
     return "<h1>welcome</h1> <br> <a href='/docs'>docs</a>"
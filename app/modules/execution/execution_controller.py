@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+
+from app.modules.execution import executors
+
+router = APIRouter()
+
+
+@router.get("/api/execution/pool_stats", tags=["Execution"])
+async def get_pool_stats() -> dict:
+    """Busy workers, queue depth, saturation and wait/run times of the io (threads) and cpu (processes) pools"""
+    return executors.get_stats()
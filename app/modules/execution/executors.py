@@ -0,0 +1,162 @@
+"""Execution pools for the blocking work of async handlers
+
+Blocking calls must never run on the event loop: network and disk I/O (yt-dlp downloads, GCS uploads, Groq, requests)
+go to a thread pool with run_io(), CPU bound media work (cv2 frame loops, moviepy/ffmpeg, Demucs) to a process pool with
+run_cpu(). Functions sent to the process pool and their arguments must be picklable, module level functions only.
+
+    frames = await executors.run_cpu(video_extraction.extract_frames_from_video_bytes, video_bytes)
+    data = await executors.run_io(storage.upload_bytes_to_ref, ref, media_bytes)
+
+Settings (env): EXECUTOR_IO_THREADS (16), EXECUTOR_CPU_WORKERS (cpu count), EXECUTOR_CPU_MODE (process, or thread where
+processes can't be spawned). get_stats() reports queue depth, busy workers, saturation and wait/run times of each pool,
+served at /api/execution/pool_stats.
+"""
+
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Literal, ParamSpec, TypeVar
+
+from pydantic import BaseModel
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+
+class ExecutorSettings(BaseModel):
+    io_threads: int = 16
+    cpu_workers: int = os.cpu_count() or 2
+    cpu_mode: Literal["process", "thread"] = "process"
+
+    @classmethod
+    def from_env(cls) -> "ExecutorSettings":
+        values = {}
+        for field in cls.model_fields:
+            value = os.getenv(f"EXECUTOR_{field.upper()}")
+            if value is not None and value != "":
+                values[field] = value
+        return cls(**values)
+
+
+def _timed(fn: Callable[..., T], args: tuple, kwargs: dict) -> tuple[float, float, T]:
+    """Runs in the worker, wall clock so the start time is comparable across processes"""
+    started = time.time()
+    result = fn(*args, **kwargs)
+    return started, time.time(), result
+
+
+class ExecutionPool:
+    """Executor plus counters, tasks are FIFO so everything in flight beyond max_workers is waiting in the queue"""
+
+    def __init__(self, name: str, executor: Executor, max_workers: int) -> None:
+        self.name = name
+        self.executor = executor
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.submitted = 0
+            self.completed = 0
+            self.failed = 0
+            self.max_in_flight = 0
+            self.wait_seconds = 0.0
+            self.max_wait_seconds = 0.0
+            self.run_seconds = 0.0
+
+    @property
+    def in_flight(self) -> int:
+        return self.submitted - self.completed - self.failed
+
+    async def run(self, fn: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+        with self._lock:
+            self.submitted += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        submitted = time.time()
+        try:
+            started, finished, result = await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(_timed, fn, args, kwargs))
+        except BaseException:
+            with self._lock:
+                self.failed += 1
+            raise
+        with self._lock:
+            self.completed += 1
+            self.wait_seconds += max(started - submitted, 0.0)
+            self.max_wait_seconds = max(self.max_wait_seconds, started - submitted)
+            self.run_seconds += finished - started
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_flight = self.in_flight
+            done = self.completed or 1
+            return {
+                "maxWorkers": self.max_workers,
+                "busy": min(in_flight, self.max_workers),
+                "queued": max(in_flight - self.max_workers, 0),
+                "saturation": round(min(in_flight, self.max_workers) / self.max_workers, 3),
+                "maxInFlight": self.max_in_flight,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avgWaitMs": round(self.wait_seconds / done * 1000, 3),
+                "maxWaitMs": round(self.max_wait_seconds * 1000, 3),
+                "avgRunMs": round(self.run_seconds / done * 1000, 3),
+            }
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_pools(settings: ExecutorSettings) -> dict[str, ExecutionPool]:
+    io = ExecutionPool("io", ThreadPoolExecutor(settings.io_threads, thread_name_prefix="io"), settings.io_threads)
+    if settings.cpu_mode == "thread":
+        cpu_executor: Executor = ThreadPoolExecutor(settings.cpu_workers, thread_name_prefix="cpu")
+    else:
+        # spawn, forking a process with running threads (the io pool, pymongo monitors) can deadlock the child
+        cpu_executor = ProcessPoolExecutor(settings.cpu_workers, mp_context=multiprocessing.get_context("spawn"))
+    return {"io": io, "cpu": ExecutionPool("cpu", cpu_executor, settings.cpu_workers)}
+
+
+_pools: dict[str, ExecutionPool] | None = None
+_pools_lock = threading.Lock()
+
+
+def get_pools() -> dict[str, ExecutionPool]:
+    global _pools  # noqa: PLW0603
+    with _pools_lock:
+        if _pools is None:
+            _pools = create_pools(ExecutorSettings.from_env())
+        return _pools
+
+
+def set_pools(pools: dict[str, ExecutionPool] | None) -> None:
+    """Replace the process pools (thread mode in tests), None creates them again from the env on next use"""
+    global _pools  # noqa: PLW0603
+    _pools = pools
+
+
+async def run_io(fn: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+    return await get_pools()["io"].run(fn, *args, **kwargs)
+
+
+async def run_cpu(fn: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+    return await get_pools()["cpu"].run(fn, *args, **kwargs)
+
+
+def get_stats() -> dict:
+    return {name: pool.stats() for name, pool in get_pools().items()}
+
+
+def shutdown() -> None:
+    global _pools  # noqa: PLW0603
+    with _pools_lock:
+        pools, _pools = _pools, None
+    for pool in (pools or {}).values():
+        pool.shutdown()
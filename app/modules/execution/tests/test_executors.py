@@ -0,0 +1,72 @@
+import asyncio
+import operator
+import threading
+import time
+
+import pytest
+
+from app.modules.execution import executors
+from app.modules.execution.executors import ExecutorSettings
+
+
+@pytest.fixture
+def pools():  # noqa: ANN201
+    pools = executors.create_pools(ExecutorSettings(io_threads=2, cpu_workers=1, cpu_mode="thread"))
+    executors.set_pools(pools)
+    yield pools
+    executors.shutdown()
+
+
+def test_blocking_calls_leave_the_event_loop(pools: dict) -> None:
+    ticks: list[float] = []
+
+    async def ticker() -> None:
+        for _ in range(5):
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    async def main() -> list:
+        return await asyncio.gather(executors.run_io(time.sleep, 0.1), executors.run_cpu(sum, [1, 2, 3]), ticker())
+
+    _, total, _ = asyncio.run(main())
+    assert total == 6
+    assert len(ticks) == 5 and ticks[-1] - ticks[0] < 0.09  # the loop kept running during the sleep
+
+
+def test_stats_report_queue_depth_and_saturation(pools: dict) -> None:
+    release = threading.Event()
+    seen: dict = {}
+
+    async def main() -> None:
+        tasks = [asyncio.ensure_future(executors.run_io(release.wait, 2)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        seen.update(executors.get_stats()["io"])
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert seen["busy"] == 2 and seen["queued"] == 1 and seen["saturation"] == 1.0
+    stats = executors.get_stats()["io"]
+    assert stats["completed"] == 3 and stats["busy"] == 0 and stats["maxInFlight"] == 3 and stats["maxWaitMs"] > 0
+
+
+def test_failures_are_counted_and_raised(pools: dict) -> None:
+    with pytest.raises(ZeroDivisionError):
+        asyncio.run(executors.run_cpu(operator.truediv, 1, 0))
+    assert executors.get_stats()["cpu"]["failed"] == 1
+
+
+def test_process_pool_runs_picklable_functions() -> None:
+    pools = executors.create_pools(ExecutorSettings(io_threads=1, cpu_workers=1))
+    try:
+        assert asyncio.run(pools["cpu"].run(operator.mul, 6, 7)) == 42
+    finally:
+        for pool in pools.values():
+            pool.shutdown()
+
+
+def test_settings_from_env(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("EXECUTOR_IO_THREADS", "4")
+    monkeypatch.setenv("EXECUTOR_CPU_MODE", "thread")
+    settings = ExecutorSettings.from_env()
+    assert settings.io_threads == 4 and settings.cpu_mode == "thread"
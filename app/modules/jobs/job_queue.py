@@ -0,0 +1,207 @@
+"""Durable job queue, Mongo backed (jobs collection) with an in-memory twin for tests and local runs
+
+    {_id, type, payload, status: queued|running|done|failed, attempts, maxAttempts, runAt,
+     leaseOwner, leaseExpiresAt, heartbeatAt, completedStages: [...], stageState: {stage: result}, result, error}
+
+A worker claims a job atomically (find_one_and_update) and owns it while its lease is alive, heartbeats extend the
+lease. A running job with an expired lease (the worker crashed or was killed) can be claimed again, the new worker
+skips the stages in completedStages and reuses their stageState. Every write of a running job is conditioned on
+leaseOwner so a worker that lost its lease can't overwrite the new owner.
+
+    job = job_queue.get_queue().enqueue("video_analysis", {"url": url, "agentSourceId": source_id})
+"""
+
+import copy
+import threading
+import uuid
+from datetime import UTC, datetime, timedelta
+from typing import Protocol
+
+from pydantic import BaseModel, ConfigDict, Field
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+
+from app.modules.mongo import indexes
+from app.modules.mongo.collection_registry import CollectionName
+from app.modules.mongo.mongo import get_collection
+
+col_name = CollectionName.JOBS
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+indexes.register_indexes(
+    col_name,
+    [IndexModel([("status", ASCENDING), ("type", ASCENDING), ("runAt", ASCENDING)]), IndexModel([("status", ASCENDING), ("leaseExpiresAt", ASCENDING)])],
+    [
+        {"name": "claimable jobs", "filter": {"status": QUEUED, "type": {"$in": ["t"]}, "runAt": {"$lte": 0}}, "sort": [("runAt", ASCENDING)]},
+        {"name": "expired leases", "filter": {"status": RUNNING, "leaseExpiresAt": {"$lt": 0}}},
+    ],
+)
+
+
+def utcnow() -> datetime:
+    """Naive UTC, the same value pymongo returns without tz_aware so memory and Mongo queues compare alike"""
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+class Job(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex, alias="_id")
+    type: str
+    payload: dict = {}
+    status: str = QUEUED
+    attempts: int = 0
+    maxAttempts: int = 3
+    runAt: datetime = Field(default_factory=utcnow)
+    leaseOwner: str | None = None
+    leaseExpiresAt: datetime | None = None
+    heartbeatAt: datetime | None = None
+    completedStages: list[str] = []
+    stageState: dict = {}
+    result: object | None = None
+    error: str | None = None
+    createdAt: datetime = Field(default_factory=utcnow)
+    updatedAt: datetime = Field(default_factory=utcnow)
+
+
+class JobQueue(Protocol):
+    def enqueue(self, type: str, payload: dict, max_attempts: int = 3, run_at: datetime | None = None) -> Job: ...
+    def claim(self, worker_id: str, types: list[str], lease_seconds: float) -> Job | None: ...
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float) -> bool: ...
+    def complete_stage(self, job_id: str, worker_id: str, stage: str, result: object) -> bool: ...
+    def complete(self, job_id: str, worker_id: str, result: object = None) -> bool: ...
+    def fail(self, job_id: str, worker_id: str, error: str, retry_at: datetime | None = None) -> bool: ...
+    def get(self, job_id: str) -> Job | None: ...
+
+
+def _claim_filter(types: list[str], now: datetime) -> dict:
+    return {"type": {"$in": types}, "$or": [{"status": QUEUED, "runAt": {"$lte": now}}, {"status": RUNNING, "leaseExpiresAt": {"$lt": now}}]}
+
+
+def _fail_update(error: str, retry_at: datetime | None, now: datetime) -> dict:
+    if retry_at is None:
+        return {"status": FAILED, "error": error, "leaseOwner": None, "leaseExpiresAt": None, "updatedAt": now}
+    return {"status": QUEUED, "error": error, "runAt": retry_at, "leaseOwner": None, "leaseExpiresAt": None, "updatedAt": now}
+
+
+class MongoJobQueue:
+    def enqueue(self, type: str, payload: dict, max_attempts: int = 3, run_at: datetime | None = None) -> Job:
+        job = Job(type=type, payload=payload, maxAttempts=max_attempts, runAt=run_at or utcnow())
+        get_collection(col_name).insert_one(job.model_dump(by_alias=True))
+        return job
+
+    def claim(self, worker_id: str, types: list[str], lease_seconds: float) -> Job | None:
+        now = utcnow()
+        document = get_collection(col_name).find_one_and_update(
+            _claim_filter(types, now),
+            {
+                "$set": {"status": RUNNING, "leaseOwner": worker_id, "leaseExpiresAt": now + timedelta(seconds=lease_seconds), "heartbeatAt": now, "updatedAt": now},
+                "$inc": {"attempts": 1},
+            },
+            sort=[("runAt", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+        return Job(**document) if document else None
+
+    def _update_owned(self, job_id: str, worker_id: str, update: dict) -> bool:
+        return get_collection(col_name).update_one({"_id": job_id, "status": RUNNING, "leaseOwner": worker_id}, update).matched_count == 1
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        now = utcnow()
+        return self._update_owned(job_id, worker_id, {"$set": {"leaseExpiresAt": now + timedelta(seconds=lease_seconds), "heartbeatAt": now}})
+
+    def complete_stage(self, job_id: str, worker_id: str, stage: str, result: object) -> bool:
+        return self._update_owned(job_id, worker_id, {"$addToSet": {"completedStages": stage}, "$set": {f"stageState.{stage}": result, "updatedAt": utcnow()}})
+
+    def complete(self, job_id: str, worker_id: str, result: object = None) -> bool:
+        return self._update_owned(job_id, worker_id, {"$set": {"status": DONE, "result": result, "leaseOwner": None, "leaseExpiresAt": None, "updatedAt": utcnow()}})
+
+    def fail(self, job_id: str, worker_id: str, error: str, retry_at: datetime | None = None) -> bool:
+        return self._update_owned(job_id, worker_id, {"$set": _fail_update(error, retry_at, utcnow())})
+
+    def get(self, job_id: str) -> Job | None:
+        document = get_collection(col_name).find_one({"_id": job_id})
+        return Job(**document) if document else None
+
+
+class MemoryJobQueue:
+    """Same semantics as MongoJobQueue in a dict, jobs are copied in and out like documents"""
+
+    def __init__(self) -> None:
+        self.jobs: dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def enqueue(self, type: str, payload: dict, max_attempts: int = 3, run_at: datetime | None = None) -> Job:
+        job = Job(type=type, payload=copy.deepcopy(payload), maxAttempts=max_attempts, runAt=run_at or utcnow())
+        with self._lock:
+            self.jobs[job.id] = job
+        return job.model_copy(deep=True)
+
+    def claim(self, worker_id: str, types: list[str], lease_seconds: float) -> Job | None:
+        now = utcnow()
+        with self._lock:
+            claimable = [
+                job
+                for job in self.jobs.values()
+                if job.type in types and ((job.status == QUEUED and job.runAt <= now) or (job.status == RUNNING and job.leaseExpiresAt < now))
+            ]
+            if not claimable:
+                return None
+            job = min(claimable, key=lambda job: job.runAt)
+            job.status, job.leaseOwner, job.heartbeatAt, job.updatedAt = RUNNING, worker_id, now, now
+            job.leaseExpiresAt = now + timedelta(seconds=lease_seconds)
+            job.attempts += 1
+            return job.model_copy(deep=True)
+
+    def _update_owned(self, job_id: str, worker_id: str, **values: object) -> bool:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status != RUNNING or job.leaseOwner != worker_id:
+                return False
+            for key, value in values.items():
+                setattr(job, key, copy.deepcopy(value))
+            return True
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        now = utcnow()
+        return self._update_owned(job_id, worker_id, leaseExpiresAt=now + timedelta(seconds=lease_seconds), heartbeatAt=now)
+
+    def complete_stage(self, job_id: str, worker_id: str, stage: str, result: object) -> bool:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status != RUNNING or job.leaseOwner != worker_id:
+                return False
+            if stage not in job.completedStages:
+                job.completedStages.append(stage)
+            job.stageState[stage] = copy.deepcopy(result)
+            return True
+
+    def complete(self, job_id: str, worker_id: str, result: object = None) -> bool:
+        return self._update_owned(job_id, worker_id, status=DONE, result=result, leaseOwner=None, leaseExpiresAt=None, updatedAt=utcnow())
+
+    def fail(self, job_id: str, worker_id: str, error: str, retry_at: datetime | None = None) -> bool:
+        return self._update_owned(job_id, worker_id, **_fail_update(error, retry_at, utcnow()))
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return job.model_copy(deep=True) if job else None
+
+
+_queue: JobQueue | None = None
+
+
+def get_queue() -> JobQueue:
+    global _queue  # noqa: PLW0603
+    if _queue is None:
+        _queue = MongoJobQueue()
+    return _queue
+
+
+def set_queue(queue: JobQueue | None) -> None:
+    """Replace the process queue (MemoryJobQueue in tests), None goes back to Mongo"""
+    global _queue  # noqa: PLW0603
+    _queue = queue
@@ -0,0 +1,103 @@
+"""Small DAG of async stages, independent branches run concurrently
+
+    graph = StageGraph()
+    graph.add("download", download)                                  # fn(results) -> value
+    graph.add("upload", upload, after=["download"])
+    graph.add("frames", frames, after=["download"])
+    run = await graph.run(["upload", "frames"], stages=context)       # StageRunner, a JobContext checkpoints
+
+Stages are evaluated lazily from the targets: a stage runs once, when a stage after it needs its result. Every stage
+with checkpoint=True goes through stages.run_stage(name, fn), so in a retried job a checkpointed stage returns its
+stored result and the stages before it are not run at all (the media download of an already uploaded video).
+Stages with checkpoint=False hold values that can't be stored (bytes) and only run when needed.
+
+Blocking work inside a stage must leave the event loop (executors.run_io / run_cpu), otherwise the branches don't overlap.
+"""
+
+import asyncio
+import inspect
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+
+from app.modules.jobs.worker import InlineStages, StageRunner
+
+StageFn = Callable[[dict[str, object]], Awaitable[object]]
+
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    fn: StageFn
+    after: tuple[str, ...] = ()
+    checkpoint: bool = True
+
+
+@dataclass
+class StageTimer:
+    """Wall time of every stage that ran, reused lists the checkpointed stages restored from a previous attempt"""
+
+    seconds: dict[str, float] = field(default_factory=dict)
+    reused: list[str] = field(default_factory=list)
+    total: float = 0.0
+
+
+@dataclass
+class GraphRun:
+    results: dict[str, object]
+    timer: StageTimer
+
+
+class StageGraph:
+    def __init__(self) -> None:
+        self.stages: dict[str, Stage] = {}
+
+    def add(self, name: str, fn: StageFn, after: list[str] | None = None, checkpoint: bool = True) -> None:
+        missing = [dependency for dependency in after or [] if dependency not in self.stages]
+        if name in self.stages or missing:
+            # Stages are added after their dependencies, so the graph can't have cycles
+            raise ValueError(f"stage {name} already added" if name in self.stages else f"stage {name} depends on unknown stages {missing}")
+        self.stages[name] = Stage(name, fn, tuple(after or ()), checkpoint)
+
+    async def run(self, targets: list[str] | None = None, stages: StageRunner | None = None, on_done: Callable[[str, object], object] | None = None) -> GraphRun:
+        """Run the targets (every stage by default) and what they need, on_done(name, result) is called (and awaited when
+        it's a coroutine) as each one finishes"""
+        runner = stages or InlineStages()
+        timer = StageTimer()
+        tasks: dict[str, asyncio.Task] = {}
+        started = time.perf_counter()
+
+        def resolve(name: str) -> asyncio.Task:
+            if name not in tasks:
+                tasks[name] = asyncio.ensure_future(execute(self.stages[name]))
+            return tasks[name]
+
+        async def execute(stage: Stage) -> object:
+            ran = False
+
+            async def call() -> object:
+                nonlocal ran
+                ran = True
+                inputs = dict(zip(stage.after, await asyncio.gather(*(resolve(dependency) for dependency in stage.after)), strict=True))
+                stage_started = time.perf_counter()
+                result = await stage.fn(inputs)
+                timer.seconds[stage.name] = time.perf_counter() - stage_started
+                return result
+
+            result = await runner.run_stage(stage.name, call) if stage.checkpoint else await call()
+            if not ran:
+                timer.reused.append(stage.name)
+            if on_done and inspect.isawaitable(outcome := on_done(stage.name, result)):
+                await outcome
+            return result
+
+        names = targets or list(self.stages)
+        try:
+            values = await asyncio.gather(*(resolve(name) for name in names))
+        finally:
+            for task in tasks.values():  # a failed branch stops the others
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+        timer.total = time.perf_counter() - started
+        results = {name: task.result() for name, task in tasks.items() if not task.cancelled() and task.exception() is None}
+        return GraphRun(results | dict(zip(names, values, strict=True)), timer)
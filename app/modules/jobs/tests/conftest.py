@@ -0,0 +1,7 @@
+"""Pytest configuration file for jobs module tests"""
+
+import os
+import sys
+
+# Add the src directory to Python path for test discovery
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../../")))
@@ -0,0 +1,57 @@
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+from app.modules.jobs import job_queue
+from app.modules.jobs.job_queue import DONE, QUEUED, RUNNING, MemoryJobQueue, MongoJobQueue, utcnow
+
+
+def test_claim_is_exclusive_until_the_lease_expires() -> None:
+    queue = MemoryJobQueue()
+    job = queue.enqueue("analysis", {"url": "u"})
+
+    claimed = queue.claim("worker-a", ["analysis"], lease_seconds=60)
+    assert claimed.id == job.id and claimed.status == RUNNING and claimed.attempts == 1
+    assert queue.claim("worker-b", ["analysis"], lease_seconds=60) is None
+
+    queue.jobs[job.id].leaseExpiresAt = utcnow() - timedelta(seconds=1)  # worker-a crashed
+    reclaimed = queue.claim("worker-b", ["analysis"], lease_seconds=60)
+    assert reclaimed.leaseOwner == "worker-b" and reclaimed.attempts == 2
+
+
+def test_writes_of_a_worker_without_the_lease_are_ignored() -> None:
+    queue = MemoryJobQueue()
+    job = queue.enqueue("analysis", {})
+    queue.claim("worker-a", ["analysis"], lease_seconds=60)
+
+    assert queue.complete_stage(job.id, "worker-a", "download", {"ref": "x"})
+    assert not queue.complete_stage(job.id, "worker-b", "upload", {})
+    assert not queue.heartbeat(job.id, "worker-b", 60)
+    assert queue.complete(job.id, "worker-a", {"ok": True})
+    assert not queue.complete(job.id, "worker-a")
+
+    stored = queue.get(job.id)
+    assert stored.status == DONE and stored.completedStages == ["download"] and stored.stageState == {"download": {"ref": "x"}}
+
+
+def test_failed_job_waits_for_its_retry_time() -> None:
+    queue = MemoryJobQueue()
+    job = queue.enqueue("analysis", {})
+    queue.claim("worker-a", ["analysis"], lease_seconds=60)
+
+    queue.fail(job.id, "worker-a", "boom", retry_at=utcnow() + timedelta(minutes=5))
+    assert queue.get(job.id).status == QUEUED
+    assert queue.claim("worker-a", ["analysis"], lease_seconds=60) is None
+    assert queue.claim("worker-a", ["other"], lease_seconds=60) is None
+
+
+def test_mongo_claim_is_one_atomic_update() -> None:
+    collection = MagicMock()
+    collection.find_one_and_update.return_value = None
+
+    with patch("app.modules.jobs.job_queue.get_collection", return_value=collection):
+        assert MongoJobQueue().claim("worker-a", ["analysis"], lease_seconds=60) is None
+
+    query, update = collection.find_one_and_update.call_args.args
+    assert query["$or"][0]["status"] == QUEUED and query["$or"][1]["status"] == RUNNING
+    assert update["$inc"] == {"attempts": 1} and update["$set"]["leaseOwner"] == "worker-a"
+    assert job_queue.col_name == "jobs"
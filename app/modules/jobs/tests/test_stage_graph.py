@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from app.modules.jobs.job_queue import MemoryJobQueue
+from app.modules.jobs.stage_graph import StageGraph
+from app.modules.jobs.worker import JobContext
+
+
+def _pipeline(calls: list[str], delay: float = 0.0) -> StageGraph:
+    def stage(name: str, value: object = None):  # noqa: ANN202
+        async def fn(inputs: dict) -> object:
+            calls.append(name)
+            await asyncio.sleep(delay)
+            return value if value is not None else f"{name}({','.join(str(v) for v in inputs.values())})"
+
+        return fn
+
+    graph = StageGraph()
+    graph.add("download", stage("download", "bytes"), checkpoint=False)
+    graph.add("video_upload", stage("video_upload"), after=["download"])
+    graph.add("frames", stage("frames"), after=["download"])
+    graph.add("audio_extract", stage("audio_extract", "audio"), after=["download"], checkpoint=False)
+    graph.add("audio", stage("audio"), after=["audio_extract"])
+    graph.add("transcription", stage("transcription"), after=["audio_extract"])
+    return graph
+
+
+def test_branches_run_concurrently_and_shared_stages_once() -> None:
+    calls: list[str] = []
+    done: list[str] = []
+    run = asyncio.run(_pipeline(calls, delay=0.05).run(["video_upload", "frames", "audio", "transcription"], on_done=lambda name, _: done.append(name)))
+
+    assert calls.count("download") == 1 and calls.count("audio_extract") == 1
+    assert run.results["transcription"] == "transcription(audio)" and run.results["frames"] == "frames(bytes)"
+    assert set(done) == {"download", "video_upload", "frames", "audio_extract", "audio", "transcription"}
+    # three levels deep (download, audio_extract, transcription), six stages of 50ms
+    assert run.timer.total < 0.25
+    assert set(run.timer.seconds) == set(done)
+
+
+def test_checkpointed_stages_skip_the_stages_they_need() -> None:
+    queue = MemoryJobQueue()
+    job = queue.enqueue("analysis", {})
+    job = queue.claim("worker-a", ["analysis"], lease_seconds=60)
+    for stage in ("video_upload", "frames", "audio"):
+        queue.complete_stage(job.id, "worker-a", stage, f"{stage}-stored")
+    context = JobContext(queue, queue.get(job.id), "worker-a")
+
+    calls: list[str] = []
+    run = asyncio.run(_pipeline(calls).run(["video_upload", "frames", "audio", "transcription"], stages=context))
+
+    assert calls == ["download", "audio_extract", "transcription"]
+    assert run.results["frames"] == "frames-stored" and sorted(run.timer.reused) == ["audio", "frames", "video_upload"]
+    assert queue.get(job.id).stageState["transcription"] == "transcription(audio)"
+
+    calls.clear()
+    asyncio.run(_pipeline(calls).run(["video_upload", "frames", "audio", "transcription"], stages=JobContext(queue, queue.get(job.id), "worker-a")))
+    assert calls == []  # nothing pending, the video isn't downloaded again
+
+
+def test_a_failed_branch_cancels_the_others() -> None:
+    finished: list[str] = []
+
+    async def slow(_: dict) -> None:
+        await asyncio.sleep(1)
+        finished.append("slow")
+
+    async def broken(_: dict) -> None:
+        raise RuntimeError("ffmpeg failed")
+
+    graph = StageGraph()
+    graph.add("slow", slow)
+    graph.add("broken", broken)
+    with pytest.raises(RuntimeError, match="ffmpeg"):
+        asyncio.run(graph.run())
+    assert finished == []
+
+    with pytest.raises(ValueError, match="unknown"):
+        graph.add("next", slow, after=["missing"])
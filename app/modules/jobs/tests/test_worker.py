@@ -0,0 +1,111 @@
+import asyncio
+import time
+from datetime import timedelta
+
+import pytest
+
+from app.modules.jobs import job_queue, worker
+from app.modules.jobs.job_queue import DONE, FAILED, QUEUED, Job, MemoryJobQueue, utcnow
+from app.modules.jobs.worker import JobContext, JobHandler, WorkerPool
+
+
+def _pool(queue: MemoryJobQueue, handler: JobHandler, **options: float) -> WorkerPool:
+    return WorkerPool(queue, {"analysis": handler}, concurrency=1, lease_seconds=60, heartbeat_seconds=options.get("heartbeat_seconds", 20), backoff_seconds=0)
+
+
+def test_resumes_from_the_last_completed_stage() -> None:
+    runs: list[str] = []
+
+    async def run(job: Job, context: JobContext) -> dict:
+        async def stage(name: str) -> str:
+            runs.append(name)
+            if name == "transcription" and job.attempts == 1:
+                raise RuntimeError("groq timeout")
+            return f"{name}-result"
+
+        results = [await context.run_stage(name, lambda name=name: stage(name)) for name in ("upload", "frames", "transcription")]
+        return {"results": results}
+
+    queue = MemoryJobQueue()
+    job = queue.enqueue("analysis", {})
+    pool = _pool(queue, JobHandler(run))
+
+    assert asyncio.run(pool.run_once())
+    assert queue.get(job.id).status == QUEUED  # backoff 0, ready again
+    assert asyncio.run(pool.run_once())
+
+    assert runs == ["upload", "frames", "transcription", "transcription"]
+    stored = queue.get(job.id)
+    assert stored.status == DONE and stored.result == {"results": ["upload-result", "frames-result", "transcription-result"]}
+
+
+def test_gives_up_after_max_attempts_and_calls_on_failed() -> None:
+    failures: list[str] = []
+
+    async def run(job: Job, context: JobContext) -> None:
+        raise ValueError("bad url")
+
+    async def on_failed(job: Job, error: str) -> None:
+        failures.append(error)
+
+    queue = MemoryJobQueue()
+    job = queue.enqueue("analysis", {}, max_attempts=2)
+    pool = _pool(queue, JobHandler(run, on_failed))
+    asyncio.run(pool.run_once())
+    asyncio.run(pool.run_once())
+
+    assert queue.get(job.id).status == FAILED
+    assert failures == ["ValueError: bad url"]
+    assert pool.get_backoff(1) == timedelta(0)
+
+
+def test_run_is_cancelled_when_the_lease_is_lost() -> None:
+    async def run(job: Job, context: JobContext) -> None:
+        queue.jobs[job.id].leaseOwner = "other-worker"  # another worker took over after an expired lease
+        await asyncio.sleep(5)
+
+    queue = MemoryJobQueue()
+    job = queue.enqueue("analysis", {})
+    pool = _pool(queue, JobHandler(run), heartbeat_seconds=0.01)
+    asyncio.run(asyncio.wait_for(pool.run_once(), timeout=2))
+
+    stored = queue.get(job.id)
+    assert stored.leaseOwner == "other-worker" and stored.status not in (DONE, FAILED)
+    assert stored.leaseExpiresAt > utcnow() - timedelta(minutes=1)
+
+
+def test_heartbeat_keeps_the_lease_while_the_loop_is_blocked() -> None:
+    claimed_by_other: list[Job | None] = []
+
+    async def run(job: Job, context: JobContext) -> str:
+        time.sleep(0.3)  # blocking call on the event loop, longer than the lease
+        claimed_by_other.append(queue.claim("worker-b", ["analysis"], 60))
+        return "done"
+
+    queue = MemoryJobQueue()
+    job = queue.enqueue("analysis", {})
+    pool = WorkerPool(queue, {"analysis": JobHandler(run)}, concurrency=1, lease_seconds=0.1, heartbeat_seconds=0.02, backoff_seconds=0)
+    asyncio.run(pool.run_once())
+
+    assert claimed_by_other == [None]
+    assert queue.get(job.id).status == DONE
+
+
+def test_in_app_worker_follows_the_setting(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("JOB_WORKER_IN_APP", "false")
+    assert not asyncio.run(worker.start_in_app())
+
+    monkeypatch.setenv("JOB_WORKER_IN_APP", "true")
+    monkeypatch.setattr(worker, "load_handlers", lambda: None)
+    monkeypatch.setattr(worker, "get_handlers", lambda: {})
+    job_queue.set_queue(MemoryJobQueue())
+
+    async def main() -> bool:
+        started = await worker.start_in_app()
+        await worker.stop_in_app()
+        return started
+
+    try:
+        assert asyncio.run(main())
+    finally:
+        job_queue.set_queue(None)
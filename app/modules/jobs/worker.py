@@ -0,0 +1,255 @@
+"""Worker pool for the job queue
+
+By default the API starts a pool on its own event loop (JOB_WORKER_IN_APP=true, see start_in_app), so queued jobs run
+with nothing else deployed. To scale workers apart from the API set JOB_WORKER_IN_APP=false and run them as their own
+service, `make worker` locally or the same image with another entrypoint:
+
+    python -m app.modules.jobs.worker --concurrency 2
+
+Modules in HANDLER_MODULES register their handlers with register_handler() on import. The pool runs up to
+`concurrency` jobs at once, each one with a heartbeat thread that extends its lease, a thread so a handler that blocks
+the event loop can't stall the heartbeat and let another worker claim a job that is still running. A failed job is queued again with an
+exponential backoff until maxAttempts, then marked failed and its on_failed hook is called. If the lease is lost
+(another worker claimed the job after an expired lease) the local run is cancelled without writing anything.
+
+Handlers checkpoint their progress with context.run_stage(name, fn): a stage completed by a previous attempt returns
+its stored result instead of running again, results must be BSON serializable.
+
+Settings (env): JOB_WORKER_IN_APP (true), JOB_WORKER_CONCURRENCY (2), JOB_LEASE_SECONDS (60), JOB_HEARTBEAT_SECONDS (20),
+JOB_BACKOFF_SECONDS (30), JOB_MAX_BACKOFF_SECONDS (1800).
+"""
+
+import argparse
+import asyncio
+import contextlib
+import importlib
+import logging
+import os
+import socket
+import sys
+import threading
+import uuid
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Protocol, TypeVar
+
+from app.modules.jobs import job_queue
+from app.modules.jobs.job_queue import Job, JobQueue, utcnow
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Imported by load_handlers() so their handlers are registered, add new job modules here.
+HANDLER_MODULES = [
+    "app.video_analizer.services.video_analizer_service",
+]
+
+
+class LeaseLostError(Exception):
+    def __init__(self, job_id: str) -> None:
+        super().__init__(f"lease of job {job_id} lost, another worker owns it")
+
+
+class StageRunner(Protocol):
+    async def run_stage(self, name: str, fn: Callable[[], Awaitable[T]]) -> T: ...
+
+
+class InlineStages:
+    """StageRunner without checkpoints, for code that runs outside a job"""
+
+    async def run_stage(self, name: str, fn: Callable[[], Awaitable[T]]) -> T:
+        return await fn()
+
+
+class JobContext:
+    def __init__(self, queue: JobQueue, job: Job, worker_id: str) -> None:
+        self.queue = queue
+        self.job = job
+        self.worker_id = worker_id
+
+    def is_completed(self, stage: str) -> bool:
+        return stage in self.job.completedStages
+
+    async def run_stage(self, name: str, fn: Callable[[], Awaitable[T]]) -> T:
+        if self.is_completed(name):
+            return self.job.stageState.get(name)
+        result = await fn()
+        if not await asyncio.to_thread(self.queue.complete_stage, self.job.id, self.worker_id, name, result):
+            raise LeaseLostError(self.job.id)
+        self.job.completedStages.append(name)
+        self.job.stageState[name] = result
+        return result
+
+
+@dataclass(frozen=True)
+class JobHandler:
+    run: Callable[[Job, JobContext], Awaitable[object]]
+    on_failed: Callable[[Job, str], Awaitable[None]] | None = None
+
+
+_handlers: dict[str, JobHandler] = {}
+
+
+def register_handler(job_type: str, run: Callable[[Job, JobContext], Awaitable[object]], on_failed: Callable[[Job, str], Awaitable[None]] | None = None) -> None:
+    _handlers[job_type] = JobHandler(run, on_failed)
+
+
+def get_handlers() -> dict[str, JobHandler]:
+    return dict(_handlers)
+
+
+def load_handlers() -> None:
+    for module in HANDLER_MODULES:
+        importlib.import_module(module)
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+class WorkerPool:
+    def __init__(  # noqa: PLR0913
+        self,
+        queue: JobQueue | None = None,
+        handlers: dict[str, JobHandler] | None = None,
+        concurrency: int | None = None,
+        lease_seconds: float | None = None,
+        heartbeat_seconds: float | None = None,
+        poll_seconds: float = 1.0,
+        backoff_seconds: float | None = None,
+        max_backoff_seconds: float | None = None,
+    ) -> None:
+        self.queue = queue or job_queue.get_queue()
+        self.handlers = handlers if handlers is not None else get_handlers()
+        self.concurrency = concurrency or int(_env_float("JOB_WORKER_CONCURRENCY", 2))
+        self.lease_seconds = lease_seconds or _env_float("JOB_LEASE_SECONDS", 60)
+        self.heartbeat_seconds = heartbeat_seconds or _env_float("JOB_HEARTBEAT_SECONDS", 20)
+        self.poll_seconds = poll_seconds
+        self.backoff_seconds = backoff_seconds if backoff_seconds is not None else _env_float("JOB_BACKOFF_SECONDS", 30)
+        self.max_backoff_seconds = max_backoff_seconds or _env_float("JOB_MAX_BACKOFF_SECONDS", 1800)
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+    def get_backoff(self, attempts: int) -> timedelta:
+        return timedelta(seconds=min(self.backoff_seconds * 2 ** max(attempts - 1, 0), self.max_backoff_seconds))
+
+    async def run(self, stop: asyncio.Event | None = None) -> None:
+        stop = stop or asyncio.Event()
+        logger.info("worker %s started, concurrency %s, jobs %s", self.worker_id, self.concurrency, list(self.handlers))
+        await asyncio.gather(*(self._slot(stop) for _ in range(self.concurrency)))
+
+    async def _slot(self, stop: asyncio.Event) -> None:
+        while not stop.is_set():
+            if not await self.run_once():
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(stop.wait(), timeout=self.poll_seconds)
+
+    async def run_once(self) -> bool:
+        """Claim and run one job, False when there was nothing to do"""
+        job = await asyncio.to_thread(self.queue.claim, self.worker_id, list(self.handlers), self.lease_seconds)
+        if job is None:
+            return False
+        await self._execute(job)
+        return True
+
+    def _heartbeat(self, job: Job, task: asyncio.Task, loop: asyncio.AbstractEventLoop, lost: threading.Event, stop: threading.Event) -> None:
+        while not stop.wait(self.heartbeat_seconds):
+            try:
+                extended = self.queue.heartbeat(job.id, self.worker_id, self.lease_seconds)
+            except Exception:
+                logger.exception("heartbeat of job %s failed, retrying", job.id)
+                continue
+            if not extended:
+                logger.warning("job %s lost its lease, cancelling the local run", job.id)
+                lost.set()
+                loop.call_soon_threadsafe(task.cancel)
+                return
+
+    async def _execute(self, job: Job) -> None:
+        handler = self.handlers[job.type]
+        if job.attempts > job.maxAttempts:  # reclaimed after crashing on the last attempt
+            await self._give_up(job, handler, job.error or "worker lost the job too many times")
+            return
+
+        lost, stop = threading.Event(), threading.Event()
+        task = asyncio.create_task(handler.run(job, JobContext(self.queue, job, self.worker_id)))
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, task, asyncio.get_running_loop(), lost, stop), name=f"heartbeat-{job.id}", daemon=True)
+        heartbeat.start()
+        try:
+            result = await task
+            await asyncio.to_thread(self.queue.complete, job.id, self.worker_id, result)
+        except asyncio.CancelledError:
+            if not lost.is_set():
+                raise  # the worker is shutting down, the lease expires and another worker resumes the job
+            logger.warning("job %s stopped, lease lost", job.id)
+        except LeaseLostError:
+            logger.warning("job %s stopped, lease lost", job.id)
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+            if job.attempts < job.maxAttempts:
+                logger.warning("job %s attempt %s failed, retrying: %s", job.id, job.attempts, error)
+                await asyncio.to_thread(self.queue.fail, job.id, self.worker_id, error, utcnow() + self.get_backoff(job.attempts))
+            else:
+                logger.exception("job %s failed after %s attempts", job.id, job.attempts)
+                await self._give_up(job, handler, error)
+        finally:
+            stop.set()
+            await asyncio.to_thread(heartbeat.join)
+
+    async def _give_up(self, job: Job, handler: JobHandler, error: str) -> None:
+        if await asyncio.to_thread(self.queue.fail, job.id, self.worker_id, error) and handler.on_failed:
+            try:
+                await handler.on_failed(job, error)
+            except Exception:
+                logger.exception("on_failed hook of job %s failed", job.id)
+
+
+def should_run_in_app() -> bool:
+    return os.getenv("JOB_WORKER_IN_APP", "true").lower() in ("1", "true", "yes")
+
+
+_app_worker: tuple[asyncio.Task, asyncio.Event] | None = None
+
+
+async def start_in_app() -> bool:
+    """Starts a pool on the running (API) loop when JOB_WORKER_IN_APP is on, False when it's off or already running"""
+    global _app_worker  # noqa: PLW0603
+    if _app_worker is not None or not should_run_in_app():
+        return False
+    load_handlers()
+    stop = asyncio.Event()
+    _app_worker = (asyncio.create_task(WorkerPool().run(stop)), stop)
+    return True
+
+
+async def stop_in_app(timeout_seconds: float = 10) -> None:
+    """Running jobs that don't finish in time are cancelled, their lease expires and another worker resumes them"""
+    global _app_worker  # noqa: PLW0603
+    if _app_worker is None:
+        return
+    (task, stop), _app_worker = _app_worker, None
+    stop.set()
+    try:
+        await asyncio.wait_for(task, timeout=timeout_seconds)
+    except TimeoutError:
+        logger.warning("in-app worker did not stop in %ss, running jobs were cancelled", timeout_seconds)
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.modules.jobs.worker")
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--types", default=None, help="comma separated job types, all the registered ones by default")
+    args = parser.parse_args(argv[1:])
+
+    logging.basicConfig(level=logging.INFO)
+    load_handlers()
+    handlers = get_handlers()
+    if args.types:
+        handlers = {job_type: handlers[job_type] for job_type in args.types.split(",")}
+    asyncio.run(WorkerPool(handlers=handlers, concurrency=args.concurrency).run())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,176 @@
+"""Live feed of deltas from Mongo change streams
+
+A ChangeFeed reads one change stream (MongoChangeSource, needs a replica set, Atlas always is) and turns every change
+into a small delta with the mapper of its collection, deltas are pushed to the subscribers instead of having clients
+poll full result sets:
+
+    {"type": "tiktok.stats", "key": "<aweme_id>", "data": {...only what changed...}}
+
+Coalescing is per subscriber: deltas with the same (type, key) are merged while the subscriber waits for its next
+flush (every `coalesce_seconds`), so a burst of stat updates of one video is sent once and a slow client gets bigger
+batches instead of an unbounded queue. The stream is opened with the first subscriber and closed with the last one, a
+later subscriber starts from that moment (the resume token is reset) instead of replaying what happened meanwhile.
+QueueChangeSource feeds changes by hand, for tests and local development without a replica set.
+"""
+
+import asyncio
+import contextlib
+import logging
+from collections.abc import AsyncIterator, Callable
+from typing import Protocol
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.modules.mongo import mongo_async, mongo_json
+
+logger = logging.getLogger(__name__)
+
+Delta = dict
+DeltaMapper = Callable[[dict], Delta | None]
+# InvalidResumeToken, ChangeStreamHistoryLost (token fell off the oplog), ChangeStreamFatalError
+NON_RESUMABLE_CODES = {260, 280, 286}
+
+
+class ChangeSource(Protocol):
+    def changes(self) -> AsyncIterator[dict]: ...
+    def reset(self) -> None: ...
+
+
+def is_resumable(exc: PyMongoError) -> bool:
+    if isinstance(exc, OperationFailure) and (exc.code in NON_RESUMABLE_CODES or exc.has_error_label("NonResumableChangeStreamError")):
+        return False
+    return True
+
+
+class MongoChangeSource:
+    """Database change stream filtered to the collections, resumes after errors with the last resume token. When the
+    token can't be resumed (it fell off the oplog) the stream restarts from now, the changes in between are lost"""
+
+    def __init__(self, collections: list[str], retry_seconds: float = 2) -> None:
+        self.collections = [str(collection) for collection in collections]
+        self.retry_seconds = retry_seconds
+        self.resume_token: dict | None = None
+
+    async def changes(self) -> AsyncIterator[dict]:
+        pipeline = [{"$match": {"ns.coll": {"$in": self.collections}, "operationType": {"$in": ["insert", "update", "replace"]}}}]
+        while True:
+            try:
+                async with await mongo_async.get_db().watch(pipeline, full_document="updateLookup", resume_after=self.resume_token) as stream:
+                    async for change in stream:
+                        self.resume_token = stream.resume_token
+                        yield change
+            except PyMongoError as exc:
+                if is_resumable(exc):
+                    logger.warning("change stream interrupted, resuming in %ss: %s", self.retry_seconds, exc)
+                else:
+                    logger.error("change stream can't be resumed, restarting from now in %ss: %s", self.retry_seconds, exc)
+                    self.resume_token = None
+                await asyncio.sleep(self.retry_seconds)
+
+    def reset(self) -> None:
+        self.resume_token = None
+
+
+class QueueChangeSource:
+    """Changes pushed with put(), same shape as pymongo change events (operationType, ns, fullDocument, updateDescription)"""
+
+    def __init__(self) -> None:
+        self.queue: asyncio.Queue[dict] = asyncio.Queue()
+
+    def put(self, change: dict) -> None:
+        self.queue.put_nowait(change)
+
+    async def changes(self) -> AsyncIterator[dict]:
+        while True:
+            yield await self.queue.get()
+
+    def reset(self) -> None:
+        pass
+
+
+def merge_delta(pending: dict[tuple, Delta], delta: Delta) -> None:
+    """Later data wins key by key, a new video followed by a stats update stays a single tiktok.new"""
+    key = (delta["type"], delta["key"])
+    if key in pending:
+        pending[key]["data"] = pending[key]["data"] | delta["data"]
+    else:
+        pending[key] = {"type": delta["type"], "key": delta["key"], "data": dict(delta["data"])}
+
+
+class Subscription:
+    def __init__(self, feed: "ChangeFeed", match: Callable[[Delta], bool] | None) -> None:
+        self.feed = feed
+        self.match = match
+        self.pending: dict[tuple, Delta] = {}
+        self.ready = asyncio.Event()
+
+    def push(self, delta: Delta) -> None:
+        if self.match is None or self.match(delta):
+            merge_delta(self.pending, delta)
+            self.ready.set()
+
+    async def batches(self, heartbeat_seconds: float | None = None) -> AsyncIterator[list[Delta]]:
+        """Coalesced batches, an empty batch every heartbeat_seconds without changes (to keep proxies from closing)"""
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self.ready.wait(), timeout=heartbeat_seconds)
+                except TimeoutError:
+                    yield []
+                    continue
+                await asyncio.sleep(self.feed.coalesce_seconds)
+                batch = list(self.pending.values())
+                self.pending = {}
+                self.ready.clear()
+                yield batch
+        finally:
+            await self.feed.unsubscribe(self)
+
+
+class ChangeFeed:
+    def __init__(self, source: ChangeSource, mappers: dict[str, DeltaMapper], coalesce_seconds: float = 1) -> None:
+        self.source = source
+        self.mappers = {str(collection): mapper for collection, mapper in mappers.items()}
+        self.coalesce_seconds = coalesce_seconds
+        self.subscriptions: set[Subscription] = set()
+        self._task: asyncio.Task | None = None
+
+    def subscribe(self, match: Callable[[Delta], bool] | None = None) -> Subscription:
+        subscription = Subscription(self, match)
+        self.subscriptions.add(subscription)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._pump())
+        return subscription
+
+    async def unsubscribe(self, subscription: Subscription) -> None:
+        self.subscriptions.discard(subscription)
+        if not self.subscriptions and self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+            self.source.reset()
+
+    def to_delta(self, change: dict) -> Delta | None:
+        mapper = self.mappers.get(change.get("ns", {}).get("coll"))
+        return mapper(change) if mapper else None
+
+    async def _pump(self) -> None:
+        async for change in self.source.changes():
+            try:
+                delta = self.to_delta(change)
+            except Exception:
+                logger.exception("not able to map change %s", change.get("_id"))
+                continue
+            if delta is not None:
+                for subscription in list(self.subscriptions):
+                    subscription.push(delta)
+
+
+async def iter_sse(subscription: Subscription, heartbeat_seconds: float = 15) -> AsyncIterator[bytes]:
+    """Server-sent events, one `deltas` event per batch, comments as heartbeat"""
+    async for batch in subscription.batches(heartbeat_seconds):
+        if not batch:
+            yield b": ping\n\n"
+            continue
+        yield b"event: deltas\ndata: " + mongo_json.dumps(batch) + b"\n\n"
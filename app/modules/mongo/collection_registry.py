@@ -0,0 +1,137 @@
+"""Registry of the collections the app uses
+
+Every collection is a CollectionName member with a CollectionSpec (codec options, read/write concern, read preference,
+optional $jsonSchema validator). get_collection() returns a cached handle built with those options, so a lookup is a
+dict get and unknown names raise UnknownCollectionError. check_names() runs on startup so a typo in an index declaration
+or MONGO_CACHE_COLLECTIONS stops the app instead of failing on the first request. Add new collections here.
+"""
+
+from dataclasses import dataclass
+from enum import StrEnum
+
+from bson.codec_options import CodecOptions
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.collection import Collection
+from pymongo.read_concern import ReadConcern
+from pymongo.write_concern import WriteConcern
+
+from app.modules.mongo import mongo_client
+
+
+class UnknownCollectionError(Exception):
+    def __init__(self, name: str) -> None:
+        super().__init__(f"not able to find table in code: {name}, register it in CollectionName")
+        self.name = name
+
+
+class CollectionName(StrEnum):
+    """StrEnum so members work anywhere a collection name string is expected (cache keys, logs, f-strings)"""
+
+    AGENT_SOURCES = "agent_sources"
+    BENCH_DOCUMENTS = "bench_documents"  # benchmarks only, see benchmarks/bench_db.py
+    GENERICS = "generics"
+    JOBS = "jobs"
+    TIKTOKS_AWEME = "tiktoks_aweme"
+    TIKTOK_RETRIES = "tiktok_extraction_retries"
+    TIKTOK_ROLLUPS = "tiktok_rollups"
+    TIKTOK_STATISTICS = "tiktoks_aweme_statistics"
+    VIDEOS = "videos"
+
+
+@dataclass(frozen=True)
+class CollectionSpec:
+    """Options applied to the collection handle, None inherits the client/uri setting"""
+
+    codec_options: CodecOptions | None = None
+    read_concern: ReadConcern | None = None
+    write_concern: WriteConcern | None = None
+    read_preference: object | None = None
+    schema: dict | None = None  # $jsonSchema validator applied by ensure_collections()
+    timeseries: dict | None = None  # create_collection timeseries options, the collection is created by ensure_collections()
+
+
+COLLECTION_SPECS: dict[CollectionName, CollectionSpec] = {
+    CollectionName.AGENT_SOURCES: CollectionSpec(),
+    CollectionName.BENCH_DOCUMENTS: CollectionSpec(),
+    CollectionName.GENERICS: CollectionSpec(),
+    CollectionName.JOBS: CollectionSpec(),
+    CollectionName.TIKTOKS_AWEME: CollectionSpec(),
+    CollectionName.TIKTOK_RETRIES: CollectionSpec(),
+    CollectionName.TIKTOK_ROLLUPS: CollectionSpec(),
+    # snapshots of the aweme statistics over time, stored compressed in buckets per aweme
+    CollectionName.TIKTOK_STATISTICS: CollectionSpec(timeseries={"timeField": "capturedAt", "metaField": "meta", "granularity": "hours"}),
+    CollectionName.VIDEOS: CollectionSpec(),
+}
+
+_handles: dict[CollectionName, Collection] = {}
+_async_handles: dict[CollectionName, AsyncCollection] = {}
+
+
+def resolve_name(collection: str | CollectionName) -> CollectionName:
+    if isinstance(collection, CollectionName):
+        return collection
+    try:
+        return CollectionName(collection)
+    except ValueError:
+        raise UnknownCollectionError(collection) from None
+
+
+def _get_options(name: CollectionName) -> dict:
+    spec = COLLECTION_SPECS.get(name, CollectionSpec())
+    options = {
+        "codec_options": spec.codec_options,
+        "read_concern": spec.read_concern,
+        "write_concern": spec.write_concern,
+        "read_preference": spec.read_preference,
+    }
+    return {key: value for key, value in options.items() if value is not None}
+
+
+def get_collection(collection: str | CollectionName) -> Collection:
+    """Cached sync handle, rebuilt only when the shared client was closed and created again"""
+    name = resolve_name(collection)
+    client = mongo_client.get_client()
+    handle = _handles.get(name)
+    if handle is None or handle.database.client is not client:
+        handle = client[mongo_client.get_mongo_db_name()].get_collection(name.value, **_get_options(name))
+        _handles[name] = handle
+    return handle
+
+
+def get_async_collection(collection: str | CollectionName) -> AsyncCollection:
+    name = resolve_name(collection)
+    client = mongo_client.get_async_client()
+    handle = _async_handles.get(name)
+    if handle is None or handle.database.client is not client:
+        handle = client[mongo_client.get_mongo_db_name()].get_collection(name.value, **_get_options(name))
+        _async_handles[name] = handle
+    return handle
+
+
+def check_names(names: list[str]) -> None:
+    """Raise on the first name that is not registered, used on startup for every configured collection name"""
+    for name in names:
+        resolve_name(name)
+
+
+def ensure_collections() -> dict[str, str]:
+    """Create the time-series collections and apply the $jsonSchema validators of the specs that have them. An existing
+    regular collection can't become time-series, it is reported so it can be migrated"""
+    db = mongo_client.get_client()[mongo_client.get_mongo_db_name()]
+    existing = {info["name"]: info for info in db.list_collections()}
+    report = {}
+    for name, spec in COLLECTION_SPECS.items():
+        if spec.schema is None and spec.timeseries is None:
+            continue
+        options = {"validator": {"$jsonSchema": spec.schema}} if spec.schema else {}
+        if name.value not in existing:
+            db.create_collection(name.value, **options, **({"timeseries": spec.timeseries} if spec.timeseries else {}))
+            report[name.value] = "created"
+        elif spec.timeseries and existing[name.value].get("type") != "timeseries":
+            report[name.value] = "exists but is not time-series, migrate it"
+        elif spec.schema:
+            db.command("collMod", name.value, **options)
+            report[name.value] = "updated"
+        else:
+            report[name.value] = "exists"
+    return report
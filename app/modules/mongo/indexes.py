@@ -0,0 +1,169 @@
+"""Declarative index registry
+
+Each repository declares the indexes its queries need and a few canonical queries, when the module is imported:
+
+    indexes.register_indexes("tiktoks_aweme", [IndexModel("aweme_id")], [{"name": "by aweme_id", "filter": {"aweme_id": "0"}}])
+
+IndexModel supports unique, compound, partial and TTL (expireAfterSeconds) indexes. ensure_indexes() creates them
+(startup when MONGO_ENSURE_INDEXES=true or the CLI) and explain_report() checks the canonical queries don't COLLSCAN.
+
+    python -m app.modules.mongo.indexes ensure
+    python -m app.modules.mongo.indexes report
+"""
+
+import importlib
+import os
+import sys
+
+import pymongo
+from pymongo import IndexModel
+from typing_extensions import TypedDict
+
+from app.modules.mongo import collection_registry, mongo
+
+# Imported by load_repositories() so their declarations are in the registry, add new repositories here.
+REPOSITORY_MODULES = [
+    "app.agents.repositories.agent_sources_repository",
+    "app.modules.jobs.job_queue",
+    "app.video_analizer.repositories.tiktok_repository",
+    "app.video_analizer.repositories.tiktok_ingest_repository",
+    "app.video_analizer.repositories.tiktok_ranking_repository",
+    "app.video_analizer.repositories.tiktok_retry_repository",
+    "app.video_analizer.repositories.tiktok_rollup_repository",
+    "app.video_analizer.repositories.tiktok_statistics_repository",
+    "app.video_analizer.repositories.tiktok_time_repository",
+]
+
+
+class CanonicalQuery(TypedDict, total=False):
+    """A query the app runs often, values don't matter only the shape of filter and sort"""
+
+    name: str
+    filter: dict
+    sort: list[tuple[str, int]]
+
+
+_indexes: dict[str, list[IndexModel]] = {}
+_queries: dict[str, list[CanonicalQuery]] = {}
+
+
+def register_indexes(collection: str, indexes: list[IndexModel], queries: list[CanonicalQuery] | None = None) -> None:
+    """Declare indexes (and optionally canonical queries) for a collection, indexes with the same name are replaced"""
+    registered = {index.document["name"]: index for index in _indexes.get(collection, [])}
+    registered.update({index.document["name"]: index for index in indexes})
+    _indexes[collection] = list(registered.values())
+
+    if queries:
+        _queries.setdefault(collection, []).extend(queries)
+
+
+def register_id_index(collection: str) -> None:
+    """mongo.py helpers find documents by the custom string id, make it unique for documents that have it"""
+    register_indexes(
+        collection,
+        [IndexModel("id", name="id_unique", unique=True, partialFilterExpression={"id": {"$type": "string"}})],
+        [{"name": "by id", "filter": {"id": "0"}}],
+    )
+
+
+def get_registered_indexes() -> dict[str, list[IndexModel]]:
+    return dict(_indexes)
+
+
+def get_canonical_queries() -> dict[str, list[CanonicalQuery]]:
+    return dict(_queries)
+
+
+def load_repositories() -> None:
+    for module in REPOSITORY_MODULES:
+        importlib.import_module(module)
+
+
+def ensure_indexes(collections: list[str] | None = None) -> dict[str, dict]:
+    """Create the registered indexes, creating an existing index is a no-op. A conflicting index (same name or keys
+    with other options) is reported instead of raising so one collection doesn't stop the others. Unique indexes are
+    created one at a time, a build that fails on duplicate values doesn't stop the other indexes of the collection"""
+    report = {}
+    for collection, indexes in _indexes.items():
+        if collections and collection not in collections:
+            continue
+        batches = [[index] for index in indexes if index.document.get("unique")]
+        batches.append([index for index in indexes if not index.document.get("unique")])
+        names, errors = [], []
+        for batch in filter(None, batches):
+            try:
+                names.extend(mongo.get_collection(collection).create_indexes(batch))
+            except pymongo.errors.OperationFailure as exc:
+                errors.append(str(exc))
+        report[collection] = {"indexes": names, "error": "; ".join(errors) or None}
+    return report
+
+
+def get_plan_stages(plan: dict | list) -> list[str]:
+    """All stage names of an explain plan, the tree shape changes between classic and SBE engines so walk everything"""
+    stages = []
+    if isinstance(plan, dict):
+        if isinstance(plan.get("stage"), str):
+            stages.append(plan["stage"])
+        for value in plan.values():
+            if isinstance(value, dict | list):
+                stages.extend(get_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(get_plan_stages(item))
+    return stages
+
+
+def explain_query(collection: str, query: CanonicalQuery) -> dict:
+    cursor = mongo.get_collection(collection).find(query["filter"])
+    if query.get("sort"):
+        cursor = cursor.sort(query["sort"])
+    explain = cursor.explain()
+
+    stages = get_plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+    stats = explain.get("executionStats", {})
+    return {
+        "collection": collection,
+        "query": query["name"],
+        "stages": stages,
+        "collscan": "COLLSCAN" in stages,
+        "inMemorySort": "SORT" in stages,
+        "docsExamined": stats.get("totalDocsExamined"),
+        "returned": stats.get("nReturned"),
+    }
+
+
+def explain_report() -> list[dict]:
+    """Run explain() on every canonical query, rows with collscan=True need an index"""
+    return [explain_query(collection, query) for collection, queries in _queries.items() for query in queries]
+
+
+def should_ensure_on_startup() -> bool:
+    return os.getenv("MONGO_ENSURE_INDEXES", "false").lower() in ("1", "true", "yes")
+
+
+def main(argv: list[str]) -> int:
+    command = argv[1] if len(argv) > 1 else "report"
+    load_repositories()
+
+    if command == "ensure":
+        # before the indexes, creating an index on a missing collection creates a regular (not time-series) one
+        for collection, result in collection_registry.ensure_collections().items():
+            print(f"{collection}: {result}")
+        for collection, result in ensure_indexes().items():
+            print(f"{collection}: {result['error'] or ', '.join(result['indexes'])}")
+        return 0
+
+    if command == "report":
+        rows = explain_report()
+        for row in rows:
+            flag = "COLLSCAN" if row["collscan"] else "ok"
+            print(f"{flag:>8} | {row['collection']:<20} | {row['query']:<35} | {' > '.join(row['stages'])} | examined {row['docsExamined']}")
+        return 1 if any(row["collscan"] for row in rows) else 0
+
+    print("usage: python -m app.modules.mongo.indexes [ensure|report]")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
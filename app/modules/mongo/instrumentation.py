@@ -0,0 +1,161 @@
+"""Query instrumentation with a pymongo CommandListener
+
+Off by default, MONGO_INSTRUMENTATION_SAMPLE_RATE=0.1 times 10% of the commands: latency histogram, documents returned
+and reply bytes per collection, and any sampled command slower than MONGO_SLOW_QUERY_MS goes to the slow query log
+(logger `app.mongo.slow_queries`). When the rate is 0 the listener is not registered at all, so there is no overhead.
+"""
+
+import logging
+import random
+import threading
+
+import bson
+from bson import json_util
+from pymongo import monitoring
+
+slow_query_logger = logging.getLogger("app.mongo.slow_queries")
+
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "saslStart", "saslContinue", "endSessions", "buildInfo", "getLastError"}
+COMMAND_LOG_LIMIT = 500
+
+
+def get_command_collection(command_name: str, command: dict) -> str:
+    if command_name == "getMore":
+        return command.get("collection", "")
+    value = command.get(command_name)
+    return value if isinstance(value, str) else ""
+
+
+def count_reply_documents(reply: dict) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+    return reply.get("n", 0) if isinstance(reply.get("n"), int) else 0
+
+
+def summarize_command(command: dict) -> str:
+    """Command without session/cluster metadata, truncated so huge inserts don't flood the log"""
+    summary = {key: value for key, value in command.items() if key not in ("lsid", "$clusterTime", "$db", "documents", "updates")}
+    return json_util.dumps(summary)[:COMMAND_LOG_LIMIT]
+
+
+class CollectionStats:
+    def __init__(self) -> None:
+        self.count = 0
+        self.failures = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.documents = 0
+        self.bytes = 0
+        self.commands: dict[str, int] = {}
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, command_name: str, duration_ms: float, documents: int, reply_bytes: int) -> None:
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.documents += documents
+        self.bytes += reply_bytes
+        self.commands[command_name] = self.commands.get(command_name, 0) + 1
+        self.buckets[next((index for index, limit in enumerate(LATENCY_BUCKETS_MS) if duration_ms <= limit), len(LATENCY_BUCKETS_MS))] += 1
+
+    def percentile(self, pct: float) -> float | None:
+        """Upper limit of the bucket holding the percentile, good enough to spot regressions"""
+        if not self.count:
+            return None
+        target = pct / 100 * self.count
+        seen = 0
+        for index, amount in enumerate(self.buckets):
+            seen += amount
+            if seen >= target:
+                return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "failures": self.failures,
+            "avgMs": round(self.total_ms / self.count, 3) if self.count else None,
+            "maxMs": round(self.max_ms, 3),
+            "p50Ms": self.percentile(50),
+            "p99Ms": self.percentile(99),
+            "documents": self.documents,
+            "bytes": self.bytes,
+            "commands": dict(self.commands),
+            "histogram": dict(zip([f"<={limit}ms" for limit in LATENCY_BUCKETS_MS] + ["inf"], self.buckets, strict=True)),
+        }
+
+
+class QueryInstrumentation(monitoring.CommandListener):
+    def __init__(self, sample_rate: float, slow_query_ms: float = 100) -> None:
+        self.sample_rate = sample_rate
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._pending: dict[tuple, tuple[str, str]] = {}
+        self._collections: dict[str, CollectionStats] = {}
+        self.slow_queries = 0
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name in IGNORED_COMMANDS or random.random() >= self.sample_rate:
+            return
+        collection = get_command_collection(event.command_name, event.command)
+        summary = summarize_command(event.command) if self.slow_query_ms is not None else ""
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (collection, summary)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+
+        collection, summary = pending
+        duration_ms = event.duration_micros / 1000
+        documents = count_reply_documents(event.reply)
+        reply_bytes = len(bson.encode(event.reply))
+        with self._lock:
+            self._collections.setdefault(collection, CollectionStats()).add(event.command_name, duration_ms, documents, reply_bytes)
+
+        if self.slow_query_ms is not None and duration_ms >= self.slow_query_ms:
+            self.slow_queries += 1
+            slow_query_logger.warning("slow mongo %s on %s %.1fms docs=%s bytes=%s %s", event.command_name, collection, duration_ms, documents, reply_bytes, summary)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+            if pending is not None:
+                self._collections.setdefault(pending[0], CollectionStats()).failures += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sampleRate": self.sample_rate,
+                "slowQueryMs": self.slow_query_ms,
+                "slowQueries": self.slow_queries,
+                "collections": {name: stats.to_dict() for name, stats in self._collections.items()},
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._collections = {}
+            self.slow_queries = 0
+
+
+_instrumentation: QueryInstrumentation | None = None
+
+
+def get_listeners(sample_rate: float, slow_query_ms: float) -> list[monitoring.CommandListener]:
+    """Listeners to register on a new client, empty when instrumentation is off. Both clients share the same stats"""
+    global _instrumentation  # noqa: PLW0603
+    if sample_rate <= 0:
+        return []
+    if _instrumentation is None:
+        _instrumentation = QueryInstrumentation(sample_rate, slow_query_ms)
+    return [_instrumentation]
+
+
+def get_query_stats() -> dict:
+    if _instrumentation is None:
+        return {"sampleRate": 0, "collections": {}}
+    return _instrumentation.stats()
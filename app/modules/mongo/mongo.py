@@ -1,33 +1,46 @@
-import os
+import logging
 from datetime import datetime
 
 # import mongo_schema
+import bson
 import pymongo
 from bson import ObjectId
 from pydantic import BaseModel
-from pymongo import MongoClient
+from pymongo import InsertOne, MongoClient, UpdateOne
 from pymongo.collection import Collection
 from pymongo.database import Database
-from typing_extensions import Any, TypedDict
+from typing_extensions import Any, Literal, TypedDict
+
+from app.modules.mongo import collection_registry, mongo_cache, mongo_client
+from app.modules.mongo.collection_registry import CollectionName
+from app.modules.mongo.mongo_client import get_mongo_db_name, get_mongo_uri
+
+__all__ = ["get_mongo_db_name", "get_mongo_uri"]
+
+logger = logging.getLogger(__name__)
 
-# from app.core.app_enums import str
 # from app.core.exception import AppException
 
 # MongoDB error codes
 DOCUMENT_VALIDATION_ERROR = 121
 
 
-def get_mongo_uri() -> str:
-    mongo_uri: str = f"mongodb+srv://{os.getenv('MONGO_USER')}:{os.getenv('MONGO_PASS')}@{os.getenv('MONGO_HOST')}/{os.getenv('MONGO_DB')}?retryWrites=true&w=majority"
-    print("Connectando", mongo_uri)
-    return mongo_uri
+def get_client() -> MongoClient:
+    """Lazily created process wide client, see mongo_client for pool settings"""
+    return mongo_client.get_client()
 
 
-uri: str = get_mongo_uri()
+def get_db() -> Database[dict[str, Collection]]:
+    return get_client()[get_mongo_db_name()]
 
-client = MongoClient(uri)
 
-db: Database[dict[str, Collection]] = client[os.getenv("MONGO_DB", "")]
+def __getattr__(name: str) -> Any:  # noqa: ANN401
+    """Backwards compatibility for `from app.modules.mongo.mongo import db, client`, prefer get_db() that resolves at call time"""
+    if name == "db":
+        return get_db()
+    if name == "client":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class ArrayOperationData(TypedDict):
@@ -69,43 +82,55 @@ def get_projection_dict(include: list[str] = None, exclude: list[str] = None) ->
 
     if include and len(include) > 0:
         in_dict = {property: 1 for property in include}
-        print(in_dict)
-
         selection = selection | in_dict
-        print(selection)
 
     if exclude and len(exclude) > 0:
         out_dict = {property: 0 for property in exclude}
-        print(out_dict)
-
         selection = selection | out_dict
-        print(selection)
 
     return selection
 
 
 def get_document_by_id(collection: str, id: str) -> dict:
-    """Get the data using custom id, similar to get document"""
+    """Get the data using custom id, similar to get document, cached when the collection is in MONGO_CACHE_COLLECTIONS"""
+    found, document = mongo_cache.get_document(collection, id)
+    if found:
+        return document
+
     query = {"id": id}
-    return get_document_by_mongo_query(collection, query)
+    document = get_document_by_mongo_query(collection, query)
+    mongo_cache.set_document(collection, id, None, document)
+    return document
 
 
 def get_document_by_id_including(collection: str, id: str, include: list[str]) -> dict:
     """When your document/object contains more objects, and you only want specifics properties example, extract only verbs form user"""
+    projection_key = mongo_cache.projection_key(include)
+    found, document = mongo_cache.get_document(collection, id, projection_key)
+    if found:
+        return document
+
     query = {"id": id}
     selection = get_projection_dict(include, None)
     data = get_document_by_mongo_query(collection, query, selection)
+    mongo_cache.set_document(collection, id, projection_key, data)
     return data
 
 
 def get_document_by_object_id(collection: str, id: str) -> dict:
-    """use mongo ObjectId version instead string this use mongo id property _id"""
+    """use mongo ObjectId version instead string this use mongo id property _id.
+    Cached under the same id, documents saved with insert_pretty have id == str(_id) so writes by id invalidate it"""
+    projection_key = mongo_cache.projection_key(by_object_id=True)
+    found, document = mongo_cache.get_document(collection, id, projection_key)
+    if found:
+        return document
 
     mongo_col = get_collection(collection)
     document = mongo_col.find_one({"_id": ObjectId(id)})
     if document:
         document["id"] = str(document["_id"])
         del document["_id"]
+    mongo_cache.set_document(collection, id, projection_key, document)
     return document
 
 
@@ -182,13 +207,14 @@ def insert(table: str, document: dict, audit_user_id: str = None, cast_object_id
     col = get_collection(table)
     try:
         col.insert_one(document)
+        mongo_cache.invalidate(table, document.get("id"))
         # after save document, same saved dict is modified (mutable) adding _id: ObjectId
         if cast_object_id:
             document["_id"] = str(document["_id"])
 
         return document
     except pymongo.errors.WriteError as exc:
-        print(".....Error", exc)
+        logger.warning("write error on %s: %s", table, exc)
         if exc.code == DOCUMENT_VALIDATION_ERROR:
             __handle_invalid_data(col, document)
 
@@ -206,6 +232,7 @@ def delete_document(collection: str, document_id: str) -> int:
 
     mongo_col = get_collection(collection)
     data = mongo_col.delete_one(filters)
+    mongo_cache.invalidate(collection, document_id)
     return data.deleted_count
 
 
@@ -229,9 +256,10 @@ def update(table: str, document: dict, id: str, audit_user_id: str = None, updat
 
     try:
         result = col.update_one(query, updated_values)
+        mongo_cache.invalidate_by_filter(table, query)
         return result.raw_result["nModified"]
     except pymongo.errors.WriteError as exc:
-        print(".....Error", exc)
+        logger.warning("write error on %s: %s", table, exc)
         if exc.code == DOCUMENT_VALIDATION_ERROR:
             __handle_invalid_data(col, document)
 
@@ -254,27 +282,20 @@ def update_with_filter_and_operation(filter: dict, operation: dict, collection:
     """
     col = get_collection(collection)
     result = col.update_one(filter, operation)
+    mongo_cache.invalidate_by_filter(collection, filter)
     # Solo dice si algo fue modificado o no, si encuentro un mejor método que regrese la modificación o null sería más util
     return True if result.matched_count >= 1 else False
 
 
 def insert_record_in_collection(table: str, record: dict) -> None:
-    print("inserting data", table, record)
-    table = get_collection(table)
-    table.insert_one(record)
-
+    col = get_collection(table)
+    col.insert_one(record)
+    mongo_cache.invalidate(table, record.get("id"))
 
-def get_collection(collection: str) -> Collection:
-    """Get Mongo Collection Object"""
-    if isinstance(collection, str):
-        print(f"WARNING: not validated {collection} collection, pass it as Enum so it can be validated")
-        return db[collection]
 
-    elif collection in str:
-        return db[collection.value]
-    else:
-        # raise AppException("not able to find table in code", "Se intenta obtener una colleccion no registrada en el código")
-        raise Exception("not able to find table in code")
+def get_collection(collection: str | CollectionName) -> Collection:
+    """Get Mongo Collection Object, cached handle of a registered collection, raises UnknownCollectionError otherwise"""
+    return collection_registry.get_collection(collection)
 
 
 def update_all_object(collection: str, id_name: str, id: str, object_dict: dict) -> int:
@@ -296,6 +317,7 @@ def update_all_object(collection: str, id_name: str, id: str, object_dict: dict)
     updated_values = {"$push": list_attibutes}
 
     result = col.update_one(query, updated_values)
+    mongo_cache.invalidate_by_filter(collection, query)
     return result.raw_result["nModified"]
 
 
@@ -311,6 +333,7 @@ def push_into_array(array_operation: ArrayOperationData) -> int:
     push_update = {"$push": {array_property: value}}
     mongo_col = get_collection(collection)
     update_results = mongo_col.update_one(filters, push_update)
+    mongo_cache.invalidate(collection, document_id)
     return update_results.raw_result["nModified"]
 
 
@@ -330,6 +353,7 @@ def push_list_into_array(data: ArrayOperationData) -> None:
 
     col = get_collection(collection)
     col.update_one(filters, push)
+    mongo_cache.invalidate(collection, document_id)
 
 
 def update_all_objects_in_array(data: ArrayOperationData) -> None:
@@ -347,6 +371,7 @@ def update_all_objects_in_array(data: ArrayOperationData) -> None:
 
     col = get_collection(collection)
     col.update_one(filter=filters, update=update)
+    mongo_cache.invalidate(collection, document_id)
 
 
 def update_object_in_array(data: ArrayOperationData) -> None:
@@ -364,6 +389,7 @@ def update_object_in_array(data: ArrayOperationData) -> None:
 
     col = get_collection(collection)
     col.update_one(filter=filters, update=update)
+    mongo_cache.invalidate(collection, document_id)
 
 
 def update_object_property_in_array(data: ArrayOperationData) -> None:
@@ -382,6 +408,7 @@ def update_object_property_in_array(data: ArrayOperationData) -> None:
 
     col = get_collection(collection)
     col.update_one(filter=filters, update=update)
+    mongo_cache.invalidate(collection, document_id)
 
 
 def push_into_array_sort_and_trim(data: ArrayOperationData, trim_number: int, sort_property: str) -> None:
@@ -398,6 +425,7 @@ def push_into_array_sort_and_trim(data: ArrayOperationData, trim_number: int, so
     col = get_collection(collection)
 
     col.update_one(filter=filters, update=update)
+    mongo_cache.invalidate(collection, document_id)
 
 
 # @deprecated probar si funciona igual con push_list_into_array
@@ -410,6 +438,7 @@ def insert_objects_into_array(collection: str, id: str, property_array: str, rec
     push = {"$push": update}
     col = get_collection(collection)
     col.update_one(filters, push)
+    mongo_cache.invalidate(collection, id)
 
 
 def delete_from_array(array_operation: ArrayOperationData) -> None:
@@ -429,6 +458,155 @@ def delete_from_array(array_operation: ArrayOperationData) -> None:
     filters = {"id": document_id}
 
     mongo_col.update_one(filters, remove)
+    mongo_cache.invalidate(collection, document_id)
+
+
+class BulkOperationData(TypedDict, total=False):
+    """
+    One operation for bulk_write, same idea as ArrayOperationData but for many documents at once.
+
+    type: insert | upsert | set | push | push_list
+    document_id: value used to find the document, not needed for insert
+    id_property: property compared with document_id, default 'id'
+    array_property: array to push into, only for push and push_list
+    value: document for insert/upsert, properties for set, object (push) or list of objects (push_list) to push
+    """
+
+    type: Literal["insert", "upsert", "set", "push", "push_list"]
+    document_id: Any
+    id_property: str
+    array_property: str
+    value: Any
+
+
+class BulkWriteSummary(TypedDict):
+    inserted: int
+    matched: int
+    modified: int
+    upserted: int
+    upsertedIds: dict[int, Any]  # index of the operation -> _id created
+    errors: list[dict]  # {index, code, message, documentId}, index is the position in the operations list
+
+
+BULK_MAX_OPERATIONS = 1000
+BULK_MAX_BYTES = 8 * 1024 * 1024  # stays well under the 48MB message limit, keeps each round trip short
+
+
+BulkSpec = tuple[dict | None, dict, bool | None]  # (filter, document or update, upsert), without filter it is an insert
+
+
+def build_bulk_spec(operation: BulkOperationData, audit_user_id: str | None = None) -> BulkSpec:
+    """Translate a BulkOperationData to (filter, document or update, upsert), None values are skipped on $set like update() does"""
+    op_type = operation["type"]
+    value = operation.get("value")
+
+    if op_type == "insert":
+        if audit_user_id:
+            value = value | {"createdDate": datetime.now(), "createdBy": audit_user_id}
+        return None, value, None
+
+    filters = {operation.get("id_property", "id"): operation["document_id"]}
+
+    if op_type in ("upsert", "set"):
+        updated_data = {key: val for (key, val) in value.items() if val is not None}
+        if audit_user_id:
+            updated_data = updated_data | {"modifiedDate": datetime.now(), "modifiedBy": audit_user_id}
+        return filters, {"$set": updated_data}, op_type == "upsert"
+    if op_type == "push":
+        return filters, {"$push": {operation["array_property"]: value}}, None
+    if op_type == "push_list":
+        return filters, {"$push": {operation["array_property"]: {"$each": value}}}, None
+
+    raise ValueError(f"bulk operation type not supported: {op_type}")
+
+
+def to_bulk_request(spec: BulkSpec) -> InsertOne | UpdateOne:
+    filters, document, upsert = spec
+    return InsertOne(document) if filters is None else UpdateOne(filters, document, upsert=upsert)
+
+
+def build_bulk_request(operation: BulkOperationData, audit_user_id: str | None = None) -> InsertOne | UpdateOne:
+    """Translate a BulkOperationData to a pymongo write model"""
+    return to_bulk_request(build_bulk_spec(operation, audit_user_id))
+
+
+def bulk_spec_size(spec: BulkSpec) -> int:
+    """Encoded BSON size of the statement sent to the server, the document for an insert, {q, u} for an update"""
+    filters, document, _ = spec
+    return len(bson.encode(document if filters is None else {"q": filters, "u": document}))
+
+
+def chunk_bulk_specs(specs: list[BulkSpec], max_operations: int = BULK_MAX_OPERATIONS, max_bytes: int = BULK_MAX_BYTES) -> list[tuple[int, list]]:
+    """Split specs in chunks by count and by encoded BSON size, returns (offset of the chunk, pymongo requests)"""
+    chunks = []
+    current: list = []
+    current_bytes = 0
+    offset = 0
+
+    for index, spec in enumerate(specs):
+        size = bulk_spec_size(spec)
+        if current and (len(current) >= max_operations or current_bytes + size > max_bytes):
+            chunks.append((offset, current))
+            current, current_bytes, offset = [], 0, index
+        current.append(to_bulk_request(spec))
+        current_bytes += size
+
+    if current:
+        chunks.append((offset, current))
+    return chunks
+
+
+def new_bulk_summary() -> BulkWriteSummary:
+    return {"inserted": 0, "matched": 0, "modified": 0, "upserted": 0, "upsertedIds": {}, "errors": []}
+
+
+def add_bulk_result(summary: BulkWriteSummary, offset: int, details: dict) -> None:
+    """Sum a chunk result (BulkWriteResult.bulk_api_result or BulkWriteError.details) into the summary"""
+    summary["inserted"] += details.get("nInserted", 0)
+    summary["matched"] += details.get("nMatched", 0)
+    summary["modified"] += details.get("nModified", 0)
+    summary["upserted"] += details.get("nUpserted", 0)
+    for upserted in details.get("upserted", []):
+        summary["upsertedIds"][offset + upserted["index"]] = upserted["_id"]
+
+
+def invalidate_bulk_operations(collection: str, operations: list[BulkOperationData]) -> None:
+    if any(operation.get("id_property", "id") != "id" for operation in operations if operation["type"] != "insert"):
+        mongo_cache.invalidate(collection)
+        return
+    for operation in operations:
+        mongo_cache.invalidate(collection, operation.get("document_id") or (operation.get("value") or {}).get("id"))
+
+
+def bulk_write(
+    collection: str, operations: list[BulkOperationData], ordered: bool = True, audit_user_id: str | None = None, max_operations: int = BULK_MAX_OPERATIONS
+) -> BulkWriteSummary:
+    """Write many inserts/upserts/sets/pushes with one round trip per chunk instead of one per document.
+    ordered=True stops at the first error (remaining chunks are not sent), ordered=False tries every operation.
+    Errors are reported per operation, validation errors are handled like insert() and update() do."""
+    col = get_collection(collection)
+    specs = [build_bulk_spec(operation, audit_user_id) for operation in operations]
+    summary = new_bulk_summary()
+
+    try:
+        for offset, chunk in chunk_bulk_specs(specs, max_operations):
+            try:
+                result = col.bulk_write(chunk, ordered=ordered)
+                add_bulk_result(summary, offset, result.bulk_api_result)
+            except pymongo.errors.BulkWriteError as exc:
+                add_bulk_result(summary, offset, exc.details)
+                for error in exc.details.get("writeErrors", []):
+                    index = offset + error["index"]
+                    summary["errors"].append({"index": index, "code": error.get("code"), "message": error.get("errmsg"), "documentId": operations[index].get("document_id")})
+                    if error.get("code") == DOCUMENT_VALIDATION_ERROR:
+                        __handle_invalid_data(col, operations[index].get("value"))
+                if ordered:
+                    break
+    finally:
+        # after the writes, a read between invalidating and writing would cache the old document again
+        invalidate_bulk_operations(collection, operations)
+
+    return summary
 
 
 def __handle_invalid_data(col: Collection, document: dict) -> None:
@@ -0,0 +1,384 @@
+"""Async twin of app.modules.mongo.mongo
+
+Same function surface as mongo.py but backed by pymongo's AsyncMongoClient, use it from `async def`
+handlers so a slow query does not block the event loop. All helpers share one lazily created client (one pool).
+Reads don't go through mongo_cache but writes invalidate it, so the sync cached reads never serve stale documents.
+"""
+
+import logging
+from collections.abc import AsyncIterator
+from datetime import datetime
+
+import pymongo
+from bson import ObjectId
+from pydantic import BaseModel
+from pymongo import AsyncMongoClient
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.asynchronous.database import AsyncDatabase
+from typing_extensions import Any
+
+from app.modules.mongo import collection_registry, mongo_cache, mongo_client
+from app.modules.mongo.collection_registry import CollectionName
+from app.modules.mongo.mongo import (
+    BULK_MAX_OPERATIONS,
+    DOCUMENT_VALIDATION_ERROR,
+    ArrayOperationData,
+    BulkOperationData,
+    BulkWriteSummary,
+    add_bulk_result,
+    build_bulk_spec,
+    chunk_bulk_specs,
+    get_projection_dict,
+    invalidate_bulk_operations,
+    new_bulk_summary,
+)
+from app.modules.mongo.mongo_client import get_mongo_db_name
+
+__all__ = ["ArrayOperationData", "BulkOperationData", "BulkWriteSummary", "get_projection_dict"]
+
+logger = logging.getLogger(__name__)
+
+
+def get_client() -> AsyncMongoClient:
+    """Shared async client, created on first use so the pool is reused by every request"""
+    return mongo_client.get_async_client()
+
+
+def get_db() -> AsyncDatabase:
+    return get_client()[get_mongo_db_name()]
+
+
+async def get_all_data_in_collection(collection: str) -> list[dict]:
+    """get all records for corresponding collection (No _id), USE CAREFULLY"""
+    col = get_collection(collection)
+    projection = {"_id": 0}
+    cursor = col.find({}, projection=projection)
+    return await cursor.to_list()
+
+
+async def get_document_by_id(collection: str, id: str) -> dict:
+    """Get the data using custom id, similar to get document"""
+    query = {"id": id}
+    return await get_document_by_mongo_query(collection, query)
+
+
+async def get_document_by_id_including(collection: str, id: str, include: list[str]) -> dict:
+    """When your document/object contains more objects, and you only want specifics properties example, extract only verbs form user"""
+    query = {"id": id}
+    selection = get_projection_dict(include, None)
+    return await get_document_by_mongo_query(collection, query, selection)
+
+
+async def get_document_by_object_id(collection: str, id: str) -> dict:
+    """use mongo ObjectId version instead string this use mongo id property _id"""
+    mongo_col = get_collection(collection)
+    document = await mongo_col.find_one({"_id": ObjectId(id)})
+    if document:
+        document["id"] = str(document["_id"])
+        del document["_id"]
+    return document
+
+
+async def get_document_by_mongo_query(collection: str, query: dict, projection: dict = None) -> dict:
+    """basically a query with a dict, {'property1': property, 'property2': property2}, all queries exclude objectID aka _id"""
+    if projection is None:
+        projection = {}
+
+    projection = projection | {"_id": 0}
+
+    col = get_collection(collection)
+    return await col.find_one(query, projection)
+
+
+async def get_documents_by_query_projection(collection: str, query: dict, projection: dict = None, limit: int = None) -> list[Any]:
+    """Get all documents with params, query: mongo query, selection: filters, limit: to limit the query, return a list"""
+    if projection is None:
+        projection = {}
+
+    table = get_collection(collection)
+    projection = projection | {"_id": 0}
+
+    cursor = table.find(query, projection)
+    if limit:
+        cursor = cursor.limit(limit)
+    return await cursor.to_list()
+
+
+async def iter_documents(
+    collection: str, query: dict | None = None, projection: dict | None = None, limit: int | None = None, after_id: str | None = None, batch_size: int = 500
+) -> AsyncIterator[dict]:
+    """Yield documents one by one sorted by _id, memory is bounded by batch_size no matter the size of the collection.
+    after_id: keyset pagination, only documents with _id greater than the last _id of the previous page are returned"""
+    query = dict(query or {})
+    if after_id:
+        query["_id"] = {"$gt": ObjectId(after_id) if ObjectId.is_valid(after_id) else after_id}
+
+    cursor = get_collection(collection).find(query, projection or None, batch_size=batch_size).sort("_id", 1)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    async for document in cursor:
+        yield document
+
+
+async def save_document(collection: str, document: Any, manual_id: str | None = None, audit_user_id: str | None = None) -> dict:  # noqa: ANN401
+    """mongo agrega ids automaticamente, manual id para evitar este comportamiento"""
+    if isinstance(document, BaseModel):
+        document = document.model_dump()
+
+    id_data = document.get("_id") or document.get("id")
+
+    if id_data:
+        return await update(collection, document, id_data, audit_user_id)
+    else:
+        if manual_id:
+            document["id"] = manual_id
+        return await insert(collection, document, audit_user_id)
+
+
+async def insert_pretty(collection: str, document: dict, audit_user_id: str = None) -> dict:
+    """Insert a document with Object id '_id' and id string 'id', '_id' is not returned"""
+    if audit_user_id:
+        audit_data = {"createdDate": datetime.now(), "createdBy": audit_user_id}
+        document = document | audit_data
+
+    document["_id"] = ObjectId()
+    document["id"] = str(document["_id"])
+
+    col = get_collection(collection)
+    await col.insert_one(document)
+    document.pop("_id", None)
+    return document
+
+
+async def insert(table: str, document: dict, audit_user_id: str = None, cast_object_id: bool = False) -> dict:
+    if audit_user_id:
+        audit_data = {"createdDate": datetime.now(), "createdBy": audit_user_id}
+        document = document | audit_data
+
+    col = get_collection(table)
+    try:
+        await col.insert_one(document)
+        mongo_cache.invalidate(table, document.get("id"))
+        if cast_object_id:
+            document["_id"] = str(document["_id"])
+
+        return document
+    except pymongo.errors.WriteError as exc:
+        logger.warning("write error on %s: %s", table, exc)
+        if exc.code == DOCUMENT_VALIDATION_ERROR:
+            await __handle_invalid_data(col, document)
+
+
+async def count_array(array_prop: str, col: str, id: str) -> list[dict]:
+    collection = get_collection(col)
+    condition = {"$match": {"id": id}}
+    counter = {"$project": {"count": {"$size": f"${array_prop}"}}}
+    cursor = await collection.aggregate([condition, counter])
+    return await cursor.to_list()
+
+
+async def delete_document(collection: str, document_id: str) -> int:
+    filters = {"id": document_id}
+
+    mongo_col = get_collection(collection)
+    data = await mongo_col.delete_one(filters)
+    mongo_cache.invalidate_by_filter(collection, filters)
+    return data.deleted_count
+
+
+async def update(table: str, document: dict, id: str, audit_user_id: str = None, update_by_property: str = None) -> int:
+    """Actualiza solo las propiedades que se envian $set, si  recibe  audit_user_id se guardan datos adicionales."""
+    if audit_user_id:
+        audit_data = {"modifiedDate": datetime.now(), "modifiedBy": audit_user_id}
+        document = document | audit_data
+
+    if update_by_property:
+        query = {update_by_property: id}
+    else:
+        query = {"id": id}
+
+    updated_data = {key: value for (key, value) in document.items() if value is not None}
+
+    updated_values = {"$set": updated_data}
+    col = get_collection(table)
+
+    try:
+        result = await col.update_one(query, updated_values)
+        mongo_cache.invalidate_by_filter(table, query)
+        return result.raw_result["nModified"]
+    except pymongo.errors.WriteError as exc:
+        logger.warning("write error on %s: %s", table, exc)
+        if exc.code == DOCUMENT_VALIDATION_ERROR:
+            await __handle_invalid_data(col, document)
+
+
+async def update_with_operator(document_id: str, collection: str, update_operation: dict) -> bool:
+    """
+    :param document_id: id of the object
+    :param collection:
+    :param update: mongo update object built example: {'$set': {'recommendations.verbs': value}}
+    """
+    filter = {"id": document_id}
+    return await update_with_filter_and_operation(filter, update_operation, collection)
+
+
+async def update_with_filter_and_operation(filter: dict, operation: dict, collection: str) -> bool:
+    """
+    :param filter: custom filter { 'email': 'adamo@appingles.com'}
+    :param collection: name of the collection
+    :param operation: mongo object for update operation, example: {'$set': {'recommendations.verbs': value}}
+    """
+    col = get_collection(collection)
+    result = await col.update_one(filter, operation)
+    mongo_cache.invalidate_by_filter(collection, filter)
+    return True if result.matched_count >= 1 else False
+
+
+async def insert_record_in_collection(table: str, record: dict) -> None:
+    col = get_collection(table)
+    await col.insert_one(record)
+    mongo_cache.invalidate(table, record.get("id"))
+
+
+def get_collection(collection: str | CollectionName) -> AsyncCollection:
+    """Get Async Mongo Collection Object, does not do I/O so it is not a coroutine"""
+    return collection_registry.get_async_collection(collection)
+
+
+async def update_all_object(collection: str, id_name: str, id: str, object_dict: dict) -> int:
+    """Cuidado, cada valor pasado en el objecto lo va a actualizar, asegurarse de la construcción correcta"""
+    col = get_collection(collection)
+    query = {id_name: id}
+
+    list_attibutes = {}
+    for key, value in object_dict.items():
+        if isinstance(value, list):
+            list_attibutes[key] = {"$each": value}
+
+    updated_values = {"$push": list_attibutes}
+
+    result = await col.update_one(query, updated_values)
+    mongo_cache.invalidate_by_filter(collection, query)
+    return result.raw_result["nModified"]
+
+
+async def push_into_array(array_operation: ArrayOperationData) -> int:
+    """Push data in the property value array i.e. { words: [...] }"""
+    filters = {"id": array_operation["document_id"]}
+    push_update = {"$push": {array_operation["array_property"]: array_operation["value"]}}
+    mongo_col = get_collection(array_operation["collection"])
+    update_results = await mongo_col.update_one(filters, push_update)
+    mongo_cache.invalidate_by_filter(array_operation["collection"], filters)
+    return update_results.raw_result["nModified"]
+
+
+async def push_list_into_array(data: ArrayOperationData) -> None:
+    """Similar to  push_into_array but when you want to  push multiple objects, data['value'] should be a list"""
+    filters = {"id": data["document_id"]}
+    push = {"$push": {data["array_property"]: {"$each": data["value"]}}}
+
+    col = get_collection(data["collection"])
+    await col.update_one(filters, push)
+    mongo_cache.invalidate_by_filter(data["collection"], filters)
+
+
+async def update_all_objects_in_array(data: ArrayOperationData) -> None:
+    """Actualiza todos los objetos para agregar el valor que se requiere"""
+    filters = {"id": data["document_id"]}
+    update = {"$set": {f"{data['array_property']}.$[].{data['inner_object_property']}": data["value"]}}
+
+    col = get_collection(data["collection"])
+    await col.update_one(filter=filters, update=update)
+    mongo_cache.invalidate_by_filter(data["collection"], filters)
+
+
+async def update_object_in_array(data: ArrayOperationData) -> None:
+    """Actualiza un objeto en un arreglo, nota sobreescribe todo el objeto"""
+    array_property = data["array_property"]
+
+    filters = {"id": data["document_id"], f"{array_property}.id": data["inner_object_id"]}
+    update = {"$set": {array_property: data["value"]}}
+
+    col = get_collection(data["collection"])
+    await col.update_one(filter=filters, update=update)
+    mongo_cache.invalidate_by_filter(data["collection"], filters)
+
+
+async def update_object_property_in_array(data: ArrayOperationData) -> None:
+    """Same as mongo.update_object_property_in_array, only updates the property of the object with matching inner id"""
+    array_property = data["array_property"]
+
+    filters = {"id": data["document_id"], f"{array_property}.id": data["inner_object_id"]}
+    update = {"$set": {f"{array_property}.$.{data['inner_object_property']}": data["value"]}}
+
+    col = get_collection(data["collection"])
+    await col.update_one(filter=filters, update=update)
+    mongo_cache.invalidate_by_filter(data["collection"], filters)
+
+
+async def push_into_array_sort_and_trim(data: ArrayOperationData, trim_number: int, sort_property: str) -> None:
+    filters = {"id": data["document_id"]}
+
+    rules = {"$each": [data["value"]], "$sort": {sort_property: -1}, "$slice": trim_number}
+    update = {"$push": {data["array_property"]: rules}}
+
+    col = get_collection(data["collection"])
+    await col.update_one(filter=filters, update=update)
+    mongo_cache.invalidate_by_filter(data["collection"], filters)
+
+
+async def insert_objects_into_array(collection: str, id: str, property_array: str, records: list[Any]) -> None:
+    """Insert documents/objects into existing array example { 'property_array' : [...records] }"""
+    filters = {"id": id}
+    push = {"$push": {property_array: {"$each": records}}}
+    col = get_collection(collection)
+    await col.update_one(filters, push)
+    mongo_cache.invalidate_by_filter(collection, filters)
+
+
+async def delete_from_array(array_operation: ArrayOperationData) -> None:
+    """Deletes an existing object from array, see mongo.delete_from_array"""
+    array_property = array_operation["array_property"]
+    inner_object_property = array_operation.get("inner_object_property", "id")
+
+    remove = {"$pull": {array_property: {inner_object_property: array_operation["inner_object_id"]}}}
+    mongo_col = get_collection(array_operation["collection"])
+    filters = {"id": array_operation["document_id"]}
+
+    await mongo_col.update_one(filters, remove)
+    mongo_cache.invalidate_by_filter(array_operation["collection"], filters)
+
+
+async def bulk_write(
+    collection: str, operations: list[BulkOperationData], ordered: bool = True, audit_user_id: str | None = None, max_operations: int = BULK_MAX_OPERATIONS
+) -> BulkWriteSummary:
+    """Same as mongo.bulk_write, one awaited round trip per chunk"""
+    col = get_collection(collection)
+    specs = [build_bulk_spec(operation, audit_user_id) for operation in operations]
+    summary = new_bulk_summary()
+
+    try:
+        for offset, chunk in chunk_bulk_specs(specs, max_operations):
+            try:
+                result = await col.bulk_write(chunk, ordered=ordered)
+                add_bulk_result(summary, offset, result.bulk_api_result)
+            except pymongo.errors.BulkWriteError as exc:
+                add_bulk_result(summary, offset, exc.details)
+                for error in exc.details.get("writeErrors", []):
+                    index = offset + error["index"]
+                    summary["errors"].append({"index": index, "code": error.get("code"), "message": error.get("errmsg"), "documentId": operations[index].get("document_id")})
+                    if error.get("code") == DOCUMENT_VALIDATION_ERROR:
+                        await __handle_invalid_data(col, operations[index].get("value"))
+                if ordered:
+                    break
+    finally:
+        invalidate_bulk_operations(collection, operations)
+
+    return summary
+
+
+async def __handle_invalid_data(col: AsyncCollection, document: dict) -> None:
+    opts = await col.options()
+    schema = opts.get("validator", {}).get("$jsonSchema")
+    print("El eschema es .....", schema)
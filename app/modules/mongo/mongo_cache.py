@@ -0,0 +1,215 @@
+"""Opt-in read-through cache for mongo.py lookups by id
+
+Only collections listed in MONGO_CACHE_COLLECTIONS (or passed to configure_cache) are cached, entries are keyed by
+(collection, id, projection) and every mongo.py write that touches the id invalidates all projections of it.
+Only the by-id helpers of app.modules.mongo.mongo read through the cache (get_document_by_id, get_document_by_id_including,
+get_document_by_object_id). Repositories that query get_collection() directly or use dataclouder_mongo (agent_sources)
+are never cached, listing their collections does nothing. Names must be registered in collection_registry.CollectionName.
+
+    MONGO_CACHE_COLLECTIONS=generics
+    MONGO_CACHE_TTL_SECONDS=60
+    MONGO_CACHE_MAX_ENTRIES=2000         # in process backend, LRU by document
+    MONGO_CACHE_REDIS_URL=redis://...    # optional, shared backend for every worker, needs the `redis` package
+
+Documents are stored BSON encoded so callers always get a fresh copy they can mutate. A read racing with a write may
+cache the old version, the TTL bounds how long it can be served.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Protocol
+
+import bson
+
+ProjectionKey = str | None
+
+
+class CacheBackend(Protocol):
+    def get(self, collection: str, id: str, projection: ProjectionKey) -> bytes | None: ...
+
+    def set(self, collection: str, id: str, projection: ProjectionKey, value: bytes) -> None: ...
+
+    def delete(self, collection: str, id: str | None = None) -> None: ...
+
+    def stats(self) -> dict: ...
+
+
+class MemoryCache:
+    """LRU by (collection, id) with TTL, all projections of a document live in the same entry"""
+
+    def __init__(self, max_entries: int = 2000, ttl_seconds: float = 60) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[tuple[str, str], dict[ProjectionKey, tuple[float, bytes]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, collection: str, id: str, projection: ProjectionKey) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get((collection, id))
+            if entry is None or projection not in entry:
+                return None
+            expires_at, value = entry[projection]
+            if expires_at < time.monotonic():
+                del entry[projection]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end((collection, id))
+            return value
+
+    def set(self, collection: str, id: str, projection: ProjectionKey, value: bytes) -> None:
+        with self._lock:
+            entry = self._entries.setdefault((collection, id), {})
+            entry[projection] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end((collection, id))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, collection: str, id: str | None = None) -> None:
+        with self._lock:
+            if id is not None:
+                self._entries.pop((collection, id), None)
+            else:
+                for key in [key for key in self._entries if key[0] == collection]:
+                    del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": "memory", "size": len(self._entries), "evictions": self.evictions, "expirations": self.expirations}
+
+
+class RedisCache:
+    """Works with any Redis compatible server, one hash per document (field = projection) expiring after the TTL"""
+
+    def __init__(self, url: str, ttl_seconds: float = 60, prefix: str = "mongo-cache") -> None:
+        try:
+            import redis
+        except ImportError as exc:
+            raise ImportError("MONGO_CACHE_REDIS_URL requires the redis package: pip install redis") from exc
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl_seconds = int(ttl_seconds)
+        self.prefix = prefix
+
+    def _key(self, collection: str, id: str) -> str:
+        return f"{self.prefix}:{collection}:{id}"
+
+    def get(self, collection: str, id: str, projection: ProjectionKey) -> bytes | None:
+        return self.client.hget(self._key(collection, id), projection or "")
+
+    def set(self, collection: str, id: str, projection: ProjectionKey, value: bytes) -> None:
+        key = self._key(collection, id)
+        pipe = self.client.pipeline()
+        pipe.hset(key, projection or "", value)
+        pipe.expire(key, self.ttl_seconds)
+        pipe.execute()
+
+    def delete(self, collection: str, id: str | None = None) -> None:
+        if id is not None:
+            self.client.delete(self._key(collection, id))
+            return
+        keys = list(self.client.scan_iter(match=f"{self.prefix}:{collection}:*", count=500))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self) -> dict:
+        # redis evicts by itself (TTL / maxmemory), look at INFO stats evicted_keys on the server
+        return {"backend": "redis", "size": None, "evictions": None, "expirations": None}
+
+
+_backend: CacheBackend | None = None
+_collections: set[str] = set()
+_configured = False
+_counters = {"hits": 0, "misses": 0, "invalidations": 0}
+_counters_lock = threading.Lock()  # lookups run in the io pool threads too
+
+
+def configure_cache(collections: list[str], backend: CacheBackend | None = None, ttl_seconds: float = 60, max_entries: int = 2000) -> None:
+    """Enable the cache for the given collections, without backend an in process MemoryCache is used"""
+    global _backend, _collections, _configured  # noqa: PLW0603
+    _backend = backend or MemoryCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+    _collections = set(collections)
+    _configured = True
+
+
+def disable_cache() -> None:
+    global _backend, _collections  # noqa: PLW0603
+    _backend = None
+    _collections = set()
+
+
+def _configure_from_env() -> None:
+    global _configured  # noqa: PLW0603
+    _configured = True
+    collections = [name.strip() for name in os.getenv("MONGO_CACHE_COLLECTIONS", "").split(",") if name.strip()]
+    if not collections:
+        return
+    ttl_seconds = float(os.getenv("MONGO_CACHE_TTL_SECONDS", "60"))
+    redis_url = os.getenv("MONGO_CACHE_REDIS_URL")
+    backend = RedisCache(redis_url, ttl_seconds) if redis_url else None
+    configure_cache(collections, backend, ttl_seconds, int(os.getenv("MONGO_CACHE_MAX_ENTRIES", "2000")))
+
+
+def is_enabled(collection: str) -> bool:
+    if not _configured:
+        _configure_from_env()
+    return _backend is not None and collection in _collections
+
+
+def get_collections() -> list[str]:
+    if not _configured:
+        _configure_from_env()
+    return sorted(_collections)
+
+
+def projection_key(include: list[str] | None = None, by_object_id: bool = False) -> ProjectionKey:
+    if by_object_id:
+        return "_id"
+    return ",".join(sorted(include)) if include else None
+
+
+def get_document(collection: str, id: str, projection: ProjectionKey = None) -> tuple[bool, dict | None]:
+    """(found, document), found is False when the collection is not cached or on a miss"""
+    if not is_enabled(collection):
+        return False, None
+    value = _backend.get(collection, id, projection)
+    if value is None:
+        _count("misses")
+        return False, None
+    _count("hits")
+    return True, bson.decode(value)
+
+
+def set_document(collection: str, id: str, projection: ProjectionKey, document: dict | None) -> None:
+    """Not found documents are not cached, an insert would have to invalidate them"""
+    if document is None or not is_enabled(collection):
+        return
+    _backend.set(collection, id, projection, bson.encode(document))
+
+
+def invalidate(collection: str, id: object = None) -> None:
+    """Drop every projection of the document, without a string id (filters by other properties) drop the collection"""
+    if not is_enabled(collection):
+        return
+    _count("invalidations")
+    _backend.delete(collection, id if isinstance(id, str) else None)
+
+
+def invalidate_by_filter(collection: str, filter: dict) -> None:
+    invalidate(collection, filter.get("id"))
+
+
+def _count(name: str) -> None:
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def get_stats() -> dict:
+    backend_stats = _backend.stats() if _backend else {"backend": None}
+    with _counters_lock:
+        counters = dict(_counters)
+    return {"enabled": sorted(_collections), **counters, **backend_stats}
@@ -0,0 +1,183 @@
+"""Process wide Mongo clients
+
+Clients are created lazily on first use (importing mongo.py no longer connects) and shared by every caller,
+so each worker has one sync pool and one async pool. Pool options come from env vars, see MongoSettings.
+"""
+
+import os
+import threading
+
+from pydantic import BaseModel
+from pymongo import AsyncMongoClient, MongoClient, monitoring
+
+from app.modules.mongo import instrumentation
+
+
+class MongoSettings(BaseModel):
+    """Pool and connection options, every field can be set with the MONGO_<FIELD> env var i.e. MONGO_MAX_POOL_SIZE=50"""
+
+    max_pool_size: int = 100
+    min_pool_size: int = 0
+    max_idle_time_ms: int | None = 300_000
+    wait_queue_timeout_ms: int | None = None
+    server_selection_timeout_ms: int = 10_000
+    connect_timeout_ms: int = 10_000
+    compressors: str = ""  # comma separated: zstd,snappy,zlib. zstd needs `zstandard` and snappy `python-snappy` installed
+    read_preference: str = "primary"  # primary, primaryPreferred, secondary, secondaryPreferred, nearest
+    app_name: str = "startup-template-python"
+    instrumentation_sample_rate: float = 0.0  # 0 disables the query instrumentation, 1 times every command
+    slow_query_ms: float = 100  # sampled commands slower than this go to the slow query log
+
+    def get_listeners(self, pool_listener: "PoolStatsListener") -> list:
+        return [pool_listener, *instrumentation.get_listeners(self.instrumentation_sample_rate, self.slow_query_ms)]
+
+    @classmethod
+    def from_env(cls) -> "MongoSettings":
+        values = {}
+        for field in cls.model_fields:
+            value = os.getenv(f"MONGO_{field.upper()}")
+            if value is not None and value != "":
+                values[field] = value
+        return cls(**values)
+
+    def client_options(self) -> dict:
+        options = {
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "maxIdleTimeMS": self.max_idle_time_ms,
+            "waitQueueTimeoutMS": self.wait_queue_timeout_ms,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+            "connectTimeoutMS": self.connect_timeout_ms,
+            "readPreference": self.read_preference,
+            "appname": self.app_name,
+        }
+        if self.compressors:
+            options["compressors"] = self.compressors
+        return {key: value for key, value in options.items() if value is not None}
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Keeps connection pool counters for one client, events can arrive from many threads"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.created = 0
+            self.closed = 0
+            self.checked_out = 0
+            self.wait_queue = 0
+            self.check_out_failed = 0
+            self.pool_cleared = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "created": self.created,
+                "closed": self.closed,
+                "open": self.created - self.closed,
+                "checkedOut": self.checked_out,
+                "waitQueue": self.wait_queue,
+                "checkOutFailed": self.check_out_failed,
+                "poolCleared": self.pool_cleared,
+            }
+
+    def _add(self, **deltas: int) -> None:
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def pool_created(self, event: monitoring.PoolCreatedEvent) -> None:
+        pass
+
+    def pool_ready(self, event: monitoring.PoolReadyEvent) -> None:
+        pass
+
+    def pool_cleared(self, event: monitoring.PoolClearedEvent) -> None:
+        self._add(pool_cleared=1)
+
+    def pool_closed(self, event: monitoring.PoolClosedEvent) -> None:
+        pass
+
+    def connection_created(self, event: monitoring.ConnectionCreatedEvent) -> None:
+        self._add(created=1)
+
+    def connection_ready(self, event: monitoring.ConnectionReadyEvent) -> None:
+        pass
+
+    def connection_closed(self, event: monitoring.ConnectionClosedEvent) -> None:
+        self._add(closed=1)
+
+    def connection_check_out_started(self, event: monitoring.ConnectionCheckOutStartedEvent) -> None:
+        self._add(wait_queue=1)
+
+    def connection_check_out_failed(self, event: monitoring.ConnectionCheckOutFailedEvent) -> None:
+        self._add(wait_queue=-1, check_out_failed=1)
+
+    def connection_checked_out(self, event: monitoring.ConnectionCheckedOutEvent) -> None:
+        self._add(wait_queue=-1, checked_out=1)
+
+    def connection_checked_in(self, event: monitoring.ConnectionCheckedInEvent) -> None:
+        self._add(checked_out=-1)
+
+
+_lock = threading.Lock()
+_client: MongoClient | None = None
+_async_client: AsyncMongoClient | None = None
+sync_pool_listener = PoolStatsListener()
+async_pool_listener = PoolStatsListener()
+
+
+def get_mongo_uri() -> str:
+    """MONGO_URI overrides the atlas uri, useful for a local mongod i.e. mongodb://localhost:27017"""
+    if os.getenv("MONGO_URI"):
+        return os.getenv("MONGO_URI")
+    return f"mongodb+srv://{os.getenv('MONGO_USER')}:{os.getenv('MONGO_PASS')}@{os.getenv('MONGO_HOST')}/{os.getenv('MONGO_DB')}?retryWrites=true&w=majority"
+
+
+def get_mongo_db_name() -> str:
+    return os.getenv("MONGO_DB", "")
+
+
+def get_client() -> MongoClient:
+    """Sync client shared by the process, created on first call"""
+    global _client  # noqa: PLW0603
+    if _client is None:
+        with _lock:
+            if _client is None:
+                settings = MongoSettings.from_env()
+                _client = MongoClient(get_mongo_uri(), event_listeners=settings.get_listeners(sync_pool_listener), **settings.client_options())
+    return _client
+
+
+def get_async_client() -> AsyncMongoClient:
+    """Async client shared by the process, created on first call"""
+    global _async_client  # noqa: PLW0603
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                settings = MongoSettings.from_env()
+                _async_client = AsyncMongoClient(get_mongo_uri(), event_listeners=settings.get_listeners(async_pool_listener), **settings.client_options())
+    return _async_client
+
+
+def get_pool_stats() -> dict:
+    """Connection pool counters, a client that was never created reports None"""
+    return {
+        "sync": sync_pool_listener.stats() if _client is not None else None,
+        "async": async_pool_listener.stats() if _async_client is not None else None,
+    }
+
+
+async def close_clients() -> None:
+    global _client, _async_client  # noqa: PLW0603
+    if _client is not None:
+        _client.close()
+        _client = None
+        sync_pool_listener.reset()
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+        async_pool_listener.reset()
@@ -1,13 +1,55 @@
-from fastapi import APIRouter
+from typing import Literal
 
-from app.modules.mongo import mongo
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.modules.mongo import collection_registry, instrumentation, mongo_async, mongo_cache, mongo_client, mongo_stream
+from app.modules.mongo.mongo_json import MongoJSONResponse
 
 # from app.conversations import conversation_agents
 
 router = APIRouter()
 
 
-@router.get("/api/mongo/get_all_data_in_collection", tags=["Mongo"])
-async def get_all_data_in_collection(collection: str) -> list[dict]:
-    data = mongo.get_documents_by_query_projection(collection, {}, {})
-    return data
+@router.get("/api/mongo/get_all_data_in_collection", tags=["Mongo"], response_model=None)
+async def get_all_data_in_collection(  # noqa: PLR0913
+    collection: str,
+    stream: Literal["ndjson", "json"] | None = None,
+    fields: str | None = None,
+    limit: int | None = None,
+    after_id: str | None = None,
+    batch_size: int = 500,
+) -> MongoJSONResponse | StreamingResponse:
+    """stream=ndjson|json streams the collection sorted by _id with flat memory, fields: comma separated projection,
+    after_id: _id of the last document received to get the next page"""
+    try:
+        collection_registry.resolve_name(collection)
+    except collection_registry.UnknownCollectionError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+
+    if stream is None:
+        projection = mongo_async.get_projection_dict(fields.split(","), None) if fields else {}
+        data = await mongo_async.get_documents_by_query_projection(collection, {}, projection, limit)
+        return MongoJSONResponse(data)
+
+    projection = mongo_async.get_projection_dict(fields.split(","), None) if fields else None
+    documents = mongo_async.iter_documents(collection, projection=projection, limit=limit, after_id=after_id, batch_size=batch_size)
+    if stream == "ndjson":
+        return StreamingResponse(mongo_stream.iter_ndjson(documents, batch_size), media_type=mongo_stream.NDJSON_MEDIA_TYPE)
+    return StreamingResponse(mongo_stream.iter_json_array(documents, batch_size), media_type=mongo_stream.JSON_MEDIA_TYPE)
+
+
+@router.get("/api/mongo/pool_stats", tags=["Mongo"])
+async def get_pool_stats() -> dict:
+    return mongo_client.get_pool_stats()
+
+
+@router.get("/api/mongo/cache_stats", tags=["Mongo"])
+async def get_cache_stats() -> dict:
+    return mongo_cache.get_stats()
+
+
+@router.get("/api/mongo/query_stats", tags=["Mongo"])
+async def get_query_stats() -> dict:
+    """Per collection latency histogram, docs and bytes returned, only when MONGO_INSTRUMENTATION_SAMPLE_RATE > 0"""
+    return instrumentation.get_query_stats()
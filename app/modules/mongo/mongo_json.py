@@ -0,0 +1,41 @@
+"""Mongo documents straight to JSON bytes
+
+orjson serializes dicts, lists, datetime and numpy/uuid natively, default() only sees the bson types it doesn't know,
+so a page of raw documents is encoded in one call without converting _id in place or building a Pydantic model per row.
+
+    @router.post("/query", response_class=MongoJSONResponse)
+    async def find_filtered(filters: PageFiltersConfig) -> MongoJSONResponse:
+        return MongoJSONResponse(service.find_filtered(filters))
+
+Returning a Response instance skips FastAPI's response_model validation and jsonable_encoder.
+"""
+
+import orjson
+from bson import Decimal128, ObjectId, Timestamp
+from fastapi.responses import JSONResponse
+
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def default(obj: object) -> object:
+    """ObjectId as its hex string, Decimal128 as string to keep the precision, naive datetimes stay naive (isoformat)"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        return str(obj.to_decimal())
+    if isinstance(obj, Timestamp):
+        return obj.as_datetime()
+    if isinstance(obj, bytes):  # bson Binary is a bytes subclass
+        return obj.hex()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: object) -> bytes:
+    return orjson.dumps(content, default=default, option=OPTIONS)
+
+
+class MongoJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: object) -> bytes:
+        return dumps(content)
@@ -0,0 +1,41 @@
+"""Turn a Mongo cursor into a byte stream for StreamingResponse, one batch of documents per chunk"""
+
+from collections.abc import AsyncIterator
+
+from app.modules.mongo import mongo_json
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+JSON_MEDIA_TYPE = "application/json"
+
+
+def encode_document(document: dict) -> bytes:
+    """Same encoding as MongoJSONResponse, ObjectId and Decimal128 end as string"""
+    return mongo_json.dumps(document)
+
+
+async def iter_ndjson(documents: AsyncIterator[dict], chunk_size: int = 500) -> AsyncIterator[bytes]:
+    """One json document per line, the last line _id is the after_id for the next page"""
+    lines: list[bytes] = []
+    async for document in documents:
+        lines.append(encode_document(document))
+        if len(lines) >= chunk_size:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+
+async def iter_json_array(documents: AsyncIterator[dict], chunk_size: int = 500) -> AsyncIterator[bytes]:
+    """A regular json array, written in chunks so the full list never lives in memory"""
+    yield b"["
+    first = True
+    items: list[bytes] = []
+    async for document in documents:
+        items.append(encode_document(document))
+        if len(items) >= chunk_size:
+            yield (b"" if first else b",") + b",".join(items)
+            first = False
+            items = []
+    if items:
+        yield (b"" if first else b",") + b",".join(items)
+    yield b"]"
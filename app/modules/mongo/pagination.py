@@ -0,0 +1,127 @@
+"""Keyset pagination for FiltersConfig queries
+
+Instead of skip/limit each page starts right after the last document of the previous page, the position travels in
+an opaque cursor token (values of the sort fields + _id of the last row), so every page costs O(page size) with an index
+on the sort fields, no matter how deep the client scrolls.
+"""
+
+import base64
+
+from bson import json_util
+from dataclouder_core.models.models import FiltersConfig
+from typing_extensions import TypedDict
+
+from app.modules.mongo import mongo
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class PageFiltersConfig(FiltersConfig):
+    """FiltersConfig plus cursor: nextCursor of the previous page, count: also return the total of documents"""
+
+    cursor: str | None = None
+    count: bool = False
+
+
+class PageResult(TypedDict):
+    rows: list[dict]
+    nextCursor: str | None
+    count: int | None
+
+
+def encode_cursor(values: list) -> str:
+    """json_util keeps ObjectId and datetime types so the token compares the same way in the next query"""
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode()
+
+
+def decode_cursor(token: str) -> list:
+    try:
+        return json_util.loads(base64.urlsafe_b64decode(token.encode()))
+    except Exception as exc:
+        raise ValueError("Invalid pagination cursor") from exc
+
+
+def get_sort_fields(sort: dict[str, int] | None) -> list[tuple[str, int]]:
+    """Sort fields always end with _id so the order is total and ties do not repeat or skip rows"""
+    fields = [(field, 1 if direction >= 0 else -1) for field, direction in (sort or {}).items()]
+    if not any(field == "_id" for field, _ in fields):
+        fields.append(("_id", fields[-1][1] if fields else 1))
+    return fields
+
+
+def build_keyset_query(sort_fields: list[tuple[str, int]], last_values: list) -> dict:
+    """(a > va) or (a == va and b > vb) or ... using $lt for descending fields"""
+    conditions = []
+    for position, (field, direction) in enumerate(sort_fields):
+        condition = {previous: last_values[index] for index, (previous, _) in enumerate(sort_fields[:position])}
+        condition[field] = {"$gt" if direction == 1 else "$lt": last_values[position]}
+        conditions.append(condition)
+    return {"$or": conditions}
+
+
+def _get_value(document: dict, field: str) -> object:
+    value = document
+    for key in field.split("."):
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def _overlaps(field: str, other: str) -> bool:
+    """Same path, or one is inside the other (statistics and statistics.play_count)"""
+    return field == other or field.startswith(f"{other}.") or other.startswith(f"{field}.")
+
+
+def _is_inside(field: str, projection: dict) -> bool:
+    return any(value and (field == included or field.startswith(f"{included}.")) for included, value in projection.items())
+
+
+def _get_projection(return_props: dict | None, sort_fields: list[tuple[str, int]]) -> dict | None:
+    """The sort fields and _id are needed to build the next cursor: inclusive projections get them added, exclusive
+    projections lose the exclusions that would hide them"""
+    if not return_props:
+        return None
+    projection = {field: value for field, value in return_props.items() if field != "_id"}
+    if any(projection.values()):
+        # a sort field inside an included sub-document is already there, adding it again is a path collision
+        projection.update({field: 1 for field, _ in sort_fields if not _is_inside(field, projection)})
+    else:
+        projection = {field: value for field, value in projection.items() if not any(_overlaps(field, sort_field) for sort_field, _ in sort_fields)}
+    return projection or None
+
+
+def paginate(collection: str, filters: FiltersConfig, max_page_size: int = MAX_PAGE_SIZE) -> PageResult:
+    """Query a page of documents, filters.filters is the mongo query, sort/return_props/rows_per_page shape the page.
+    filters.page is only used (skip) when no cursor is sent, to keep old clients working. Rows keep their bson types,
+    return them with MongoJSONResponse."""
+    col = mongo.get_collection(collection)
+    query = filters.filters or {}
+    cursor_token = getattr(filters, "cursor", None)
+    with_count = getattr(filters, "count", False)
+
+    page_size = min(filters.rows_per_page or DEFAULT_PAGE_SIZE, max_page_size)
+    sort_fields = get_sort_fields(filters.sort)
+
+    find_query = query
+    if cursor_token:
+        last_values = decode_cursor(cursor_token)
+        if len(last_values) != len(sort_fields):
+            raise ValueError("Pagination cursor does not match the sort")
+        find_query = {"$and": [query, build_keyset_query(sort_fields, last_values)]} if query else build_keyset_query(sort_fields, last_values)
+
+    cursor = col.find(find_query, _get_projection(filters.return_props, sort_fields)).sort(sort_fields).limit(page_size + 1)
+    if not cursor_token and filters.page:
+        cursor = cursor.skip(filters.page * page_size)
+
+    rows = list(cursor)
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor([_get_value(rows[-1], field) for field, _ in sort_fields])
+
+    count = None
+    if with_count:
+        # collection metadata is O(1), an actual count is only needed when there is a query
+        count = col.count_documents(query) if query else col.estimated_document_count()
+
+    return {"rows": rows, "nextCursor": next_cursor, "count": count}
@@ -0,0 +1,210 @@
+"""Parquet snapshots of a collection for offline analytics
+
+Streams a collection into a hive partitioned dataset, one directory per author and month:
+
+    <root>/<collection>/author=<unique_id>/month=<YYYY-MM>/part-<run>-<n>.parquet
+
+Sub-documents listed in `flatten` become columns (statistics.play_count -> statistics_play_count), other nested values
+are stored as JSON strings. Exports are incremental, _state.json keeps the last exported _id and the next run only reads
+documents inserted after it (ObjectIds grow with insert time, unlike create_time which is when the video was posted and
+arrives in any order). Documents updated in place are not exported again, use --full to refresh them. _schema.arrow
+keeps the merged schema so files written with older shapes still read.
+Readers memory-map the files, analysis never touches Mongo:
+
+    python -m app.modules.mongo.snapshot export tiktoks_aweme --root data/snapshots
+    table = snapshot.read_snapshot("data/snapshots", "tiktoks_aweme", authors=["polilan_app"], columns=["statistics_play_count"])
+
+Needs pyarrow (pip install pyarrow).
+"""
+
+import argparse
+import shutil
+import sys
+import uuid
+from datetime import UTC, datetime
+from pathlib import Path
+
+from bson import json_util
+
+from app.modules.mongo import mongo, mongo_json
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+except ImportError:  # optional dependency
+    pa = None
+
+DEFAULT_FLATTEN = ("statistics", "author")
+ROWS_PER_WRITE = 50_000
+STATE_FILE = "_state.json"
+SCHEMA_FILE = "_schema.arrow"
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError("snapshots require the pyarrow package: pip install pyarrow")
+
+
+def _get_value(document: dict, field: str) -> object:
+    value = document
+    for key in field.split("."):
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def to_datetime(value: object) -> datetime | None:
+    """create_time is unix seconds in tiktoks_aweme, dates are accepted for other collections"""
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=UTC)
+    if isinstance(value, int | float):
+        return datetime.fromtimestamp(value, UTC)
+    return None
+
+
+def _scalar(value: object) -> object:
+    if value is None or isinstance(value, bool | int | float | str | datetime):
+        return value
+    if isinstance(value, dict | list):
+        return mongo_json.dumps(value).decode()
+    return str(value)  # ObjectId, Decimal128...
+
+
+def flatten_document(document: dict, flatten: tuple[str, ...] = DEFAULT_FLATTEN) -> dict:
+    """One level of the `flatten` sub-documents becomes prefix_key columns, everything else is a scalar column"""
+    row = {}
+    for key, value in document.items():
+        if key in flatten and isinstance(value, dict):
+            row.update({f"{key}_{sub_key}": _scalar(sub_value) for sub_key, sub_value in value.items()})
+        else:
+            row[key] = _scalar(value)
+    return row
+
+
+def partition_values(document: dict, author_field: str, time_field: str) -> tuple[str, str]:
+    author = _get_value(document, author_field)
+    created = to_datetime(_get_value(document, time_field))
+    return (str(author) if author else "unknown", created.strftime("%Y-%m") if created else "unknown")
+
+
+def _read_state(path: Path) -> dict:
+    state_path = path / STATE_FILE
+    return json_util.loads(state_path.read_text()) if state_path.exists() else {}
+
+
+def _read_schema(path: Path) -> "pa.Schema | None":
+    schema_path = path / SCHEMA_FILE
+    if not schema_path.exists():
+        return None
+    with pa.memory_map(str(schema_path)) as source:
+        return pa.ipc.read_schema(source)
+
+
+def _write_rows(path: Path, rows: list[dict], schema: "pa.Schema | None", basename: str) -> "pa.Schema":
+    """Writes one chunk and returns the schema merged with the previous ones (int columns that get floats become double)"""
+    table = pa.Table.from_pylist(rows)
+    merged = pa.unify_schemas([schema, table.schema], promote_options="permissive") if schema is not None else table.schema
+    table = pa.Table.from_pylist(rows, schema=merged)
+    ds.write_dataset(
+        table,
+        path,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([("author", pa.string()), ("month", pa.string())]), flavor="hive"),
+        basename_template=f"{basename}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    (path / SCHEMA_FILE).write_bytes(merged.serialize().to_pybytes())
+    return merged
+
+
+def export_collection(  # noqa: PLR0913
+    collection: str,
+    root: str | Path,
+    author_field: str = "author.unique_id",
+    time_field: str = "create_time",
+    flatten: tuple[str, ...] = DEFAULT_FLATTEN,
+    full: bool = False,
+    rows_per_write: int = ROWS_PER_WRITE,
+) -> dict:
+    """Append the documents inserted since the last export (all of them with full=True, the dataset is deleted first).
+    Documents are read sorted by _id so the state can be saved after every chunk and a failed run resumes, time_field
+    only picks the month partition."""
+    _require_pyarrow()
+    path = Path(root) / str(collection)
+    if full and path.exists():
+        shutil.rmtree(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    state = _read_state(path)
+    schema = _read_schema(path)
+    last_id = state.get("lastId")
+    query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+    cursor = mongo.get_collection(collection).find(query, batch_size=5000).sort("_id", 1)
+
+    run = uuid.uuid4().hex[:12]
+    rows: list[dict] = []
+    written = 0
+    chunk = 0
+    for document in cursor:
+        last_id = document.pop("_id")
+        row = flatten_document(document, flatten)
+        row["author"], row["month"] = partition_values(document, author_field, time_field)
+        rows.append(row)
+        if len(rows) >= rows_per_write:
+            schema = _write_rows(path, rows, schema, f"part-{run}-{chunk}")
+            written += len(rows)
+            chunk += 1
+            rows = []
+            _save_state(path, last_id, written + state.get("rows", 0))
+    if rows:
+        schema = _write_rows(path, rows, schema, f"part-{run}-{chunk}")
+        written += len(rows)
+        _save_state(path, last_id, written + state.get("rows", 0))
+
+    return {"collection": str(collection), "path": str(path), "rows": written, "lastId": None if last_id is None else str(last_id)}
+
+
+def _save_state(path: Path, last_id: object, rows: int) -> None:
+    """Extended JSON, the _id keeps its BSON type ({"$oid": ...}) for the next $gt"""
+    (path / STATE_FILE).write_text(json_util.dumps({"lastId": last_id, "rows": rows}))
+
+
+def open_snapshot(root: str | Path, collection: str) -> "ds.Dataset":
+    """Dataset over the memory-mapped parquet files, author and month are partition columns (filters skip directories)"""
+    _require_pyarrow()
+    path = Path(root) / str(collection)
+    return ds.dataset(
+        str(path),
+        schema=_read_schema(path),
+        format="parquet",
+        partitioning="hive",
+        filesystem=fs.LocalFileSystem(use_mmap=True),
+        exclude_invalid_files=True,
+    )
+
+
+def read_snapshot(root: str | Path, collection: str, authors: list[str] | None = None, months: list[str] | None = None, columns: list[str] | None = None) -> "pa.Table":
+    dataset = open_snapshot(root, collection)
+    expression = None
+    if authors:
+        expression = ds.field("author").isin(authors)
+    if months:
+        months_filter = ds.field("month").isin(months)
+        expression = months_filter if expression is None else expression & months_filter
+    return dataset.to_table(columns=columns, filter=expression)
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.modules.mongo.snapshot")
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("collection")
+    parser.add_argument("--root", default="data/snapshots")
+    parser.add_argument("--full", action="store_true", help="delete the snapshot and export everything again")
+    args = parser.parse_args(argv[1:])
+
+    print(export_collection(args.collection, args.root, full=args.full))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
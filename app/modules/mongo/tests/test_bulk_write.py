@@ -0,0 +1,65 @@
+from unittest.mock import Mock, patch
+
+import pytest
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.modules.mongo import mongo
+
+
+@pytest.fixture
+def mock_collection() -> Mock:  # type: ignore
+    with patch("app.modules.mongo.mongo.get_collection") as mock:
+        yield mock.return_value
+
+
+def _ok(chunk: list, ordered: bool = True) -> Mock:
+    inserted = sum(isinstance(request, InsertOne) for request in chunk)
+    return Mock(bulk_api_result={"nInserted": inserted, "nMatched": len(chunk) - inserted, "nModified": len(chunk) - inserted, "nUpserted": 0, "upserted": []})
+
+
+def test_chunk_by_operations_and_bytes() -> None:
+    specs = [(None, {"index": index, "payload": "x" * 100}, None) for index in range(10)]
+
+    chunks = mongo.chunk_bulk_specs(specs, max_operations=4)
+    assert [(offset, len(chunk)) for offset, chunk in chunks] == [(0, 4), (4, 4), (8, 2)]
+    assert chunks[0][1][0] == InsertOne({"index": 0, "payload": "x" * 100})
+
+    chunks = mongo.chunk_bulk_specs(specs, max_operations=100, max_bytes=300)
+    assert all(len(chunk) <= 2 for _, chunk in chunks)
+    assert sum(len(chunk) for _, chunk in chunks) == 10
+
+
+def test_build_bulk_requests() -> None:
+    upsert = mongo.build_bulk_request({"type": "upsert", "document_id": "a", "value": {"name": "new", "description": None}})
+    assert upsert == UpdateOne({"id": "a"}, {"$set": {"name": "new"}}, upsert=True)
+
+    push_list = mongo.build_bulk_request({"type": "push_list", "document_id": "a", "id_property": "slug", "array_property": "tags", "value": ["x", "y"]})
+    assert push_list == UpdateOne({"slug": "a"}, {"$push": {"tags": {"$each": ["x", "y"]}}})
+
+    with pytest.raises(ValueError):
+        mongo.build_bulk_request({"type": "replace", "document_id": "a", "value": {}})
+
+
+def test_bulk_write_sums_chunks(mock_collection: Mock) -> None:
+    mock_collection.bulk_write.side_effect = _ok
+    operations = [{"type": "insert", "value": {"index": index}} for index in range(5)] + [{"type": "set", "document_id": "a", "value": {"name": "b"}}]
+
+    summary = mongo.bulk_write("cards", operations, max_operations=2)
+
+    assert mock_collection.bulk_write.call_count == 3
+    assert summary["inserted"] == 5
+    assert summary["modified"] == 1
+    assert summary["errors"] == []
+
+
+@pytest.mark.parametrize("ordered, calls", [(True, 1), (False, 2)])
+def test_bulk_write_reports_errors_by_operation_index(mock_collection: Mock, ordered: bool, calls: int) -> None:
+    details = {"nInserted": 1, "writeErrors": [{"index": 1, "code": 11000, "errmsg": "duplicate key"}], "upserted": []}
+    mock_collection.bulk_write.side_effect = [BulkWriteError(details), Mock(bulk_api_result={"nInserted": 2})]
+    operations = [{"type": "upsert", "document_id": f"doc-{index}", "value": {"index": index}} for index in range(4)]
+
+    summary = mongo.bulk_write("cards", operations, ordered=ordered, max_operations=2)
+
+    assert mock_collection.bulk_write.call_count == calls
+    assert summary["errors"] == [{"index": 1, "code": 11000, "message": "duplicate key", "documentId": "doc-1"}]
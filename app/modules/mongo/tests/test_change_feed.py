@@ -0,0 +1,99 @@
+import asyncio
+import contextlib
+import json
+from unittest.mock import MagicMock, patch
+
+from pymongo.errors import AutoReconnect, OperationFailure
+
+from app.modules.mongo.change_feed import ChangeFeed, MongoChangeSource, QueueChangeSource, iter_sse, merge_delta
+
+
+def _change(key: str, **data: object) -> dict:
+    return {"operationType": "update", "ns": {"db": "test", "coll": "items"}, "key": key, "data": data}
+
+
+def _mapper(change: dict) -> dict:
+    return {"type": "item", "key": change["key"], "data": change["data"]}
+
+
+def test_merge_delta_keeps_latest_values() -> None:
+    pending: dict = {}
+    merge_delta(pending, {"type": "item", "key": "a", "data": {"plays": 1, "likes": 1}})
+    merge_delta(pending, {"type": "item", "key": "a", "data": {"plays": 5}})
+    merge_delta(pending, {"type": "item", "key": "b", "data": {"plays": 2}})
+
+    assert list(pending.values()) == [
+        {"type": "item", "key": "a", "data": {"plays": 5, "likes": 1}},
+        {"type": "item", "key": "b", "data": {"plays": 2}},
+    ]
+
+
+def test_burst_is_coalesced_and_filtered() -> None:
+    async def run() -> tuple[list, list, bool]:
+        source = QueueChangeSource()
+        feed = ChangeFeed(source, {"items": _mapper}, coalesce_seconds=0.05)
+        everything = feed.subscribe().batches()
+        only_b = feed.subscribe(lambda delta: delta["key"] == "b").batches()
+        for plays in range(10):
+            source.put(_change("a", plays=plays))
+        source.put(_change("b", plays=1))
+        source.put({"operationType": "update", "ns": {"coll": "unknown"}})
+
+        first, filtered = await anext(everything), await anext(only_b)
+        await everything.aclose()
+        await only_b.aclose()
+        return first, filtered, feed._task is None
+
+    first, filtered, stopped = asyncio.run(run())
+
+    assert first == [{"type": "item", "key": "a", "data": {"plays": 9}}, {"type": "item", "key": "b", "data": {"plays": 1}}]
+    assert filtered == [{"type": "item", "key": "b", "data": {"plays": 1}}]
+    assert stopped  # the stream closes with the last subscriber
+
+
+def test_sse_heartbeat_and_events() -> None:
+    async def run() -> list[bytes]:
+        source = QueueChangeSource()
+        feed = ChangeFeed(source, {"items": _mapper}, coalesce_seconds=0)
+        events = iter_sse(feed.subscribe(), heartbeat_seconds=0.01)
+        chunks = [await anext(events)]
+        source.put(_change("a", plays=3))
+        chunks.append(await anext(events))
+        await events.aclose()
+        return chunks
+
+    ping, event = asyncio.run(run())
+
+    assert ping == b": ping\n\n"
+    name, data = event.decode().strip().split("\n")
+    assert name == "event: deltas"
+    assert json.loads(data.removeprefix("data: ")) == [{"type": "item", "key": "a", "data": {"plays": 3}}]
+
+
+def test_resume_token_is_dropped_when_it_cant_be_resumed() -> None:
+    db = MagicMock()
+    db.watch.side_effect = [AutoReconnect("primary stepped down"), OperationFailure("history lost", code=286), asyncio.CancelledError()]
+    source = MongoChangeSource(["items"], retry_seconds=0)
+    source.resume_token = {"_data": "t0"}
+
+    async def run() -> None:
+        async for _ in source.changes():
+            pass
+
+    with patch("app.modules.mongo.change_feed.mongo_async.get_db", return_value=db), contextlib.suppress(asyncio.CancelledError):
+        asyncio.run(run())
+
+    assert [call.kwargs["resume_after"] for call in db.watch.call_args_list] == [{"_data": "t0"}, {"_data": "t0"}, None]
+
+
+def test_last_unsubscribe_resets_the_source() -> None:
+    source = QueueChangeSource()
+    source.reset = MagicMock()
+
+    async def run() -> None:
+        feed = ChangeFeed(source, {"items": _mapper})
+        await feed.unsubscribe(feed.subscribe())
+
+    asyncio.run(run())
+    source.reset.assert_called_once()
+
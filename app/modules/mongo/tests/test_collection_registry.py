@@ -0,0 +1,55 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from pymongo import MongoClient
+from pymongo.write_concern import WriteConcern
+
+from app.modules.mongo import collection_registry
+from app.modules.mongo.collection_registry import CollectionName, CollectionSpec, UnknownCollectionError
+
+
+@pytest.fixture
+def client(monkeypatch: pytest.MonkeyPatch) -> MongoClient:
+    monkeypatch.setenv("MONGO_DB", "test")
+    # connect=False never opens a socket, handles can be built without a server
+    client = MongoClient("mongodb://localhost:27017", connect=False)
+    with patch("app.modules.mongo.collection_registry.mongo_client.get_client", return_value=client):
+        yield client
+    client.close()
+
+
+def test_handles_are_cached_with_spec_options(client: MongoClient) -> None:
+    spec = CollectionSpec(write_concern=WriteConcern(w="majority", wtimeout=5000))
+    with patch.dict(collection_registry.COLLECTION_SPECS, {CollectionName.TIKTOKS_AWEME: spec}):
+        handle = collection_registry.get_collection("tiktoks_aweme")
+
+        assert collection_registry.get_collection(CollectionName.TIKTOKS_AWEME) is handle
+        assert handle.write_concern.document == {"w": "majority", "wtimeout": 5000}
+
+
+def test_handle_is_rebuilt_for_a_new_client(client: MongoClient) -> None:
+    handle = collection_registry.get_collection(CollectionName.GENERICS)
+    other = MongoClient("mongodb://localhost:27017", connect=False)
+    with patch("app.modules.mongo.collection_registry.mongo_client.get_client", return_value=other):
+        assert collection_registry.get_collection(CollectionName.GENERICS) is not handle
+    other.close()
+
+
+def test_unknown_names_fail_fast() -> None:
+    with pytest.raises(UnknownCollectionError):
+        collection_registry.get_collection("agent_card")
+    with pytest.raises(UnknownCollectionError):
+        collection_registry.check_names(["generics", "generic"])
+
+
+def test_ensure_collections_creates_time_series_and_reports_regular_ones() -> None:
+    db = MagicMock()
+    db.list_collections.return_value = []
+    with patch("app.modules.mongo.collection_registry.mongo_client.get_client", return_value={"test": db}), patch.dict("os.environ", {"MONGO_DB": "test"}):
+        report = collection_registry.ensure_collections()
+        db.list_collections.return_value = [{"name": "tiktoks_aweme_statistics", "type": "collection"}]
+        second = collection_registry.ensure_collections()
+
+    assert report["tiktoks_aweme_statistics"] == "created"
+    assert db.create_collection.call_args.kwargs["timeseries"]["metaField"] == "meta"
+    assert second["tiktoks_aweme_statistics"].endswith("migrate it")
@@ -0,0 +1,59 @@
+from unittest.mock import Mock, patch
+
+import pytest
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+
+from app.modules.mongo import indexes
+
+
+@pytest.fixture
+def mock_collection() -> Mock:  # type: ignore
+    with patch("app.modules.mongo.indexes.mongo.get_collection") as mock:
+        yield mock.return_value
+
+
+def test_register_replaces_indexes_by_name() -> None:
+    indexes.register_indexes("test_registry", [IndexModel("a"), IndexModel("b")])
+    indexes.register_indexes("test_registry", [IndexModel("a", unique=True)])
+
+    documents = [index.document for index in indexes.get_registered_indexes()["test_registry"]]
+    assert documents == [{"name": "a_1", "key": {"a": 1}, "unique": True}, {"name": "b_1", "key": {"b": 1}}]
+
+
+def test_ensure_indexes_reports_conflicts(mock_collection: Mock) -> None:
+    indexes.register_indexes("test_conflict", [IndexModel("a")])
+    mock_collection.create_indexes.side_effect = OperationFailure("Index already exists with different options", 85)
+
+    report = indexes.ensure_indexes(["test_conflict"])
+
+    assert report == {"test_conflict": {"indexes": [], "error": "Index already exists with different options"}}
+
+
+def test_ensure_indexes_creates_unique_indexes_on_their_own(mock_collection: Mock) -> None:
+    indexes.register_indexes("test_unique", [IndexModel("a", unique=True), IndexModel("b"), IndexModel("c")])
+
+    def create_indexes(batch: list[IndexModel]) -> list[str]:
+        if batch[0].document.get("unique"):
+            raise OperationFailure("E11000 duplicate key error", 11000)
+        return [index.document["name"] for index in batch]
+
+    mock_collection.create_indexes.side_effect = create_indexes
+
+    report = indexes.ensure_indexes(["test_unique"])
+
+    assert report == {"test_unique": {"indexes": ["b_1", "c_1"], "error": "E11000 duplicate key error"}}
+
+
+def test_explain_flags_collscan(mock_collection: Mock) -> None:
+    mock_collection.find.return_value.explain.return_value = {
+        "queryPlanner": {"winningPlan": {"queryPlan": {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}}},
+        "executionStats": {"totalDocsExamined": 1000, "nReturned": 3},
+    }
+
+    row = indexes.explain_query("tiktoks_aweme", {"name": "by author", "filter": {"author.unique_id": "user"}})
+
+    assert row["collscan"] is True
+    assert row["inMemorySort"] is True
+    assert row["stages"] == ["SORT", "COLLSCAN"]
+    assert row["docsExamined"] == 1000
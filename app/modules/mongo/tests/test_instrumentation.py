@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.modules.mongo.instrumentation import QueryInstrumentation, get_command_collection, get_listeners
+
+
+def command_events(command_name: str, command: dict, reply: dict, duration_ms: float, request_id: int = 1) -> tuple:
+    started = SimpleNamespace(command_name=command_name, command=command, connection_id=("localhost", 27017), request_id=request_id)
+    succeeded = SimpleNamespace(command_name=command_name, reply=reply, duration_micros=int(duration_ms * 1000), connection_id=("localhost", 27017), request_id=request_id)
+    return started, succeeded
+
+
+def test_records_latency_docs_and_bytes() -> None:
+    listener = QueryInstrumentation(sample_rate=1, slow_query_ms=1000)
+    started, succeeded = command_events("find", {"find": "generics", "filter": {}}, {"cursor": {"firstBatch": [{"a": 1}, {"a": 2}]}, "ok": 1}, 7)
+    listener.started(started)
+    listener.succeeded(succeeded)
+
+    stats = listener.stats()["collections"]["generics"]
+    assert stats["count"] == 1
+    assert stats["documents"] == 2
+    assert stats["bytes"] > 0
+    assert stats["histogram"]["<=10ms"] == 1
+    assert stats["p50Ms"] == 10
+
+
+def test_slow_query_log(caplog: pytest.LogCaptureFixture) -> None:
+    listener = QueryInstrumentation(sample_rate=1, slow_query_ms=50)
+    started, succeeded = command_events("aggregate", {"aggregate": "tiktoks_aweme", "pipeline": [], "lsid": {"id": 1}}, {"cursor": {"firstBatch": []}}, 120)
+    listener.started(started)
+    listener.succeeded(succeeded)
+
+    assert listener.stats()["slowQueries"] == 1
+    assert "tiktoks_aweme" in caplog.text
+    assert "lsid" not in caplog.text
+
+
+def test_off_by_default_and_ignores_handshakes() -> None:
+    assert get_listeners(0, 100) == []
+
+    listener = QueryInstrumentation(sample_rate=1)
+    started, succeeded = command_events("hello", {"hello": 1}, {"ok": 1}, 1)
+    listener.started(started)
+    listener.succeeded(succeeded)
+    assert listener.stats()["collections"] == {}
+    assert get_command_collection("getMore", {"getMore": 123, "collection": "generics"}) == "generics"
@@ -0,0 +1,90 @@
+from collections.abc import Iterator
+from unittest.mock import Mock, patch
+
+import pytest
+
+from app.modules.mongo import mongo, mongo_cache
+from app.modules.mongo.mongo_cache import MemoryCache
+
+
+@pytest.fixture
+def cache() -> Iterator[MemoryCache]:
+    backend = MemoryCache(max_entries=2, ttl_seconds=60)
+    mongo_cache.configure_cache(["cards"], backend)
+    yield backend
+    mongo_cache.disable_cache()
+
+
+@pytest.fixture
+def mock_collection() -> Mock:  # type: ignore
+    with patch("app.modules.mongo.mongo.get_collection") as mock:
+        yield mock.return_value
+
+
+def test_memory_cache_lru_and_ttl() -> None:
+    backend = MemoryCache(max_entries=2, ttl_seconds=60)
+    backend.set("cards", "a", None, b"a")
+    backend.set("cards", "a", "name", b"a-name")
+    backend.set("cards", "b", None, b"b")
+    backend.get("cards", "a", None)
+    backend.set("cards", "c", None, b"c")
+
+    assert backend.get("cards", "b", None) is None
+    assert backend.get("cards", "a", "name") == b"a-name"
+    assert backend.stats()["evictions"] == 1
+
+    expired = MemoryCache(ttl_seconds=-1)
+    expired.set("cards", "a", None, b"a")
+    assert expired.get("cards", "a", None) is None
+    assert expired.stats()["expirations"] == 1
+
+
+def test_read_through_and_invalidation_on_update(cache: MemoryCache, mock_collection: Mock) -> None:
+    mock_collection.find_one.return_value = {"id": "a", "name": "first"}
+
+    first = mongo.get_document_by_id("cards", "a")
+    first["name"] = "mutated by caller"
+    second = mongo.get_document_by_id("cards", "a")
+
+    assert mock_collection.find_one.call_count == 1
+    assert second == {"id": "a", "name": "first"}
+
+    mongo.update("cards", {"name": "second"}, "a")
+    mock_collection.find_one.return_value = {"id": "a", "name": "second"}
+
+    assert mongo.get_document_by_id("cards", "a")["name"] == "second"
+    assert mock_collection.find_one.call_count == 2
+    stats = mongo_cache.get_stats()
+    assert stats["hits"] >= 1
+    assert stats["invalidations"] >= 1
+
+
+def test_collections_not_enabled_are_not_cached(cache: MemoryCache, mock_collection: Mock) -> None:
+    mock_collection.find_one.return_value = {"id": "a"}
+
+    mongo.get_document_by_id("users", "a")
+    mongo.get_document_by_id("users", "a")
+
+    assert mock_collection.find_one.call_count == 2
+
+
+def test_array_helpers_invalidate(cache: MemoryCache, mock_collection: Mock) -> None:
+    mock_collection.find_one.return_value = {"id": "a", "words": []}
+    mongo.get_document_by_id_including("cards", "a", ["words"])
+
+    mongo.push_into_array({"collection": "cards", "document_id": "a", "array_property": "words", "value": "tree"})
+
+    assert mongo_cache.get_document("cards", "a", mongo_cache.projection_key(["words"])) == (False, None)
+
+
+def test_writes_invalidate_after_a_read_racing_with_them(cache: MemoryCache, mock_collection: Mock) -> None:
+    mock_collection.find_one.return_value = {"id": "a", "name": "old"}
+    # another thread reads (and caches) the document while the write is in flight
+    mock_collection.insert_one.side_effect = lambda document: mongo.get_document_by_id("cards", "a")
+    mock_collection.bulk_write.side_effect = lambda requests, ordered: mongo.get_document_by_id("cards", "a") and Mock(bulk_api_result={})
+
+    mongo.insert("cards", {"id": "a", "name": "new"})
+    assert mongo_cache.get_document("cards", "a") == (False, None)
+
+    mongo.bulk_write("cards", [{"type": "set", "document_id": "a", "value": {"name": "newer"}}])
+    assert mongo_cache.get_document("cards", "a") == (False, None)
@@ -0,0 +1,42 @@
+import pytest
+from pymongo import monitoring
+
+from app.modules.mongo import mongo_client
+from app.modules.mongo.mongo_client import MongoSettings, PoolStatsListener
+
+ADDRESS = ("localhost", 27017)
+
+
+def test_settings_from_env(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("MONGO_MAX_POOL_SIZE", "25")
+    monkeypatch.setenv("MONGO_COMPRESSORS", "zstd,snappy")
+    monkeypatch.setenv("MONGO_READ_PREFERENCE", "secondaryPreferred")
+
+    options = MongoSettings.from_env().client_options()
+
+    assert options["maxPoolSize"] == 25
+    assert options["compressors"] == "zstd,snappy"
+    assert options["readPreference"] == "secondaryPreferred"
+    assert "waitQueueTimeoutMS" not in options
+
+
+def test_import_does_not_create_client() -> None:
+    from app.modules.mongo import mongo  # noqa: F401
+
+    assert mongo_client.get_pool_stats() == {"sync": None, "async": None}
+
+
+def test_pool_listener_counters() -> None:
+    listener = PoolStatsListener()
+    listener.connection_created(monitoring.ConnectionCreatedEvent(ADDRESS, 1))
+    listener.connection_check_out_started(monitoring.ConnectionCheckOutStartedEvent(ADDRESS))
+    listener.connection_check_out_started(monitoring.ConnectionCheckOutStartedEvent(ADDRESS))
+    listener.connection_checked_out(monitoring.ConnectionCheckedOutEvent(ADDRESS, 1, 0.0))
+
+    stats = listener.stats()
+    assert stats["created"] == 1
+    assert stats["checkedOut"] == 1
+    assert stats["waitQueue"] == 1
+
+    listener.connection_checked_in(monitoring.ConnectionCheckedInEvent(ADDRESS, 1))
+    assert listener.stats()["checkedOut"] == 0
@@ -0,0 +1,22 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from bson import Decimal128, ObjectId
+
+from app.modules.mongo.mongo_json import MongoJSONResponse, dumps
+
+
+def test_bson_types() -> None:
+    object_id = ObjectId()
+    document = {"_id": object_id, "created": datetime(2024, 1, 2, 3, 4, 5), "price": Decimal128(Decimal("10.25")), "nested": [{"ref": object_id}]}
+
+    assert json.loads(dumps(document)) == {"_id": str(object_id), "created": "2024-01-02T03:04:05", "price": "10.25", "nested": [{"ref": str(object_id)}]}
+
+
+def test_response_renders_raw_documents() -> None:
+    rows = [{"_id": ObjectId(), "index": index} for index in range(3)]
+    response = MongoJSONResponse({"rows": rows, "nextCursor": None, "count": None})
+
+    assert response.media_type == "application/json"
+    assert [row["_id"] for row in json.loads(response.body)["rows"]] == [str(row["_id"]) for row in rows]
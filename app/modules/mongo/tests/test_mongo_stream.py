@@ -0,0 +1,30 @@
+import asyncio
+import json
+from collections.abc import AsyncIterator
+
+from bson import ObjectId
+
+from app.modules.mongo import mongo_stream
+
+
+async def _documents(total: int) -> AsyncIterator[dict]:
+    for index in range(total):
+        yield {"_id": ObjectId(), "index": index}
+
+
+async def _collect(chunks: AsyncIterator[bytes]) -> list[bytes]:
+    return [chunk async for chunk in chunks]
+
+
+def test_ndjson_one_document_per_line() -> None:
+    chunks = asyncio.run(_collect(mongo_stream.iter_ndjson(_documents(5), chunk_size=2)))
+
+    assert len(chunks) == 3
+    lines = b"".join(chunks).decode().splitlines()
+    assert [json.loads(line)["index"] for line in lines] == [0, 1, 2, 3, 4]
+
+
+def test_json_array_is_valid_json() -> None:
+    for total in (0, 1, 4, 5):
+        body = b"".join(asyncio.run(_collect(mongo_stream.iter_json_array(_documents(total), chunk_size=2))))
+        assert [doc["index"] for doc in json.loads(body)] == list(range(total))
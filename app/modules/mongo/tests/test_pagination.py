@@ -0,0 +1,78 @@
+from unittest.mock import Mock, patch
+
+import pytest
+from bson import ObjectId
+
+from app.modules.mongo import pagination
+from app.modules.mongo.pagination import PageFiltersConfig
+
+
+@pytest.fixture
+def mock_collection() -> Mock:  # type: ignore
+    with patch("app.modules.mongo.pagination.mongo.get_collection") as mock:
+        yield mock.return_value
+
+
+def _find_returning(mock_collection: Mock, rows: list[dict]) -> Mock:
+    cursor = Mock()
+    cursor.sort.return_value = cursor
+    cursor.limit.return_value = cursor
+    cursor.skip.return_value = cursor
+    cursor.__iter__ = Mock(return_value=iter(rows))
+    mock_collection.find.return_value = cursor
+    return cursor
+
+
+def test_cursor_round_trip_keeps_bson_types() -> None:
+    values = [3, ObjectId()]
+    assert pagination.decode_cursor(pagination.encode_cursor(values)) == values
+
+    with pytest.raises(ValueError):
+        pagination.decode_cursor("not-a-cursor")
+
+
+def test_keyset_query_follows_sort_direction() -> None:
+    sort_fields = pagination.get_sort_fields({"create_time": -1})
+    assert sort_fields == [("create_time", -1), ("_id", -1)]
+
+    query = pagination.build_keyset_query(sort_fields, [10, "last"])
+    assert query == {"$or": [{"create_time": {"$lt": 10}}, {"create_time": 10, "_id": {"$lt": "last"}}]}
+
+
+def test_paginate_returns_next_cursor_and_estimated_count(mock_collection: Mock) -> None:
+    rows = [{"_id": ObjectId(), "name": f"row {index}"} for index in range(3)]
+    last_id = rows[1]["_id"]
+    cursor = _find_returning(mock_collection, rows)
+    mock_collection.estimated_document_count.return_value = 42
+
+    page = pagination.paginate("generics", PageFiltersConfig(rows_per_page=2, count=True, return_props={"name": 1, "_id": 0}))
+
+    mock_collection.find.assert_called_once_with({}, {"name": 1, "_id": 1})
+    cursor.limit.assert_called_once_with(3)
+    assert page["rows"] == rows[:2]
+    assert pagination.decode_cursor(page["nextCursor"]) == [last_id]
+    assert page["count"] == 42
+    mock_collection.count_documents.assert_not_called()
+
+
+def test_paginate_with_cursor_and_query(mock_collection: Mock) -> None:
+    _find_returning(mock_collection, [])
+    last_id = ObjectId()
+    filters = PageFiltersConfig(filters={"type": "gen1"}, rows_per_page=500, cursor=pagination.encode_cursor([last_id]), count=True)
+    mock_collection.count_documents.return_value = 7
+
+    page = pagination.paginate("generics", filters, max_page_size=100)
+
+    query = mock_collection.find.call_args.args[0]
+    assert query == {"$and": [{"type": "gen1"}, {"$or": [{"_id": {"$gt": last_id}}]}]}
+    mock_collection.find.return_value.limit.assert_called_once_with(101)
+    assert page == {"rows": [], "nextCursor": None, "count": 7}
+
+
+def test_projection_keeps_the_sort_fields() -> None:
+    sort_fields = pagination.get_sort_fields({"statistics.play_count": -1})
+
+    assert pagination._get_projection({"desc": 1}, sort_fields) == {"desc": 1, "statistics.play_count": 1, "_id": 1}
+    assert pagination._get_projection({"desc": 1, "statistics": 1}, sort_fields) == {"desc": 1, "statistics": 1, "_id": 1}
+    assert pagination._get_projection({"statistics": 0, "music": 0}, sort_fields) == {"music": 0}
+    assert pagination._get_projection({"statistics.play_count": 0}, sort_fields) is None
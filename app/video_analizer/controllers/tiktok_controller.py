@@ -1,8 +1,13 @@
+from datetime import UTC, datetime, timedelta
+
 from dataclouder_core.exception import handler_exception
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 
-from app.video_analizer.repositories import tiktok_repository
-from app.video_analizer.services import tiktok_service
+from app.modules.mongo import change_feed
+from app.modules.mongo.mongo_json import MongoJSONResponse
+from app.video_analizer.repositories import tiktok_ranking_repository, tiktok_rollup_repository, tiktok_statistics_repository, tiktok_time_repository
+from app.video_analizer.services import live_feed_service, tiktok_service
 
 router = APIRouter(prefix="/api/video-analizer/tiktok", tags=["Video Analizer Tiktok"])
 
@@ -10,7 +15,7 @@ router = APIRouter(prefix="/api/video-analizer/tiktok", tags=["Video Analizer Ti
 @router.get("/availible-users")
 @handler_exception
 async def get_availible_users() -> list:
-    result = tiktok_repository.get_author_post_counts()
+    result = tiktok_rollup_repository.get_author_post_counts()
     return result
 
 
@@ -21,8 +26,74 @@ async def get_user_data(user_id: str) -> list[dict]:
     return result
 
 
-@router.get("/data/{tiktok_id}")
+@router.get("/data/{tiktok_id}", response_class=MongoJSONResponse)
 @handler_exception
-async def get_data(tiktok_id: str) -> dict:
+async def get_data(tiktok_id: str) -> MongoJSONResponse:
     result = tiktok_service.get_tiktok_data(tiktok_id)
+    return MongoJSONResponse(result)
+
+
+@router.get("/author-summary", response_class=MongoJSONResponse)
+@handler_exception
+async def get_author_summary(user_id: str) -> MongoJSONResponse:
+    result = tiktok_rollup_repository.get_author_summary(user_id)
+    return MongoJSONResponse(result)
+
+
+@router.get("/activity")
+@handler_exception
+async def get_activity(user_id: str | None = None) -> dict:
+    result = tiktok_rollup_repository.get_activity(user_id)
     return result
+
+
+@router.get("/posting-times")
+@handler_exception
+async def get_posting_times(user_id: str | None = None, tz: str = tiktok_time_repository.DEFAULT_TIMEZONE, weeks: int | None = 12) -> dict:
+    """Hour x day of week heatmap and weekly trend in the tz timezone, weeks=0 for all the history"""
+    result = tiktok_time_repository.get_posting_times(user_id, tz, weeks or None)
+    return result
+
+
+@router.get("/top", response_class=MongoJSONResponse)
+@handler_exception
+async def get_top_tiktoks(metric: str = "engagement", user_id: str | None = None, k: int = 10, ascending: bool = False) -> MongoJSONResponse:
+    """metric: engagement, like_rate, comment_rate, share_rate or save_rate"""
+    result = tiktok_ranking_repository.get_top_tiktoks(metric, user_id, k, ascending)
+    return MongoJSONResponse(result)
+
+
+@router.get("/percentiles")
+@handler_exception
+async def get_metric_percentiles(metric: str = "engagement", user_id: str | None = None) -> dict:
+    result = tiktok_ranking_repository.get_metric_percentiles(metric, user_id)
+    return result
+
+
+def _since(days: int | None) -> datetime | None:
+    return datetime.now(UTC) - timedelta(days=days) if days else None
+
+
+@router.get("/growth")
+@handler_exception
+async def get_growth_curve(aweme_id: str | None = None, user_id: str | None = None, unit: str = "day", days: int | None = 30) -> dict:
+    """Statistics at the end of every unit (hour, day, week or month) of one aweme or of an author, days=0 for all"""
+    result = tiktok_statistics_repository.get_growth_curve(aweme_id, user_id, unit, _since(days))
+    return result
+
+
+@router.get("/deltas", response_class=MongoJSONResponse)
+@handler_exception
+async def get_statistics_deltas(user_id: str | None = None, aweme_id: str | None = None, days: int | None = 7, sort_by: str = "play_count", k: int = 10) -> MongoJSONResponse:
+    """The k awemes that grew the most by sort_by in the last days"""
+    result = tiktok_statistics_repository.get_deltas(aweme_id, user_id, _since(days), sort_by=sort_by, k=k)
+    return MongoJSONResponse(result)
+
+
+@router.get("/live")
+async def get_live_feed(user_id: str | None = None, source_ids: str | None = None) -> StreamingResponse:
+    """Server-sent events with coalesced deltas (tiktok.new, tiktok.stats, source.status), source_ids comma separated"""
+    match = live_feed_service.build_match(user_id, source_ids.split(",") if source_ids else None)
+    subscription = live_feed_service.get_feed().subscribe(match)
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(change_feed.iter_sse(subscription), media_type="text/event-stream", headers=headers)
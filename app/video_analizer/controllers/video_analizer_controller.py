@@ -1,13 +1,13 @@
-import asyncio
 import io
 
 from dataclouder_core.exception import handler_exception
-from dataclouder_core.models.models import FiltersConfig
 from fastapi import APIRouter
 from fastapi.responses import StreamingResponse
-from typing_extensions import Any
 
 from app.generics.services import generic_service
+from app.modules.execution import executors
+from app.modules.mongo.mongo_json import MongoJSONResponse
+from app.modules.mongo.pagination import PageFiltersConfig
 from app.video_analizer.models.model import VideoAnalysisModel
 from app.video_analizer.services import video_analizer_service
 from tools.demucs import demucs_utils
@@ -22,41 +22,38 @@ router = APIRouter(prefix="/api/video-analizer", tags=["Video Analizer"])
 @handler_exception
 async def start_analysis(video: VideoAnalysisModel) -> dict:
     print("starting video analisis of", video)
-    agent_source = video_analizer_service.save_agent_source()
-    asyncio.create_task(video_analizer_service.analize_video(video, agent_source))
-    # Return immediately without waiting for the background task
+    # only queues the job, a worker process runs the analysis
+    agent_source = await video_analizer_service.analize_video(video)
     return agent_source.model_dump()
 
 
-@router.get("/video-agent-source")
+@router.get("/video-agent-source", response_class=MongoJSONResponse)
 @handler_exception
-async def get_video_agent_source(video_platform_id: str) -> list[dict]:
+async def get_video_agent_source(video_platform_id: str) -> MongoJSONResponse:
     result = video_analizer_service.get_tiktok_sources(video_platform_id)
-    return result
+    return MongoJSONResponse(result)
 
 
 @router.post("/extract-tiktok-data")
 @handler_exception
 async def save_tiktok_data(video: dict) -> dict:
     print("starting video analisis of", video)
-    result = await video_analizer_service.save_tiktok_data(video["urls"])
-    print(result)
-    return {"message": "Analysis started"}
+    result = await video_analizer_service.save_tiktok_data(video["urls"], video.get("concurrency", 8))
+    return {"message": "Extraction finished", "summary": result}
 
 
-@router.post("/query")
+@router.post("/query", response_class=MongoJSONResponse)
 @handler_exception
-async def find_filtered_generics(filters: FiltersConfig) -> list[Any]:
-    print(filters)
+async def find_filtered_generics(filters: PageFiltersConfig) -> MongoJSONResponse:
     generic = generic_service.find_filtered_generics(filters)
-    return generic
+    return MongoJSONResponse(generic)
 
 
 @router.post("/download-audio")
 @handler_exception
 async def download_audio(video: VideoAnalysisModel) -> StreamingResponse:
     print("starting video analisis of", video)
-    byte, filename, info = await yt_downloads.download_youtube_audio_to_memory(video.url)
+    byte, filename, info = await executors.run_io(yt_downloads.download_youtube_audio_to_memory, video.url)
 
     # Convert bytes to BytesIO object
     audio_stream = io.BytesIO(byte)
@@ -77,17 +74,17 @@ async def download_youtube_video(video: VideoAnalysisModel) -> StreamingResponse
     file_name = "video.mp4"
     if video.options.get("audio") or video.options.get("vocals"):
         media_type = "audio/mpeg"
-        video_bytes_io, info_dict = yt_dlp_utils.download_youtube_audio_to_memory(video.url)
+        video_bytes_io, info_dict = await executors.run_io(yt_dlp_utils.download_youtube_audio_to_memory, video.url)
         file_name = info_dict.get("id", "video")
         file_name = file_name.replace(".mp4", "") + ".mp3"
 
         if video.options.get("vocals"):
-            video_bytes_io = demucs_utils.extract_vocals_from_bytes(video_bytes_io.getvalue())
+            video_bytes_io = await executors.run_cpu(demucs_utils.extract_vocals_from_bytes, video_bytes_io.getvalue())
             video_bytes_io = io.BytesIO(video_bytes_io)
             print("vocals creo que tengo que convertir a BytesIO", video_bytes_io)
 
     else:
-        video_bytes_io, info_dict = yt_dlp_utils.download_youtube_video_to_memory(video.url)
+        video_bytes_io, info_dict = await executors.run_io(yt_dlp_utils.download_youtube_video_to_memory, video.url)
         file_name = info_dict.get("id", "video")
     print("aqui termino file name", info_dict)
 
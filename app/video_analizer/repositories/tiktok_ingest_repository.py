@@ -0,0 +1,150 @@
+"""Idempotent ingest of TikTok API payloads into tiktoks_aweme
+
+Awemes are upserted on aweme_id (unique index) so scraping the same video again updates one document instead of
+adding another. Every document keeps payloadHash, a SHA-256 of the payload without the fields that change on every
+request (signed CDN urls, request logs), a payload with the same hash is not written at all. Each new aweme and each
+statistics change adds a snapshot to the time-series of tiktok_statistics_repository. Rollups get new awemes once and
+only the statistics difference of updated ones.
+
+Collections that already have duplicates need the dedupe once (keeps the newest document of every aweme_id and drops
+the old non unique index) before the unique index can be created:
+
+    python -m app.video_analizer.repositories.tiktok_ingest_repository dedupe
+"""
+
+import hashlib
+import logging
+import sys
+from datetime import UTC, datetime
+
+import orjson
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+from typing_extensions import TypedDict
+
+from app.modules.mongo.mongo import get_collection
+from app.video_analizer.repositories import tiktok_rollup_repository, tiktok_statistics_repository, tiktok_time_repository
+from app.video_analizer.repositories.tiktok_repository import col_name
+from app.video_analizer.services import tiktok_metrics
+
+logger = logging.getLogger(__name__)
+
+# change on every request without the video changing
+VOLATILE_KEYS = frozenset({"url_list", "log_pb", "expire", "url_key"})
+EXISTING_PROJECTION = {"_id": 0, "aweme_id": 1, "payloadHash": 1, "statistics": 1}
+
+
+class IngestSummary(TypedDict):
+    inserted: int
+    updated: int
+    unchanged: int
+    errors: list[dict]
+
+
+def _stable(value: object) -> object:
+    if isinstance(value, dict):
+        return {key: _stable(item) for key, item in value.items() if key not in VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [_stable(item) for item in value]
+    return value
+
+
+def payload_hash(aweme: dict) -> str:
+    """Same hash for the same video data whatever the key order or the signed urls of the response"""
+    payload = {key: value for key, value in aweme.items() if key not in ("_id", "metrics", "payloadHash", "firstSeenAt", "updatedAt")}
+    return hashlib.sha256(orjson.dumps(_stable(payload), option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)).hexdigest()
+
+
+def ingest_awemes(awemes: list[dict | None], captured_at: datetime | None = None) -> IngestSummary:
+    """Upsert the payloads (None and payloads without aweme_id are skipped, the last one wins for repeated ids)"""
+    captured_at = captured_at or datetime.now(UTC)
+    summary: IngestSummary = {"inserted": 0, "updated": 0, "unchanged": 0, "errors": []}
+    latest = {aweme["aweme_id"]: aweme for aweme in awemes if aweme and aweme.get("aweme_id")}
+    if not latest:
+        return summary
+
+    collection = get_collection(col_name)
+    existing = {document["aweme_id"]: document for document in collection.find({"aweme_id": {"$in": list(latest)}}, EXISTING_PROJECTION)}
+
+    changed: list[dict] = []
+    requests: list[UpdateOne] = []
+    for aweme_id, aweme in latest.items():
+        aweme = tiktok_metrics.add_metrics({key: value for key, value in aweme.items() if key != "_id"})
+        aweme["payloadHash"] = payload_hash(aweme)
+        if aweme_id in existing and existing[aweme_id].get("payloadHash") == aweme["payloadHash"]:
+            summary["unchanged"] += 1
+            continue
+        changed.append(aweme)
+        requests.append(UpdateOne({"aweme_id": aweme_id}, {"$set": aweme | {"updatedAt": captured_at}, "$setOnInsert": {"firstSeenAt": captured_at}}, upsert=True))
+    if not requests:
+        return summary
+
+    failed: set[int] = set()
+    try:
+        result = collection.bulk_write(requests, ordered=False)
+        upserted = set(result.upserted_ids)
+    except BulkWriteError as exc:
+        details = exc.details
+        failed = {error["index"] for error in details.get("writeErrors", [])}
+        upserted = {entry["index"] for entry in details.get("upserted", [])}
+        summary["errors"] = [{"index": error["index"], "code": error.get("code"), "message": error.get("errmsg")} for error in details.get("writeErrors", [])]
+
+    inserted: list[dict] = []
+    updated: list[tuple[dict, dict]] = []
+    for index, aweme in enumerate(changed):
+        if index in failed:
+            continue
+        if index in upserted:
+            inserted.append(aweme)
+        else:
+            updated.append((aweme, existing.get(aweme["aweme_id"], {}).get("statistics") or {}))
+    summary["inserted"], summary["updated"] = len(inserted), len(updated)
+
+    statistics_changed = [(aweme, previous) for aweme, previous in updated if (aweme.get("statistics") or {}) != previous]
+    _apply_derived(inserted, statistics_changed, captured_at)
+    return summary
+
+
+def _apply_derived(inserted: list[dict], updated: list[tuple[dict, dict]], captured_at: datetime) -> None:
+    """History and rollups are derived data, a failure is logged and fixed by the rebuild CLI instead of failing the ingest"""
+    try:
+        tiktok_statistics_repository.add_snapshots(inserted + [aweme for aweme, _ in updated], captured_at)
+    except Exception:
+        logger.exception("error adding tiktok statistics snapshots")
+    try:
+        tiktok_rollup_repository.apply_awemes(inserted, updated)
+        if inserted:
+            tiktok_time_repository.invalidate()
+    except Exception:
+        logger.exception("error updating tiktok rollups, run the rollup rebuild")
+
+
+def dedupe() -> int:
+    """Delete all but the newest document (highest _id) of every aweme_id, returns the deleted count"""
+    collection = get_collection(col_name)
+    pipeline = [
+        {"$match": {"aweme_id": {"$ne": None}}},
+        {"$sort": {"_id": -1}},
+        {"$group": {"_id": "$aweme_id", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    deleted = 0
+    for group in collection.aggregate(pipeline, allowDiskUse=True):
+        deleted += collection.delete_many({"_id": {"$in": group["ids"][1:]}}).deleted_count
+    try:
+        collection.drop_index("aweme_id_1")
+    except OperationFailure:
+        pass  # never existed or already dropped
+    return deleted
+
+
+def main(argv: list[str]) -> int:
+    if len(argv) > 1 and argv[1] == "dedupe":
+        print(f"tiktok duplicates deleted: {dedupe()} documents, run the rollup rebuild next")
+        return 0
+    print("usage: python -m app.video_analizer.repositories.tiktok_ingest_repository dedupe")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,75 @@
+"""Top-K and percentiles over the precomputed `metrics.<name>` fields of tiktoks_aweme
+
+Every metric has an (author, metric) index and engagement also a global one, a top-K is an index walk of K entries.
+Awemes saved before metrics existed get them with the backfill, computed by the server in an update pipeline:
+
+    python -m app.video_analizer.repositories.tiktok_ranking_repository backfill
+"""
+
+import sys
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from app.modules.mongo import indexes
+from app.modules.mongo.mongo import get_collection
+from app.video_analizer.repositories.tiktok_repository import col_name
+from app.video_analizer.services.tiktok_metrics import METRICS, get_metrics_expression
+
+MAX_K = 100
+TOP_PROJECTION = {"_id": 0, "aweme_id": 1, "desc": 1, "create_time": 1, "author.unique_id": 1, "statistics": 1, "metrics": 1}
+
+indexes.register_indexes(
+    col_name,
+    [IndexModel([("author.unique_id", ASCENDING), (f"metrics.{name}", DESCENDING)]) for name in METRICS] + [IndexModel([("metrics.engagement", DESCENDING)])],
+    [
+        {"name": "top engagement of an author", "filter": {"author.unique_id": "user"}, "sort": [("metrics.engagement", DESCENDING)]},
+        {"name": "top engagement", "filter": {}, "sort": [("metrics.engagement", DESCENDING)]},
+    ],
+)
+
+
+def validate_metric(metric: str) -> str:
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric}, use one of {', '.join(METRICS)}")
+    return metric
+
+
+def get_top_tiktoks(metric: str = "engagement", author: str | None = None, k: int = 10, ascending: bool = False) -> list[dict]:
+    """The k awemes with the highest (or lowest) metric, of one author or of everyone. k is clamped to 1..MAX_K, a mongo
+    limit of 0 means no limit"""
+    field = f"metrics.{validate_metric(metric)}"
+    query = {field: {"$exists": True}} | ({"author.unique_id": author} if author else {})
+    cursor = get_collection(col_name).find(query, TOP_PROJECTION).sort(field, ASCENDING if ascending else DESCENDING).limit(min(max(k, 1), MAX_K))
+    return list(cursor)
+
+
+def get_metric_percentiles(metric: str = "engagement", author: str | None = None, percentiles: list[float] | None = None) -> dict:
+    """Approximate percentiles ($percentile, MongoDB 7.0+), percentiles are 0-1 i.e. [0.5, 0.9, 0.99]"""
+    field = f"$metrics.{validate_metric(metric)}"
+    percentiles = percentiles or [0.5, 0.9, 0.99]
+    query = {f"metrics.{metric}": {"$exists": True}} | ({"author.unique_id": author} if author else {})
+    pipeline = [
+        {"$match": query},
+        {"$group": {"_id": None, "count": {"$sum": 1}, "values": {"$percentile": {"input": field, "p": percentiles, "method": "approximate"}}}},
+    ]
+    result = next(get_collection(col_name).aggregate(pipeline), {"count": 0, "values": [None] * len(percentiles)})
+    return {"metric": metric, "author": author, "count": result["count"], "percentiles": dict(zip([str(p) for p in percentiles], result["values"], strict=True))}
+
+
+def backfill_metrics(recompute: bool = False) -> int:
+    """Set metrics on the awemes that don't have them (all of them with recompute=True), returns the modified count"""
+    query = {} if recompute else {"metrics": {"$exists": False}}
+    result = get_collection(col_name).update_many(query, [{"$set": {"metrics": get_metrics_expression()}}])
+    return result.modified_count
+
+
+def main(argv: list[str]) -> int:
+    if len(argv) > 1 and argv[1] == "backfill":
+        print(f"tiktok metrics backfilled: {backfill_metrics(recompute='--all' in argv)} documents")
+        return 0
+    print("usage: python -m app.video_analizer.repositories.tiktok_ranking_repository backfill [--all]")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,31 +1,45 @@
 from bson import ObjectId
 from dataclouder_core.models.models import FiltersConfig
+from pymongo import ASCENDING, DESCENDING, IndexModel
 
 # from app.tiktoks.models.tiktok_model import tiktokModel
-from app.modules.mongo.mongo import db
-
-col_name = "tiktoks_aweme"
+from app.modules.mongo import indexes, pagination
+from app.modules.mongo.collection_registry import CollectionName
+from app.modules.mongo.mongo import get_collection
+from app.modules.mongo.pagination import PageResult
+
+col_name = CollectionName.TIKTOKS_AWEME
+
+indexes.register_indexes(
+    col_name,
+    [
+        # upsert key of the ingest, a non unique aweme_id_1 of older deployments is dropped by the ingest dedupe CLI
+        IndexModel("aweme_id", name="aweme_id_unique", unique=True, partialFilterExpression={"aweme_id": {"$type": "string"}}),
+        IndexModel([("author.unique_id", ASCENDING), ("create_time", DESCENDING)]),
+    ],
+    [
+        {"name": "by aweme_id", "filter": {"aweme_id": "0"}},
+        {"name": "by author newest first", "filter": {"author.unique_id": "user"}, "sort": [("create_time", DESCENDING)]},
+    ],
+)
 
 
 def find_tiktoks(id: str) -> dict:
     """Get words"""
-    collection = db[col_name]
+    collection = get_collection(col_name)
     result = collection.find_one({"_id": ObjectId(id)})
 
     return result
 
 
-def find_filtered_tiktoks(filters: FiltersConfig) -> list:
-    """Get words"""
-    print(filters)
-    collection = db[col_name]
-    result = collection.find(filters.model_dump())
-    return result
+def find_filtered_tiktoks(filters: FiltersConfig) -> PageResult:
+    """Get a page of tiktoks, send nextCursor back in filters.cursor to get the next one"""
+    return pagination.paginate(col_name, filters)
 
 
 # def save_tiktok(tiktok: tiktokModel) -> tiktokModel:
 #     """Save tiktok insert if not exists, or update if exists"""
-#     collection = db[col_name]
+#     collection = get_collection(col_name)
 #     print("antes de insertar")
 #     result = collection.find_one_and_replace({"_id": ObjectId()}, tiktok.model_dump(), upsert=True, return_document=True)
 #     result["_id"] = str(result["_id"])
@@ -34,7 +48,7 @@ def find_filtered_tiktoks(filters: FiltersConfig) -> list:
 
 # def delete_tiktok(id: str) -> tiktokModel:
 #     """Delete tiktok"""
-#     collection = db[col_name]
+#     collection = get_collection(col_name)
 #     collection.delete_one({"_id": ObjectId(id)})
 #     return {"message": "tiktok deleted"}
 
@@ -44,47 +58,81 @@ def get_author_post_counts() -> list:
     Get the count of posts per author using their unique_id.
     Returns a list of dictionaries containing author unique_id and their post count.
     """
-    collection = db[col_name]
+    collection = get_collection(col_name)
     pipeline = [{"$group": {"_id": "$author.unique_id", "count": {"$sum": 1}}}]
     result = list(collection.aggregate(pipeline))
     return result
 
 
+DAYS = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
+
+# create_time is stored as unix seconds (int), $dayOfWeek needs a date. Documents that already have a date are kept as is
+CREATE_DATE = {"$cond": [{"$eq": [{"$type": "$create_time"}, "date"]}, "$create_time", {"$toDate": {"$multiply": ["$create_time", 1000]}}]}
+
+BOOLEAN_FIELDS = [
+    ("is_delete_false", "Is Delete (False)", "is_delete", False),
+    ("allow_share_true", "Allow Share (True)", "allow_share", True),
+    ("allow_comment_true", "Allow Comment (True)", "allow_comment", True),
+    ("is_private_false", "Is Private (False)", "is_private", False),
+    ("with_goods_false", "With Goods (False)", "with_goods", False),
+    ("in_reviewing_false", "In Reviewing (False)", "in_reviewing", False),
+    ("self_see_false", "Self See (False)", "self_see", False),
+    ("is_prohibited_false", "Is Prohibited (False)", "is_prohibited", False),
+]
+
+# facet name, document field, chart label, values that always get a bar even with 0 posts
+NUMERIC_FIELDS = [
+    ("privateStatus", "private_status", "Private Status Distribution", [0]),
+    ("reviewed", "reviewed", "Reviewed Status Distribution", [0, 1]),
+    ("downloadStatus", "download_status", "Download Status Distribution", [0]),
+]
+
+
+def _day_of_week_chart(rows: list[dict]) -> dict:
+    """rows are {_id: 1-7 (Sunday=1), count}, every day is in the chart even with 0 posts"""
+    day_counts = {day: 0 for day in DAYS}
+    for entry in rows:
+        if entry["_id"] is not None:
+            day_counts[DAYS[entry["_id"] - 1]] = entry["count"]
+    return {"labels": DAYS, "datasets": [{"label": "Posts per Day of Week", "data": [day_counts[day] for day in DAYS]}]}
+
+
+def _distribution_chart(rows: list[dict], label: str, always: list[int]) -> dict:
+    counts = {value: 0 for value in always}
+    counts.update({entry["_id"]: entry["count"] for entry in rows if entry["_id"] is not None})
+    values = sorted(counts)
+    return {"labels": [f"Value {value}" for value in values], "datasets": [{"label": label, "data": [counts[value] for value in values]}]}
+
+
 def get_posts_by_day_of_week() -> dict:
     """
     Get the count of posts grouped by day of week in a format suitable for Chart.js
     Returns a dictionary with labels and data arrays for easy frontend charting
     """
-    collection = db[col_name]
-    pipeline = [
-        {
-            "$addFields": {
-                "dayOfWeek": {
-                    "$dayOfWeek": "$create_time"  # 1 for Sunday through 7 for Saturday
+    collection = get_collection(col_name)
+    pipeline = [{"$group": {"_id": {"$dayOfWeek": CREATE_DATE}, "count": {"$sum": 1}}}]
+    return _day_of_week_chart(list(collection.aggregate(pipeline)))
+
+
+def get_analytics_pipeline() -> list[dict]:
+    """One pass over the collection, every facet ends in a $group so the result is a handful of counters no matter
+    how many documents there are (the old $push of every value hit the 16MB document limit)"""
+    fields = {field: 1 for _, _, field, _ in BOOLEAN_FIELDS} | {field: 1 for _, field, _, _ in NUMERIC_FIELDS} | {"create_time": 1, "_id": 0}
+    facets = {
+        "booleans": [
+            {
+                "$group": {
+                    "_id": None,
+                    "total": {"$sum": 1},
+                    **{name: {"$sum": {"$cond": [{"$eq": [f"${field}", value]}, 1, 0]}} for name, _, field, value in BOOLEAN_FIELDS},
                 }
             }
-        },
-        {"$group": {"_id": "$dayOfWeek", "count": {"$sum": 1}}},
-        {"$sort": {"_id": 1}},
-    ]
-
-    result = list(collection.aggregate(pipeline))
-
-    # Map MongoDB's dayOfWeek (1-7, Sunday=1) to more readable names
-    days = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
-
-    # Initialize counts for all days (even if they have 0 posts)
-    day_counts = {day: 0 for day in days}
-
-    # Fill in the actual counts
-    for entry in result:
-        day_index = entry["_id"] - 1  # Convert 1-7 to 0-6 index
-        day_counts[days[day_index]] = entry["count"]
-
-    # Structure the data for Chart.js
-    chart_data = {"labels": days, "datasets": [{"label": "Posts per Day of Week", "data": [day_counts[day] for day in days]}]}
-
-    return chart_data
+        ],
+        "dayOfWeek": [{"$group": {"_id": {"$dayOfWeek": CREATE_DATE}, "count": {"$sum": 1}}}],
+    }
+    for name, field, _, _ in NUMERIC_FIELDS:
+        facets[name] = [{"$group": {"_id": f"${field}", "count": {"$sum": 1}}}]
+    return [{"$project": fields}, {"$facet": facets}]
 
 
 def get_comprehensive_analytics() -> dict:
@@ -93,79 +141,17 @@ def get_comprehensive_analytics() -> dict:
     boolean field statistics, and numeric field summaries.
     Returns a structured dictionary suitable for multiple Chart.js visualizations.
     """
-    collection = db[col_name]
-
-    # Get total document count for percentage calculations
-    total_docs = collection.count_documents({})
-
-    # Boolean fields analysis
-    boolean_fields_pipeline = [
-        {
-            "$group": {
-                "_id": None,
-                "is_delete_false": {"$sum": {"$cond": [{"$eq": ["$is_delete", False]}, 1, 0]}},
-                "allow_share_true": {"$sum": {"$cond": [{"$eq": ["$allow_share", True]}, 1, 0]}},
-                "allow_comment_true": {"$sum": {"$cond": [{"$eq": ["$allow_comment", True]}, 1, 0]}},
-                "is_private_false": {"$sum": {"$cond": [{"$eq": ["$is_private", False]}, 1, 0]}},
-                "with_goods_false": {"$sum": {"$cond": [{"$eq": ["$with_goods", False]}, 1, 0]}},
-                "in_reviewing_false": {"$sum": {"$cond": [{"$eq": ["$in_reviewing", False]}, 1, 0]}},
-                "self_see_false": {"$sum": {"$cond": [{"$eq": ["$self_see", False]}, 1, 0]}},
-                "is_prohibited_false": {"$sum": {"$cond": [{"$eq": ["$is_prohibited", False]}, 1, 0]}},
-            }
-        }
-    ]
-
-    # Numeric fields analysis
-    numeric_fields_pipeline = [
-        {"$group": {"_id": None, "private_status": {"$push": "$private_status"}, "reviewed": {"$push": "$reviewed"}, "download_status": {"$push": "$download_status"}}}
-    ]
-
-    # Execute pipelines
-    boolean_results = list(collection.aggregate(boolean_fields_pipeline))[0]
-    numeric_results = list(collection.aggregate(numeric_fields_pipeline))[0]
+    collection = get_collection(col_name)
+    result = next(collection.aggregate(get_analytics_pipeline()), {})
 
-    # Get posts by day of week (reusing existing function)
-    posts_by_day = get_posts_by_day_of_week()
+    booleans = (result.get("booleans") or [{}])[0]
 
-    # Structure all data for frontend
-    analytics_data = {
-        "totalPosts": total_docs,
+    return {
+        "totalPosts": booleans.get("total", 0),
         "booleanFields": {
-            "labels": [
-                "Is Delete (False)",
-                "Allow Share (True)",
-                "Allow Comment (True)",
-                "Is Private (False)",
-                "With Goods (False)",
-                "In Reviewing (False)",
-                "Self See (False)",
-                "Is Prohibited (False)",
-            ],
-            "datasets": [
-                {
-                    "label": "Boolean Fields Distribution",
-                    "data": [
-                        boolean_results["is_delete_false"],
-                        boolean_results["allow_share_true"],
-                        boolean_results["allow_comment_true"],
-                        boolean_results["is_private_false"],
-                        boolean_results["with_goods_false"],
-                        boolean_results["in_reviewing_false"],
-                        boolean_results["self_see_false"],
-                        boolean_results["is_prohibited_false"],
-                    ],
-                }
-            ],
-        },
-        "numericFields": {
-            "privateStatus": {"labels": ["Value 0"], "datasets": [{"label": "Private Status Distribution", "data": [numeric_results["private_status"].count(0)]}]},
-            "reviewed": {
-                "labels": ["Value 0", "Value 1"],
-                "datasets": [{"label": "Reviewed Status Distribution", "data": [numeric_results["reviewed"].count(0), numeric_results["reviewed"].count(1)]}],
-            },
-            "downloadStatus": {"labels": ["Value 0"], "datasets": [{"label": "Download Status Distribution", "data": [numeric_results["download_status"].count(0)]}]},
+            "labels": [label for _, label, _, _ in BOOLEAN_FIELDS],
+            "datasets": [{"label": "Boolean Fields Distribution", "data": [booleans.get(name, 0) for name, _, _, _ in BOOLEAN_FIELDS]}],
         },
-        "postsByDayOfWeek": posts_by_day,
+        "numericFields": {name: _distribution_chart(result.get(name, []), label, always) for name, _, label, always in NUMERIC_FIELDS},
+        "postsByDayOfWeek": _day_of_week_chart(result.get("dayOfWeek", [])),
     }
-
-    return analytics_data
@@ -0,0 +1,61 @@
+"""Persistent retry queue of the TikTok metadata extraction (replaces retry.txt)
+
+One document per video, _id is the aweme id so queuing the same video twice updates it:
+
+    {_id: "<aweme_id>", url, attempts, reason, error, nextAttemptAt, createdAt, updatedAt}
+
+The batch extractor queues the videos it could not get (rate limit, network errors) with an exponential backoff and
+takes the due ones on its next run, successful videos are removed.
+"""
+
+from datetime import UTC, datetime, timedelta
+
+from pymongo import ASCENDING, IndexModel
+
+from app.modules.mongo import indexes
+from app.modules.mongo.collection_registry import CollectionName
+from app.modules.mongo.mongo import get_collection
+
+col_name = CollectionName.TIKTOK_RETRIES
+BASE_DELAY_SECONDS = 60
+MAX_DELAY_SECONDS = 6 * 3600
+
+indexes.register_indexes(
+    col_name,
+    [IndexModel([("nextAttemptAt", ASCENDING)])],
+    [{"name": "due retries", "filter": {"nextAttemptAt": {"$lte": 0}}, "sort": [("nextAttemptAt", ASCENDING)]}],
+)
+
+
+def get_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(BASE_DELAY_SECONDS * 2 ** max(attempts - 1, 0), MAX_DELAY_SECONDS))
+
+
+def enqueue(video_id: str, url: str | None, reason: str, error: str | None = None, attempts: int = 1, now: datetime | None = None) -> None:  # noqa: PLR0913
+    """attempts is the number of failed attempts of this run, added to the ones of previous runs"""
+    now = now or datetime.now(UTC)
+    previous = get_collection(col_name).find_one({"_id": video_id}, {"attempts": 1}) or {}
+    total = previous.get("attempts", 0) + attempts
+    get_collection(col_name).update_one(
+        {"_id": video_id},
+        {
+            "$set": {"url": url, "attempts": total, "reason": reason, "error": error, "nextAttemptAt": now + get_delay(total), "updatedAt": now},
+            "$setOnInsert": {"createdAt": now},
+        },
+        upsert=True,
+    )
+
+
+def get_due(limit: int = 1000, now: datetime | None = None) -> list[dict]:
+    cursor = get_collection(col_name).find({"nextAttemptAt": {"$lte": now or datetime.now(UTC)}}).sort("nextAttemptAt", ASCENDING).limit(limit)
+    return list(cursor)
+
+
+def remove(video_ids: list[str]) -> int:
+    if not video_ids:
+        return 0
+    return get_collection(col_name).delete_many({"_id": {"$in": video_ids}}).deleted_count
+
+
+def count() -> int:
+    return get_collection(col_name).count_documents({})
@@ -0,0 +1,225 @@
+"""Materialized TikTok rollups in the tiktok_rollups collection
+
+Two kinds of documents, both with deterministic _id so updates are upserts:
+    author: {_id: "author:<unique_id>", kind, author, posts, statistics: {play_count, ...}, firstCreateTime, lastCreateTime}
+    day:    {_id: "day:<unique_id>:<YYYY-MM-DD>", kind, author, day, dayOfWeek (1=Sunday), posts, statistics, hours: {"13": 2}}
+
+Days and hours are UTC. The ingest applies every new aweme (and the statistics deltas of re-scrapes) with
+apply_awemes(), dashboards read O(authors) or O(author days) documents. Run a full rebuild once on an existing
+collection (or after changing the shape):
+
+    python -m app.video_analizer.repositories.tiktok_rollup_repository rebuild
+"""
+
+import sys
+from datetime import UTC, datetime
+
+from pymongo import ASCENDING, IndexModel, UpdateOne
+
+from app.modules.mongo import indexes
+from app.modules.mongo.collection_registry import CollectionName
+from app.modules.mongo.mongo import get_collection
+from app.video_analizer.repositories.tiktok_repository import CREATE_DATE, DAYS
+
+col_name = CollectionName.TIKTOK_ROLLUPS
+
+STATISTICS = ["play_count", "digg_count", "comment_count", "share_count", "collect_count"]
+
+indexes.register_indexes(
+    col_name,
+    [IndexModel([("kind", ASCENDING), ("author", ASCENDING), ("day", ASCENDING)])],
+    [
+        {"name": "authors", "filter": {"kind": "author"}},
+        {"name": "days of an author", "filter": {"kind": "day", "author": "user"}, "sort": [("day", ASCENDING)]},
+    ],
+)
+
+
+def get_create_datetime(aweme: dict) -> datetime | None:
+    create_time = aweme.get("create_time")
+    if isinstance(create_time, datetime):
+        return create_time if create_time.tzinfo else create_time.replace(tzinfo=UTC)
+    if isinstance(create_time, int | float):
+        return datetime.fromtimestamp(create_time, UTC)
+    return None
+
+
+def get_day_of_week(date: datetime) -> int:
+    """Same numbering as mongo $dayOfWeek, 1 Sunday to 7 Saturday"""
+    return (date.weekday() + 1) % 7 + 1
+
+
+def build_rollup_updates(aweme: dict, previous_statistics: dict | None = None) -> list[tuple[dict, dict]]:
+    """(filter, update) of the $inc upserts for the author and day rollups of one new aweme, awemes without author or create_time are skipped.
+    With previous_statistics the aweme is already counted and only the statistics difference is added (a re-scrape)"""
+    author = (aweme.get("author") or {}).get("unique_id")
+    created = get_create_datetime(aweme)
+    if not isinstance(author, str) or created is None:
+        return []
+
+    statistics = aweme.get("statistics") or {}
+    posts = 1
+    increments = {f"statistics.{name}": statistics.get(name) or 0 for name in STATISTICS}
+    if previous_statistics is not None:
+        posts = 0
+        increments = {field: value - (previous_statistics.get(field.split(".")[1]) or 0) for field, value in increments.items()}
+        increments = {field: value for field, value in increments.items() if value}
+        if not increments:
+            return []
+    day = created.strftime("%Y-%m-%d")
+    return [
+        (
+            {"_id": f"author:{author}"},
+            {
+                "$setOnInsert": {"kind": "author", "author": author},
+                "$inc": {"posts": posts, **increments},
+                "$min": {"firstCreateTime": created},
+                "$max": {"lastCreateTime": created},
+            },
+        ),
+        (
+            {"_id": f"day:{author}:{day}"},
+            {
+                "$setOnInsert": {"kind": "day", "author": author, "day": day, "dayOfWeek": get_day_of_week(created)},
+                "$inc": {"posts": posts, f"hours.{created.hour}": posts, **increments},
+            },
+        ),
+    ]
+
+
+def apply_awemes(awemes: list[dict], updated: list[tuple[dict, dict]] | None = None) -> int:
+    """Add newly inserted awemes to the rollups, call it only once per aweme (after a successful insert).
+    updated are (aweme, previous statistics) of awemes already counted whose statistics changed"""
+    updates = [update for aweme in awemes for update in build_rollup_updates(aweme)]
+    updates += [update for aweme, previous in updated or [] for update in build_rollup_updates(aweme, previous)]
+    requests = [UpdateOne(filters, update, upsert=True) for filters, update in updates]
+    if not requests:
+        return 0
+    get_collection(col_name).bulk_write(requests, ordered=False)
+    return len(requests)
+
+
+def _statistics_sums(prefix: str = "$statistics.") -> dict:
+    return {f"statistics_{name}": {"$sum": {"$ifNull": [f"{prefix}{name}", 0]}} for name in STATISTICS}
+
+
+def _statistics_object(prefix: str = "$") -> dict:
+    return {name: f"{prefix}statistics_{name}" for name in STATISTICS}
+
+
+def get_rebuild_pipelines(rebuilt_at: datetime) -> list[list[dict]]:
+    """Aggregations over tiktoks_aweme that $merge author and day rollups, same result as applying every aweme.
+    Every merged rollup is stamped with rebuiltAt, so the rollups left without the stamp are the orphans"""
+    match = {"$match": {"author.unique_id": {"$type": "string"}, "create_time": {"$ne": None}}}
+    merge = {"$merge": {"into": col_name.value, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+    authors = [
+        match,
+        {"$addFields": {"createDate": CREATE_DATE}},
+        {"$group": {"_id": "$author.unique_id", "posts": {"$sum": 1}, "firstCreateTime": {"$min": "$createDate"}, "lastCreateTime": {"$max": "$createDate"}, **_statistics_sums()}},
+        {
+            "$project": {
+                "_id": {"$concat": ["author:", "$_id"]},
+                "kind": "author",
+                "author": "$_id",
+                "posts": 1,
+                "statistics": _statistics_object(),
+                "firstCreateTime": 1,
+                "lastCreateTime": 1,
+                "rebuiltAt": {"$literal": rebuilt_at},
+            }
+        },
+        merge,
+    ]
+    days = [
+        match,
+        {"$addFields": {"createDate": CREATE_DATE}},
+        {
+            "$group": {
+                "_id": {"author": "$author.unique_id", "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$createDate"}}, "hour": {"$hour": "$createDate"}},
+                "dayOfWeek": {"$first": {"$dayOfWeek": "$createDate"}},
+                "posts": {"$sum": 1},
+                **_statistics_sums(),
+            }
+        },
+        {
+            "$group": {
+                "_id": {"author": "$_id.author", "day": "$_id.day"},
+                "dayOfWeek": {"$first": "$dayOfWeek"},
+                "posts": {"$sum": "$posts"},
+                "hours": {"$push": {"k": {"$toString": "$_id.hour"}, "v": "$posts"}},
+                **{f"statistics_{name}": {"$sum": f"$statistics_{name}"} for name in STATISTICS},
+            }
+        },
+        {
+            "$project": {
+                "_id": {"$concat": ["day:", "$_id.author", ":", "$_id.day"]},
+                "kind": "day",
+                "author": "$_id.author",
+                "day": "$_id.day",
+                "dayOfWeek": 1,
+                "posts": 1,
+                "hours": {"$arrayToObject": "$hours"},
+                "statistics": _statistics_object(),
+                "rebuiltAt": {"$literal": rebuilt_at},
+            }
+        },
+        merge,
+    ]
+    return [authors, days]
+
+
+def rebuild() -> int:
+    """Compute every rollup again from tiktoks_aweme, returns the number of rollup documents. The rollups are replaced
+    in place and the ones of authors or days without awemes are deleted after the merge, dashboards never see them empty"""
+    rebuilt_at = datetime.now(UTC)
+    awemes = get_collection(CollectionName.TIKTOKS_AWEME)
+    for pipeline in get_rebuild_pipelines(rebuilt_at):
+        list(awemes.aggregate(pipeline, allowDiskUse=True))
+    get_collection(col_name).delete_many({"rebuiltAt": {"$ne": rebuilt_at}})
+    return get_collection(col_name).count_documents({})
+
+
+def get_author_post_counts() -> list[dict]:
+    """Same shape as tiktok_repository.get_author_post_counts: [{_id: unique_id, count}]"""
+    cursor = get_collection(col_name).find({"kind": "author"}, {"author": 1, "posts": 1})
+    return [{"_id": rollup["author"], "count": rollup["posts"]} for rollup in cursor]
+
+
+def get_author_summary(author: str) -> dict | None:
+    return get_collection(col_name).find_one({"_id": f"author:{author}"}, {"_id": 0})
+
+
+def get_activity(author: str | None = None) -> dict:
+    """Posts per day of week and per UTC hour for Chart.js, from the day rollups of one author or of everyone"""
+    query = {"kind": "day"} | ({"author": author} if author else {})
+    pipeline = [
+        {"$match": query},
+        {
+            "$facet": {
+                "dayOfWeek": [{"$group": {"_id": "$dayOfWeek", "count": {"$sum": "$posts"}}}],
+                "hours": [{"$project": {"hours": {"$objectToArray": "$hours"}}}, {"$unwind": "$hours"}, {"$group": {"_id": "$hours.k", "count": {"$sum": "$hours.v"}}}],
+            }
+        },
+    ]
+    result = next(get_collection(col_name).aggregate(pipeline), {"dayOfWeek": [], "hours": []})
+
+    day_counts = {entry["_id"]: entry["count"] for entry in result["dayOfWeek"]}
+    hour_counts = {int(entry["_id"]): entry["count"] for entry in result["hours"]}
+    by_day_of_week = [day_counts.get(index + 1, 0) for index in range(7)]
+    by_hour = [hour_counts.get(hour, 0) for hour in range(24)]
+    return {
+        "postsByDayOfWeek": {"labels": DAYS, "datasets": [{"label": "Posts per Day of Week", "data": by_day_of_week}]},
+        "postsByHour": {"labels": [f"{hour:02d}:00" for hour in range(24)], "datasets": [{"label": "Posts per Hour (UTC)", "data": by_hour}]},
+    }
+
+
+def main(argv: list[str]) -> int:
+    if len(argv) > 1 and argv[1] == "rebuild":
+        print(f"tiktok rollups rebuilt: {rebuild()} documents")
+        return 0
+    print("usage: python -m app.video_analizer.repositories.tiktok_rollup_repository rebuild")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
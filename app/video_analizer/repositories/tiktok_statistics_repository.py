@@ -0,0 +1,249 @@
+"""Statistics snapshots of the awemes over time, in the tiktoks_aweme_statistics time-series collection
+
+    {capturedAt, meta: {aweme_id, author}, statistics: {play_count, digg_count, ...}}
+
+The ingest adds a snapshot for every new aweme and every statistics change. Mongo groups the snapshots of one meta
+(one aweme) in compressed buckets, growth and delta queries read a few buckets instead of whole aweme payloads.
+Statistics are cumulative counters, the value of a period is its last snapshot and a delta is last - first.
+
+The time-series collection is created before the first write (ensure_collection), an insert into a missing collection
+would create a regular one. If a regular collection is already there nothing is written until it is migrated: migrate
+moves its snapshots (flat {aweme_id, author, ...} or {meta: {...}} shape) into the time-series collection through a
+_legacy copy, deleting each batch from _legacy once inserted so an interrupted migration resumes where it stopped.
+backfill seeds one snapshot per aweme document (dated by its ObjectId, so every duplicated scrape of the old ingest
+becomes a point of the curve):
+
+    python -m app.video_analizer.repositories.tiktok_statistics_repository migrate
+    python -m app.video_analizer.repositories.tiktok_statistics_repository backfill
+"""
+
+import contextlib
+import sys
+from collections.abc import Iterable
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING, IndexModel, InsertOne
+from pymongo.errors import CollectionInvalid
+
+from app.modules.mongo import collection_registry, indexes
+from app.modules.mongo.collection_registry import CollectionName
+from app.modules.mongo.mongo import get_collection
+from app.video_analizer.repositories.tiktok_rollup_repository import STATISTICS
+
+col_name = CollectionName.TIKTOK_STATISTICS
+UNITS = ("hour", "day", "week", "month")
+MAX_K = 100
+BATCH_SIZE = 5000
+
+indexes.register_indexes(
+    col_name,
+    [IndexModel([("meta.aweme_id", ASCENDING), ("capturedAt", DESCENDING)]), IndexModel([("meta.author", ASCENDING), ("capturedAt", DESCENDING)])],
+    [
+        {"name": "history of an aweme", "filter": {"meta.aweme_id": "0"}, "sort": [("capturedAt", DESCENDING)]},
+        {"name": "snapshots of an author", "filter": {"meta.author": "user"}, "sort": [("capturedAt", DESCENDING)]},
+    ],
+)
+
+
+class NotTimeSeriesError(Exception):
+    def __init__(self) -> None:
+        super().__init__(f"{col_name} is a regular collection, run python -m app.video_analizer.repositories.tiktok_statistics_repository migrate")
+
+
+_collection_ready = False
+
+
+def ensure_collection() -> None:
+    """Creates the time-series collection if it's missing, raises NotTimeSeriesError if a regular one is in the way"""
+    global _collection_ready  # noqa: PLW0603
+    if _collection_ready:
+        return
+    db = get_collection(col_name).database
+    info = next(db.list_collections(filter={"name": col_name.value}), None)
+    if info is None:
+        with contextlib.suppress(CollectionInvalid):  # another process created it meanwhile
+            db.create_collection(col_name.value, timeseries=collection_registry.COLLECTION_SPECS[col_name].timeseries)
+    elif info.get("type") != "timeseries":
+        raise NotTimeSeriesError()
+    _collection_ready = True
+
+
+def validate_unit(unit: str) -> str:
+    if unit not in UNITS:
+        raise ValueError(f"Unknown unit {unit}, use one of {', '.join(UNITS)}")
+    return unit
+
+
+def build_snapshot(aweme: dict, captured_at: datetime) -> dict:
+    author = (aweme.get("author") or {}).get("unique_id")
+    statistics = aweme.get("statistics") or {}
+    return {"capturedAt": captured_at, "meta": {"aweme_id": aweme["aweme_id"], "author": author}, "statistics": {name: statistics.get(name) or 0 for name in STATISTICS}}
+
+
+def add_snapshots(awemes: list[dict], captured_at: datetime) -> int:
+    if not awemes:
+        return 0
+    ensure_collection()
+    get_collection(col_name).insert_many([build_snapshot(aweme, captured_at) for aweme in awemes], ordered=False)
+    return len(awemes)
+
+
+def _match(aweme_id: str | None, author: str | None, start: datetime | None, end: datetime | None) -> dict:
+    if not aweme_id and not author:
+        raise ValueError("aweme_id or author is required")
+    query = {"meta.aweme_id": aweme_id} if aweme_id else {"meta.author": author}
+    if start or end:
+        query["capturedAt"] = ({"$gte": start} if start else {}) | ({"$lt": end} if end else {})
+    return query
+
+
+def get_history(aweme_id: str, limit: int = 100) -> list[dict]:
+    """Newest snapshots first"""
+    cursor = get_collection(col_name).find({"meta.aweme_id": aweme_id}, {"_id": 0}).sort("capturedAt", DESCENDING).limit(limit)
+    return list(cursor)
+
+
+def get_growth_pipeline(query: dict, unit: str) -> list[dict]:
+    """Last value of every aweme per period, summed per period (one aweme or all the awemes of an author)"""
+    return [
+        {"$match": query},
+        {"$sort": {"capturedAt": 1}},
+        {
+            "$group": {
+                "_id": {"aweme_id": "$meta.aweme_id", "period": {"$dateTrunc": {"date": "$capturedAt", "unit": unit}}},
+                **{name: {"$last": f"$statistics.{name}"} for name in STATISTICS},
+            }
+        },
+        {"$group": {"_id": "$_id.period", "awemes": {"$sum": 1}, **{name: {"$sum": f"${name}"} for name in STATISTICS}}},
+        {"$sort": {"_id": 1}},
+    ]
+
+
+def get_growth_curve(aweme_id: str | None = None, author: str | None = None, unit: str = "day", start: datetime | None = None, end: datetime | None = None) -> dict:
+    """Chart.js curve of the statistics at the end of every period. For an author a period only sums the awemes that
+    have a snapshot in it, use the deltas for totals over a window"""
+    pipeline = get_growth_pipeline(_match(aweme_id, author, start, end), validate_unit(unit))
+    periods = list(get_collection(col_name).aggregate(pipeline))
+    return {
+        "aweme_id": aweme_id,
+        "author": author,
+        "unit": unit,
+        "labels": [period["_id"].isoformat() for period in periods],
+        "datasets": [{"label": name, "data": [period[name] for period in periods]} for name in STATISTICS],
+    }
+
+
+def get_deltas_pipeline(query: dict, sort_by: str, k: int) -> list[dict]:
+    return [
+        {"$match": query},
+        {"$sort": {"capturedAt": 1}},
+        {
+            "$group": {
+                "_id": "$meta.aweme_id",
+                "author": {"$first": "$meta.author"},
+                "snapshots": {"$sum": 1},
+                "firstAt": {"$first": "$capturedAt"},
+                "lastAt": {"$last": "$capturedAt"},
+                "first": {"$first": "$statistics"},
+                "last": {"$last": "$statistics"},
+            }
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "aweme_id": "$_id",
+                "author": 1,
+                "snapshots": 1,
+                "firstAt": 1,
+                "lastAt": 1,
+                "statistics": "$last",
+                "deltas": {name: {"$subtract": [{"$ifNull": [f"$last.{name}", 0]}, {"$ifNull": [f"$first.{name}", 0]}]} for name in STATISTICS},
+            }
+        },
+        {"$sort": {f"deltas.{sort_by}": -1}},
+        {"$limit": k},
+    ]
+
+
+def get_deltas(  # noqa: PLR0913
+    aweme_id: str | None = None,
+    author: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    sort_by: str = "play_count",
+    k: int = 10,
+) -> list[dict]:
+    """Growth of every aweme inside the window (last - first snapshot), the k that grew the most by sort_by.
+    An aweme needs two snapshots in the window to have a delta different than 0"""
+    if sort_by not in STATISTICS:
+        raise ValueError(f"Unknown statistic {sort_by}, use one of {', '.join(STATISTICS)}")
+    return list(get_collection(col_name).aggregate(get_deltas_pipeline(_match(aweme_id, author, start, end), sort_by, min(k, MAX_K))))
+
+
+def _insert_batches(snapshots: Iterable[dict]) -> int:
+    ensure_collection()
+    collection = get_collection(col_name)
+    batch: list[InsertOne] = []
+    inserted = 0
+    for snapshot in snapshots:
+        batch.append(InsertOne(snapshot))
+        if len(batch) >= BATCH_SIZE:
+            inserted += collection.bulk_write(batch, ordered=False).inserted_count
+            batch = []
+    if batch:
+        inserted += collection.bulk_write(batch, ordered=False).inserted_count
+    return inserted
+
+
+def to_snapshot(old: dict) -> dict:
+    """Snapshot of a regular collection document, flat {aweme_id, author, ...} or already {meta: {...}}"""
+    meta = old.get("meta") or {"aweme_id": old.get("aweme_id"), "author": old.get("author")}
+    return {"capturedAt": old["capturedAt"], "meta": meta, "statistics": old.get("statistics") or {}}
+
+
+def migrate() -> int:
+    """Move the snapshots of a regular collection to the time-series one, resumes from an existing _legacy"""
+    global _collection_ready  # noqa: PLW0603
+    db = get_collection(col_name).database
+    legacy = f"{col_name.value}_legacy"
+    names = set(db.list_collection_names())
+    info = next(db.list_collections(filter={"name": col_name.value}), None)
+    if info is not None and info.get("type") != "timeseries":
+        if legacy in names:  # a previous run stopped after the rename, keep both sets of snapshots
+            db[col_name.value].aggregate([{"$merge": {"into": legacy}}])
+            db.drop_collection(col_name.value)
+        else:
+            db[col_name.value].rename(legacy)
+        names.add(legacy)
+        _collection_ready = False
+    if legacy not in names:
+        return 0
+    ensure_collection()
+
+    inserted = 0
+    while batch := list(db[legacy].find({}, batch_size=BATCH_SIZE).limit(BATCH_SIZE)):
+        inserted += _insert_batches(to_snapshot(old) for old in batch)
+        db[legacy].delete_many({"_id": {"$in": [old["_id"] for old in batch]}})
+    db.drop_collection(legacy)
+    return inserted
+
+
+def backfill() -> int:
+    """One snapshot per document of tiktoks_aweme dated by its ObjectId, run it once before the ingest dedupe"""
+    cursor = get_collection(CollectionName.TIKTOKS_AWEME).find({"aweme_id": {"$ne": None}}, {"aweme_id": 1, "author.unique_id": 1, "statistics": 1}, batch_size=BATCH_SIZE)
+    return _insert_batches(build_snapshot(aweme, aweme["_id"].generation_time) for aweme in cursor)
+
+
+def main(argv: list[str]) -> int:
+    if len(argv) > 1 and argv[1] == "migrate":
+        print(f"tiktok statistics migrated to time-series: {migrate()} snapshots")
+        return 0
+    if len(argv) > 1 and argv[1] == "backfill":
+        print(f"tiktok statistics backfilled: {backfill()} snapshots")
+        return 0
+    print("usage: python -m app.video_analizer.repositories.tiktok_statistics_repository [migrate|backfill]")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
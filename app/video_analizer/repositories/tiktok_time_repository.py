@@ -0,0 +1,120 @@
+"""Posting time analytics bucketed by the server in any timezone
+
+One aggregation returns the hour x day of week heatmap and the weekly trend, create_time (unix seconds) is turned into
+a date with $toDate and bucketed with $dayOfWeek/$hour/$dateTrunc in the requested timezone. Results are cached per
+(author, timezone, weeks) for CACHE_TTL_SECONDS. New awemes clear it (invalidate()) in every process only with the
+shared backend (MONGO_CACHE_REDIS_URL, same as mongo_cache), the in process fallback is cleared by ingests of this
+process only, ingests from the CLI or a worker show up when the TTL runs out.
+"""
+
+import os
+import time
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import bson
+from pymongo import IndexModel
+
+from app.modules.mongo import indexes
+from app.modules.mongo.mongo import get_collection
+from app.modules.mongo.mongo_cache import CacheBackend, MemoryCache, RedisCache
+from app.video_analizer.repositories.tiktok_repository import CREATE_DATE, DAYS, col_name
+
+CACHE_KEY = "tiktok_posting_times"
+CACHE_TTL_SECONDS = 300
+DEFAULT_TIMEZONE = "America/Mexico_City"
+
+_cache: CacheBackend | None = None
+
+indexes.register_indexes(col_name, [IndexModel("create_time")], [{"name": "posted since", "filter": {"create_time": {"$gte": 0}}}])
+
+
+def get_cache() -> CacheBackend:
+    global _cache  # noqa: PLW0603
+    if _cache is None:
+        redis_url = os.getenv("MONGO_CACHE_REDIS_URL")
+        _cache = RedisCache(redis_url, CACHE_TTL_SECONDS) if redis_url else MemoryCache(max_entries=500, ttl_seconds=CACHE_TTL_SECONDS)
+    return _cache
+
+
+def validate_timezone(timezone: str) -> str:
+    try:
+        ZoneInfo(timezone)
+    except (ZoneInfoNotFoundError, ValueError) as exc:
+        raise ValueError(f"Unknown timezone {timezone}, use an IANA name like America/Mexico_City") from exc
+    return timezone
+
+
+def get_posting_times_pipeline(author: str | None, timezone: str, weeks: int | None, now: float | None = None) -> list[dict]:
+    query = {"create_time": {"$ne": None}}
+    if author:
+        query["author.unique_id"] = author
+    if weeks:
+        query["create_time"] = {"$gte": int((now or time.time()) - weeks * 7 * 86400)}
+
+    return [
+        {"$match": query},
+        {"$project": {"_id": 0, "date": CREATE_DATE, "plays": {"$ifNull": ["$statistics.play_count", 0]}}},
+        {
+            "$facet": {
+                "heatmap": [
+                    {
+                        "$group": {
+                            "_id": {"day": {"$dayOfWeek": {"date": "$date", "timezone": timezone}}, "hour": {"$hour": {"date": "$date", "timezone": timezone}}},
+                            "posts": {"$sum": 1},
+                            "plays": {"$sum": "$plays"},
+                        }
+                    }
+                ],
+                "weekly": [
+                    {
+                        "$group": {
+                            "_id": {"$dateTrunc": {"date": "$date", "unit": "week", "timezone": timezone, "startOfWeek": "monday"}},
+                            "posts": {"$sum": 1},
+                            "plays": {"$sum": "$plays"},
+                        }
+                    },
+                    {"$sort": {"_id": 1}},
+                ],
+            }
+        },
+    ]
+
+
+def _format_result(result: dict, author: str | None, timezone: str, weeks: int | None) -> dict:
+    posts = [[0] * 24 for _ in DAYS]
+    plays = [[0] * 24 for _ in DAYS]
+    for entry in result.get("heatmap", []):
+        posts[entry["_id"]["day"] - 1][entry["_id"]["hour"]] = entry["posts"]
+        plays[entry["_id"]["day"] - 1][entry["_id"]["hour"]] = entry["plays"]
+
+    weekly = result.get("weekly", [])
+    return {
+        "author": author,
+        "timezone": timezone,
+        "weeks": weeks,
+        # rows are DAYS (Sunday first), columns hours 0-23 in the timezone
+        "heatmap": {"days": DAYS, "hours": list(range(24)), "posts": posts, "plays": plays},
+        "weekly": {
+            "labels": [entry["_id"].strftime("%Y-%m-%d") for entry in weekly],
+            "datasets": [{"label": "Posts per Week", "data": [entry["posts"] for entry in weekly]}, {"label": "Plays per Week", "data": [entry["plays"] for entry in weekly]}],
+        },
+    }
+
+
+def get_posting_times(author: str | None = None, timezone: str = DEFAULT_TIMEZONE, weeks: int | None = 12) -> dict:
+    """Heatmap and weekly trend of one author (or everyone), weeks=None uses all the history"""
+    timezone = validate_timezone(timezone)
+    key = f"{author or '*'}|{timezone}|{weeks or 'all'}"
+    cached = get_cache().get(CACHE_KEY, key, None)
+    if cached is not None:
+        return bson.decode(cached)
+
+    result = next(get_collection(col_name).aggregate(get_posting_times_pipeline(author, timezone, weeks)), {})
+    data = _format_result(result, author, timezone, weeks)
+    get_cache().set(CACHE_KEY, key, None, bson.encode(data))
+    return data
+
+
+def invalidate() -> None:
+    """New awemes change every window that includes now, drop all the cached results"""
+    get_cache().delete(CACHE_KEY)
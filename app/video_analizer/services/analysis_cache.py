@@ -0,0 +1,124 @@
+"""Result cache of the video analyses, the agent sources already analysed are the cache
+
+A source is reusable stage by stage: analysis.stages maps every finished stage to its STAGE_VERSIONS number, a stage
+whose version changed (or any stage, when PIPELINE_VERSION changes) is a miss and runs again. Two keys:
+
+- platform id (video.idPlatform, find_sources_by_video_platform_id): checked before anything is downloaded, when every
+  stage hits the analysis is a copy of the cached results and takes a couple of queries.
+- SHA-256 of the media bytes (analysis.mediaSha256): the same video under another id or url, checked after the download.
+
+    hit = analysis_cache.find_by_platform_id(video_id, exclude_id=agent_source.id)
+    run = await graph.run(targets, analysis_cache.CachedStages(hit.results, stages))
+"""
+
+import hashlib
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import TypeVar
+
+from app.agents.models.agent_sources_model import AgentSource, AnalysisInfo, ImageSource
+from app.agents.repositories import agent_sources_repository
+from app.modules.jobs.worker import InlineStages, StageRunner
+
+T = TypeVar("T")
+
+PIPELINE_VERSION = 1
+# Bump a stage when its output changes (another frame sampling, whisper model...), only that stage runs again
+STAGE_VERSIONS = {"video_upload": 1, "frames": 1, "audio": 1, "transcription": 1}
+
+
+@dataclass
+class CacheHit:
+    results: dict[str, object] = field(default_factory=dict)
+    media_sha256: str | None = None
+    source: dict = field(default_factory=dict)
+
+    def covers(self, stages: list[str]) -> bool:
+        return all(stage in self.results for stage in stages)
+
+
+def hash_media(media_bytes: bytes) -> str:
+    return hashlib.sha256(media_bytes).hexdigest()
+
+
+def get_stage_results(source: dict) -> dict[str, object]:
+    """Results of the stages of a source document that the current pipeline can reuse, in the stage output format"""
+    analysis = source.get("analysis") or {}
+    if analysis.get("pipelineVersion") != PIPELINE_VERSION:
+        return {}
+    video = source.get("video") or {}
+    values = {
+        "video_upload": video.get("video"),
+        "frames": [frame["image"] for frame in video["frames"]] if video.get("frames") else None,
+        "audio": video.get("audio"),
+        "transcription": video.get("transcription"),
+    }
+    stages = analysis.get("stages") or {}
+    return {name: value for name, value in values.items() if value is not None and stages.get(name) == STAGE_VERSIONS[name]}
+
+
+def merge_hits(sources: list[dict], exclude_id: str | None = None) -> CacheHit:
+    """Every stage from the source that has the most reusable stages first, so a full hit comes from one source"""
+    candidates = [(source, get_stage_results(source)) for source in sources if source.get("id") != exclude_id]
+    hit = CacheHit()
+    for source, results in sorted(candidates, key=lambda candidate: len(candidate[1]), reverse=True):
+        if not results:
+            continue
+        hit.source = hit.source or source
+        hit.media_sha256 = hit.media_sha256 or (source.get("analysis") or {}).get("mediaSha256")
+        for name, value in results.items():
+            hit.results.setdefault(name, value)
+    return hit
+
+
+def find_by_platform_id(platform_id: str, exclude_id: str | None = None) -> CacheHit:
+    return merge_hits(agent_sources_repository.find_sources_by_video_platform_id(platform_id), exclude_id)
+
+
+def find_by_media_hash(media_sha256: str, exclude_id: str | None = None) -> CacheHit:
+    hit = merge_hits(agent_sources_repository.find_sources_by_media_hash(media_sha256), exclude_id)
+    hit.media_sha256 = media_sha256
+    return hit
+
+
+def apply_source_details(agent_source: AgentSource, hit: CacheHit) -> None:
+    """Name, description and relation id normally come from the TikTok data that a full hit never downloads"""
+    for key in ("name", "description", "relationId"):
+        if hit.source.get(key) and not getattr(agent_source, key):
+            setattr(agent_source, key, hit.source[key])
+
+
+def apply_result(agent_source: AgentSource, stage: str, result: object) -> None:
+    """Stores a stage output on the source and marks it reusable with the current version"""
+    if stage == "video_upload":
+        agent_source.video.video = result
+    elif stage == "frames":
+        agent_source.video.frames = [ImageSource(image=frame, description="", title="") for frame in result]
+    elif stage == "audio":
+        agent_source.video.audio = result
+    elif stage == "transcription":
+        agent_source.video.transcription = result
+    analysis = agent_source.analysis or AnalysisInfo()
+    if analysis.pipelineVersion != PIPELINE_VERSION:
+        analysis = AnalysisInfo(mediaSha256=analysis.mediaSha256, pipelineVersion=PIPELINE_VERSION)
+    analysis.stages[stage] = STAGE_VERSIONS[stage]
+    agent_source.analysis = analysis
+
+
+def set_media_hash(agent_source: AgentSource, media_sha256: str | None) -> None:
+    if media_sha256:
+        agent_source.analysis = agent_source.analysis or AnalysisInfo(pipelineVersion=PIPELINE_VERSION)
+        agent_source.analysis.mediaSha256 = media_sha256
+
+
+class CachedStages:
+    """StageRunner that answers cached stages without calling them, the rest go to the wrapped runner (job checkpoints)"""
+
+    def __init__(self, results: dict[str, object], stages: StageRunner | None = None) -> None:
+        self.results = results
+        self.stages = stages or InlineStages()
+
+    async def run_stage(self, name: str, fn: Callable[[], Awaitable[T]]) -> T:
+        if name in self.results:
+            return self.results[name]
+        return await self.stages.run_stage(name, fn)
@@ -0,0 +1,74 @@
+"""Deltas of tiktoks_aweme and agent_sources for the live feed (GET /api/video-analizer/tiktok/live)
+
+    tiktok.new     {aweme_id, desc, create_time, author, statistics, metrics}   a new aweme
+    tiktok.stats   {author, statistics, metrics}                                 statistics of an aweme changed
+    source.status  {status, statusDescription, progress}                         an agent source moved forward
+
+Sources are saved whole (replace) by the analysis pipeline, so any insert or replace of agent_sources is a status delta.
+"""
+
+from collections.abc import Callable
+
+from app.modules.mongo.change_feed import ChangeFeed, ChangeSource, Delta, MongoChangeSource
+from app.modules.mongo.collection_registry import CollectionName
+
+STATUS_FIELDS = ("status", "statusDescription", "progress")
+STATS_FIELDS = ("statistics", "metrics")
+
+_feed: ChangeFeed | None = None
+
+
+def _updated_fields(change: dict) -> set[str]:
+    """Top level names of the updated fields, statistics.play_count -> statistics"""
+    updated = change.get("updateDescription", {}).get("updatedFields", {})
+    return {field.split(".")[0] for field in updated}
+
+
+def tiktok_delta(change: dict) -> Delta | None:
+    document = change.get("fullDocument")
+    if not document:  # deleted before the lookup
+        return None
+    author = document.get("author", {}).get("unique_id")
+    key = document.get("aweme_id") or str(change["documentKey"]["_id"])
+    if change["operationType"] in ("insert", "replace"):
+        data = {field: document.get(field) for field in ("aweme_id", "desc", "create_time", "statistics", "metrics")}
+        return {"type": "tiktok.new", "key": key, "data": data | {"author": author}}
+    if _updated_fields(change) & set(STATS_FIELDS):
+        return {"type": "tiktok.stats", "key": key, "data": {"author": author} | {field: document.get(field) for field in STATS_FIELDS}}
+    return None
+
+
+def source_delta(change: dict) -> Delta | None:
+    document = change.get("fullDocument")
+    if not document:
+        return None
+    if change["operationType"] == "update" and not _updated_fields(change) & set(STATUS_FIELDS):
+        return None
+    key = document.get("id") or str(change["documentKey"]["_id"])
+    return {"type": "source.status", "key": key, "data": {field: document.get(field) for field in STATUS_FIELDS if field in document}}
+
+
+MAPPERS = {CollectionName.TIKTOKS_AWEME: tiktok_delta, CollectionName.AGENT_SOURCES: source_delta}
+
+
+def get_feed(source: ChangeSource | None = None) -> ChangeFeed:
+    """Process wide feed (one change stream for every subscriber), source replaces the Mongo stream in tests"""
+    global _feed  # noqa: PLW0603
+    if _feed is None or source is not None:
+        _feed = ChangeFeed(source or MongoChangeSource(list(MAPPERS)), MAPPERS)
+    return _feed
+
+
+def build_match(user_id: str | None = None, source_ids: list[str] | None = None) -> Callable[[Delta], bool] | None:
+    """Subscriber filter, None receives everything. Each filter scopes its own deltas and leaves out the other kind:
+    user_id only receives the tiktok deltas of that author, source_ids only the status of those sources"""
+    if not user_id and not source_ids:
+        return None
+    sources = set(source_ids or [])
+
+    def match(delta: Delta) -> bool:
+        if delta["type"].startswith("tiktok."):
+            return bool(user_id) and delta["data"].get("author") == user_id
+        return delta["key"] in sources
+
+    return match
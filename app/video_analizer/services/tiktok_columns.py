@@ -0,0 +1,59 @@
+"""Columnar reads of tiktoks_aweme
+
+Only aweme_id, create_time and statistics.* leave the server (projection) and they land in one NumPy array per
+column, so the rest of the document (author, music, video urls...) is never decoded. pymongoarrow decodes the raw
+BSON batches straight into Arrow buffers, no Python dict is built per document.
+"""
+
+import numpy as np
+import pyarrow as pa
+from pymongo.collection import Collection
+from pymongoarrow.api import Schema, find_arrow_all
+
+STATISTICS = [
+    "comment_count",
+    "digg_count",
+    "download_count",
+    "play_count",
+    "share_count",
+    "forward_count",
+    "lose_count",
+    "lose_comment_count",
+    "whatsapp_share_count",
+    "collect_count",
+    "repost_count",
+]
+
+# interactions counted by the engagement rate, divided by play_count
+ENGAGEMENT_STATISTICS = ["comment_count", "digg_count", "share_count", "whatsapp_share_count", "collect_count", "repost_count"]
+
+PROJECTION = {"_id": 0, "aweme_id": 1, "create_time": 1, **{f"statistics.{name}": 1 for name in STATISTICS}}
+
+BATCH_SIZE = 5000
+
+
+def find_columns(collection: Collection, query: dict) -> dict[str, np.ndarray]:
+    """{aweme_id, create_time (unix seconds), statistics_<name>} arrays of the same length, missing numbers are 0"""
+    schema = Schema(
+        {
+            "aweme_id": pa.string(),
+            "create_time": pa.int64(),
+            "statistics": pa.struct([(name, pa.int64()) for name in STATISTICS]),
+        }
+    )
+    table = find_arrow_all(collection, query, schema=schema, projection=PROJECTION, batch_size=BATCH_SIZE)
+    statistics = table.column("statistics").combine_chunks()
+    columns = {
+        "aweme_id": table.column("aweme_id").to_numpy(zero_copy_only=False).astype(object),
+        "create_time": table.column("create_time").fill_null(0).to_numpy(),
+    }
+    for name in STATISTICS:
+        columns[f"statistics_{name}"] = statistics.field(name).fill_null(0).to_numpy(zero_copy_only=False)
+    return columns
+
+
+def engagement(columns: dict[str, np.ndarray]) -> np.ndarray:
+    """Interactions / plays, 0 for videos without plays (JSON has no inf/NaN)"""
+    interactions = np.sum([columns[f"statistics_{name}"] for name in ENGAGEMENT_STATISTICS], axis=0, dtype=np.float64)
+    plays = columns["statistics_play_count"].astype(np.float64)
+    return np.divide(interactions, plays, out=np.zeros_like(interactions), where=plays > 0)
@@ -0,0 +1,37 @@
+"""Derived ratios stored on every aweme as `metrics.<name>`
+
+Each metric is sum(statistics) / play_count, 0 when there are no plays. compute_metrics() is used at ingest and
+get_metrics_expression() builds the same numbers inside an update pipeline for the backfill, so both stay in sync.
+"""
+
+from app.video_analizer.services.tiktok_columns import ENGAGEMENT_STATISTICS
+
+METRICS = {
+    "engagement": ENGAGEMENT_STATISTICS,
+    "like_rate": ["digg_count"],
+    "comment_rate": ["comment_count"],
+    "share_rate": ["share_count", "whatsapp_share_count", "repost_count"],
+    "save_rate": ["collect_count"],
+}
+
+
+def compute_metrics(statistics: dict | None) -> dict[str, float]:
+    statistics = statistics or {}
+    plays = statistics.get("play_count") or 0
+    return {name: (sum(statistics.get(field) or 0 for field in fields) / plays if plays > 0 else 0.0) for name, fields in METRICS.items()}
+
+
+def add_metrics(aweme: dict) -> dict:
+    """Sets aweme["metrics"] from its statistics, returns the same dict"""
+    aweme["metrics"] = compute_metrics(aweme.get("statistics"))
+    return aweme
+
+
+def get_metrics_expression() -> dict:
+    """Aggregation expression of the metrics sub-document, for update pipelines ($set: {metrics: ...})"""
+    plays = {"$ifNull": ["$statistics.play_count", 0]}
+    expression = {}
+    for name, fields in METRICS.items():
+        total = {"$add": [{"$ifNull": [f"$statistics.{field}", 0]} for field in fields]}
+        expression[name] = {"$cond": [{"$gt": [plays, 0]}, {"$divide": [total, plays]}, 0.0]}
+    return expression
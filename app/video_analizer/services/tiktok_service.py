@@ -1,6 +1,8 @@
 import pandas as pd
 
-from app.modules.mongo.mongo import db
+from app.modules.mongo.collection_registry import CollectionName
+from app.modules.mongo.mongo import get_collection
+from app.video_analizer.services import tiktok_columns
 
 
 def normalize_column(df: pd.DataFrame, column: str, remove_original_column: bool = False) -> pd.DataFrame:
@@ -28,36 +30,25 @@ def normalize_column(df: pd.DataFrame, column: str, remove_original_column: bool
 
 
 def get_tiktok_data(id: str) -> dict:
-    tiktok = db["tiktoks_aweme"].find_one({"aweme_id": id})
-    tiktok["_id"] = str(tiktok["_id"])
-    return tiktok
+    return get_collection(CollectionName.TIKTOKS_AWEME).find_one({"aweme_id": id})
 
 
 def get_data_from_tiktoks(user_id: str) -> list[dict]:
-    tiktoks = list(db["tiktoks_aweme"].find({"author.unique_id": user_id}))
+    """Statistics, engagement and posting time of every video of the user, times in Mexico City time"""
+    columns = tiktok_columns.find_columns(get_collection(CollectionName.TIKTOKS_AWEME), {"author.unique_id": user_id})
 
-    df = pd.DataFrame(tiktoks)
-
-    df = normalize_column(df, "statistics")
+    df = pd.DataFrame(columns)
 
     # Convert create_time to Mexico City Time
-    df["create_time"] = pd.to_datetime(df["create_time"], unit="s").dt.tz_localize("UTC")
-    df["create_time"] = df["create_time"].dt.tz_convert("America/Mexico_City")  # This is Central Time
-    df["create_time"] = df["create_time"].dt.tz_localize(None)  # remove timezone
+    create_time = pd.to_datetime(df["create_time"], unit="s").dt.tz_localize("UTC")
+    df["create_time"] = create_time.dt.tz_convert("America/Mexico_City").dt.tz_localize(None)  # This is Central Time, remove timezone
 
     # Additional timing analysis
     df["cat_hour"] = df["create_time"].dt.hour
     df["cat_day_of_week"] = df["create_time"].dt.day_name()
 
     # Calculate engagement metrics
-    df["statistics_engagement"] = (
-        df["statistics_comment_count"]  # Comments
-        + df["statistics_digg_count"]  # Likes
-        + df["statistics_share_count"]  # Total shares
-        + df["statistics_whatsapp_share_count"]  # WhatsApp shares
-        + df["statistics_collect_count"]  # Saves/Collections
-        + df["statistics_repost_count"]  # Reposts
-    ) / df["statistics_play_count"]  # Divided by views
+    df["statistics_engagement"] = tiktok_columns.engagement(columns)
 
     columns_for_frontend = [
         "aweme_id",
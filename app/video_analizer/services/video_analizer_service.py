@@ -1,132 +1,215 @@
-import asyncio
 import re
+from collections.abc import Awaitable, Callable
 
-from app.agents.models.agent_sources_model import AgentSource, ImageSource, SourceType, VideoSource
+from app.agents.models.agent_sources_model import AgentSource, SourceType, VideoSource
 from app.agents.repositories import agent_sources_repository
+from app.agents.services.source_progress import ProgressReporter
+from app.modules.execution import executors
+from app.modules.jobs import job_queue, worker
+from app.modules.jobs.job_queue import Job
+from app.modules.jobs.stage_graph import StageGraph
+from app.modules.jobs.worker import JobContext, StageRunner
 from app.video_analizer.models.model import VideoAnalysisModel
-from tools.tiktok_analizer import tiktok_downloader, video_extraction
+from app.video_analizer.services import analysis_cache
+from tools.tiktok_analizer import tiktok_batch_extractor, tiktok_downloader, video_extraction
 from tools.whisper import groq_whisper
 from tools.youtube import yt_dlp_utils
 
+ANALYSIS_JOB = "video_analysis"
+TIKTOK_STAGES = ["video_upload", "frames", "audio", "transcription"]
+YOUTUBE_STAGES = ["video_upload"]
+
 
 def save_agent_source() -> AgentSource:
     agent_source = AgentSource(type=SourceType.TIKTOK, status="processing", statusDescription="Extracting tiktok data...")
     return agent_sources_repository.save_source(agent_source)
 
 
-async def analize_video(videoAnalysis: VideoAnalysisModel, agent_source: AgentSource) -> AgentSource:
-    # Run the potentially blocking operation in a thread pool
-    # This prevents it from blocking the event loop
+async def analize_video(videoAnalysis: VideoAnalysisModel) -> AgentSource:
+    """Save a processing agent source and queue the analysis, a worker process (python -m app.modules.jobs.worker) runs it
+    and updates the source. The url is validated first so an invalid one raises before any source is saved.
+    A video already analysed with the current pipeline version is copied from the cache without queuing anything"""
     if videoAnalysis.website == "tiktok":
-        asyncio.create_task(_run_analysis(videoAnalysis.url, agent_source))
+        platform_id, stages = extract_tiktok_url_components(videoAnalysis.url)[1], TIKTOK_STAGES
     elif videoAnalysis.website == "youtube":
-        asyncio.create_task(_run_analysis_youtube(videoAnalysis.url, agent_source))
+        platform_id, stages = get_youtube_video_id(videoAnalysis.url), YOUTUBE_STAGES
     else:
         raise ValueError("Invalid website")
-
+    agent_source = await executors.run_io(save_agent_source)
+    if platform_id:
+        hit = await executors.run_io(analysis_cache.find_by_platform_id, platform_id, agent_source.id)
+        if hit.covers(stages):
+            return await _copy_cached_analysis(agent_source, platform_id, stages, hit)
+    payload = {"url": videoAnalysis.url, "website": videoAnalysis.website, "agentSourceId": agent_source.id}
+    await executors.run_io(job_queue.get_queue().enqueue, ANALYSIS_JOB, payload)
     return agent_source
 
 
-async def _run_analysis_youtube(url: str, agent_source: AgentSource) -> None:
-    try:
-        await download_youtube_video_upload_files_and_update_db(url, agent_source)
-    except Exception as e:
-        print(f"Error in background analysis: {e}")
-        _save_source_status(agent_source, f"Error during analysis: {str(e)}")
-        agent_sources_repository.save_source(agent_source)
+async def _copy_cached_analysis(agent_source: AgentSource, platform_id: str, stages: list[str], hit: analysis_cache.CacheHit) -> AgentSource:
+    agent_source.video = VideoSource(idPlatform=platform_id)
+    for stage in stages:
+        analysis_cache.apply_result(agent_source, stage, hit.results[stage])
+    analysis_cache.apply_source_details(agent_source, hit)
+    analysis_cache.set_media_hash(agent_source, hit.media_sha256)
+    agent_source.statusDescription, agent_source.progress, agent_source.timings = "Process completed (cached analysis)", 100, {"total": 0}
+    return await executors.run_io(agent_sources_repository.save_source, agent_source)
 
 
-async def _run_analysis(url: str, agent_source: AgentSource) -> None:
-    try:
-        await download_tiktok_upload_files_and_update_db(url, agent_source)
-    except Exception as e:
-        print(f"Error in background analysis: {e}")
-        _save_source_status(agent_source, f"Error during analysis: {str(e)}")
-        agent_sources_repository.save_source(agent_source)
+async def run_analysis_job(job: Job, context: JobContext) -> dict:
+    agent_source = await executors.run_io(agent_sources_repository.get_source, job.payload["agentSourceId"])
+    if agent_source is None:
+        raise ValueError(f"Agent source {job.payload['agentSourceId']} not found")
+    if job.payload["website"] == "youtube":
+        await download_youtube_video_upload_files_and_update_db(job.payload["url"], agent_source)
+    else:
+        await download_tiktok_upload_files_and_update_db(job.payload["url"], agent_source, context)
+    return {"agentSourceId": agent_source.id}
+
+
+async def on_analysis_failed(job: Job, error: str) -> None:
+    patch = {"status": "error", "statusDescription": f"Error during analysis: {error}"}
+    await executors.run_io(agent_sources_repository.update_source_fields, job.payload["agentSourceId"], patch)
+
 
+worker.register_handler(ANALYSIS_JOB, run_analysis_job, on_analysis_failed)
 
-async def save_tiktok_data(urls: list[str]) -> None:
-    for ind, url in enumerate(urls):
-        print(f"* {ind + 1}/{len(urls)} Getting data from video: {url}")
-        username, video_id = extract_tiktok_url_components(url)
-        data = await tiktok_downloader.request_data(video_id)
-        saved_id = tiktok_downloader.save_in_db(data)
-        await asyncio.sleep(0.7)
-        print("saved tiktok data", saved_id)
+
+async def save_tiktok_data(urls: list[str], concurrency: int = 8) -> dict:
+    """Extract and save the metadata of many videos, returns the extraction progress summary"""
+    summary = await tiktok_batch_extractor.extract_urls(urls, concurrency=concurrency)
+    print("saved tiktok data", summary)
+    return summary
 
 
 async def download_youtube_video_upload_files_and_update_db(url: str, agent_source: AgentSource) -> None:
     # Todo check if this method is working...r
-    video_bytes, info_dict = yt_dlp_utils.download_youtube_video_to_memory(url)
-    video_storage_ref = f"youtube/{info_dict.get('id', 'video')}.mp4"
-    _save_source_status(agent_source, "Uploading video to cloud storage...")
-    # Refactor this, i need stourage libs with this method
-    storage_data = await tiktok_downloader.upload_media_to_storage(video_storage_ref, video_bytes)
-    _save_source_status(agent_source, "Video uploaded to cloud storage! Saving database..." + str(storage_data))
-    agent_source.video = VideoSource(idPlatform=info_dict.get("id", "video"), video=storage_data)
-    agent_source = agent_sources_repository.save_source(agent_source)
-    pass
-
-
-async def download_tiktok_upload_files_and_update_db(url: str, agent_source: AgentSource) -> None:
-    # 2. Extract tiktok data
+    progress = ProgressReporter(agent_source)
+    try:
+        progress.report("Downloading youtube video...", progress=0)
+        video_bytes, info_dict = await executors.run_io(yt_dlp_utils.download_youtube_video_to_memory, url)
+        agent_source.video = VideoSource(idPlatform=info_dict.get("id", "video"))
+        media_sha256 = await executors.run_io(analysis_cache.hash_media, video_bytes.getvalue())
+        analysis_cache.set_media_hash(agent_source, media_sha256)
+        hit = await executors.run_io(analysis_cache.find_by_media_hash, media_sha256, agent_source.id)
+        storage_data = hit.results.get("video_upload")
+        if storage_data is None:
+            video_storage_ref = f"youtube/{info_dict.get('id', 'video')}.mp4"
+            progress.report("Uploading video to cloud storage...", progress=50)
+            # Refactor this, i need stourage libs with this method
+            storage_data = await tiktok_downloader.upload_media_to_storage(video_storage_ref, video_bytes)
+        analysis_cache.apply_result(agent_source, "video_upload", storage_data)
+        await progress.checkpoint("Video uploaded to cloud storage!", progress=100)
+    finally:
+        await progress.close()  # a late status patch must not overwrite the error of on_analysis_failed
+
+
+async def download_tiktok_upload_files_and_update_db(url: str, agent_source: AgentSource, stages: StageRunner | None = None) -> AgentSource:
+    """Runs the analysis as a stage graph, the video upload, the frames and the audio branches only need the video bytes
+    and run at the same time:
+
+        download -> media_cache (SHA-256 lookup, every stage below also waits for it)
+                 -> video_upload
+                 -> frames (extract + upload)
+                 -> audio_extract -> audio (upload)
+                                  -> transcription
+
+    Stages are checkpointed when stages is a JobContext, a retried job skips the ones it already did. Media bytes are
+    not stored, they are downloaded again only if a pending stage needs them. Seconds per stage go to agent_source.timings
+    Status messages are debounced patches, the whole source is saved only when a stage finishes (ProgressReporter)
+
+    Stages already done for this video id come from analysis_cache and the video is not downloaded unless another stage
+    needs it, after a download the stages done for the same media bytes (SHA-256) are reused too.
+    """
     username, video_id = extract_tiktok_url_components(url)
-    _save_source_status(agent_source, f"Extracting tiktok video data, id {video_id} from username: {username}...")
-
-    parsed_data, tiktok_data = await tiktok_downloader.get_titktok_video_data(url)
-    agent_source.relationId = parsed_data.get("id")
-    # Donwload video
-    agent_source.name = tiktok_data.get("author", {}).get("nickname") + " - " + tiktok_data.get("desc")[0:20]
-    agent_source.description = tiktok_data.get("desc")
-    _save_source_status(agent_source, "Tiktok Video Found! Downloading video...")
-    video_bytes = await tiktok_downloader.download_tiktok_media(parsed_data)
-
-    # Upload video to cloud
-    _save_source_status(agent_source, "Uploading video to cloud storage...")
-    video_storage_ref = f"tiktok/{username}/videos/{video_id}.mp4"
-    storage_data = await tiktok_downloader.upload_media_to_storage(video_storage_ref, video_bytes)
-    # Save video source
-    _save_source_status(agent_source, "Video uploaded to cloud storage! Saving database..." + str(storage_data))
-    video_source = VideoSource(idPlatform=video_id, video=storage_data)
-    agent_source.video = video_source
-    agent_source = agent_sources_repository.save_source(agent_source)
-
-    # Extract Images frames.
-    _save_source_status(agent_source, "Extracting frames from video...")
-
-    storage_frames_dir = f"tiktok/{username}/frames/{video_id}"
-    screenshots = video_extraction.extract_frames_from_video_bytes(video_bytes)
-
-    # Upload frames to cloud
-    _save_source_status(agent_source, f"Uploading {len(screenshots)} frames to cloud storage...")
-    storage_screnshots = video_extraction.upload_frames_to_storage(screenshots, storage_frames_dir)
-    video_frames = [ImageSource(image=frame, description="", title="") for frame in storage_screnshots]
-    agent_source.video.frames = video_frames
-
-    # Extracting and uploading audio
-    _save_source_status(agent_source, "Extracting audio from video...")
-    audio_bytes = video_extraction.extract_audio_from_video_bytes(video_bytes)
-    audio_storage_ref = f"tiktok/{username}/audio/{video_id}.mp3"
-    audio_storage_data = await tiktok_downloader.upload_media_to_storage(audio_storage_ref, audio_bytes)
-    agent_source.video.audio = audio_storage_data
-    # Starting transcription.
-    _save_source_status(agent_source, "Audio Extracted,  starting transcription" + str(audio_storage_data))
-
-    transcription = groq_whisper.transcribe_audio_with_bytes(audio_bytes)
-    transcription_object = {"text": transcription.text, "language": transcription.language, "segments": transcription.segments, "duration": transcription.duration}
-    _save_source_status(agent_source, "🎤 transcription" + str(transcription_object))
-    agent_source.video.transcription = transcription_object
-
-    # Process completed
-    _save_source_status(agent_source, "Process completed")
-    return agent_source
+    agent_source.video = agent_source.video or VideoSource(idPlatform=video_id)
+    agent_source.video.idPlatform = video_id
+    targets = TIKTOK_STAGES
+    hit = await executors.run_io(analysis_cache.find_by_platform_id, video_id, agent_source.id)
+    analysis_cache.apply_source_details(agent_source, hit)
+    analysis_cache.set_media_hash(agent_source, hit.media_sha256)
+    finished: list[str] = []
+    progress = ProgressReporter(agent_source)
+
+    def get_percent() -> float:
+        return len(finished) / len(targets) * 100
+
+    async def download(_: dict) -> bytes:
+        # 2. Extract tiktok data
+        progress.report(f"Extracting tiktok video data, id {video_id} from username: {username}...", get_percent())
+        parsed_data, tiktok_data = await tiktok_downloader.get_titktok_video_data(url)
+        agent_source.relationId = parsed_data.get("id")
+        agent_source.name = tiktok_data.get("author", {}).get("nickname") + " - " + tiktok_data.get("desc")[0:20]
+        agent_source.description = tiktok_data.get("desc")
+        # Donwload video
+        progress.report("Tiktok Video Found! Downloading video...", get_percent())
+        return await tiktok_downloader.download_tiktok_media(parsed_data)
+
+    async def find_media_hits(inputs: dict) -> dict:
+        media_sha256 = await executors.run_io(analysis_cache.hash_media, inputs["download"])
+        analysis_cache.set_media_hash(agent_source, media_sha256)
+        return (await executors.run_io(analysis_cache.find_by_media_hash, media_sha256, agent_source.id)).results
+
+    def reusable(name: str, fn: Callable[[dict], Awaitable[object]]) -> Callable[[dict], Awaitable[object]]:
+        async def run(inputs: dict) -> object:
+            if name in inputs["media_cache"]:
+                return inputs["media_cache"][name]
+            return await fn(inputs)
+
+        return run
+
+    async def upload_video(inputs: dict) -> dict:
+        progress.report("Uploading video to cloud storage...", get_percent())
+        return await tiktok_downloader.upload_media_to_storage(f"tiktok/{username}/videos/{video_id}.mp4", inputs["download"])
+
+    async def extract_and_upload_frames(inputs: dict) -> list[dict]:
+        screenshots = await executors.run_cpu(video_extraction.extract_frames_from_video_bytes, inputs["download"])
+        progress.report(f"Uploading {len(screenshots)} frames to cloud storage...", get_percent())
+        return await executors.run_io(video_extraction.upload_frames_to_storage, screenshots, f"tiktok/{username}/frames/{video_id}")
+
+    async def extract_audio(inputs: dict) -> bytes:
+        if {"audio", "transcription"} <= inputs["media_cache"].keys():
+            return b""
+        return await executors.run_cpu(video_extraction.extract_audio_from_video_bytes, inputs["download"])
+
+    async def upload_audio(inputs: dict) -> dict:
+        return await tiktok_downloader.upload_media_to_storage(f"tiktok/{username}/audio/{video_id}.mp3", inputs["audio_extract"])
+
+    async def transcribe(inputs: dict) -> dict:
+        transcription = await executors.run_io(groq_whisper.transcribe_audio_with_bytes, inputs["audio_extract"])
+        return {"text": transcription.text, "language": transcription.language, "segments": transcription.segments, "duration": transcription.duration}
+
+    graph = StageGraph()
+    graph.add("download", download, checkpoint=False)
+    graph.add("media_cache", find_media_hits, after=["download"], checkpoint=False)
+    graph.add("video_upload", reusable("video_upload", upload_video), after=["download", "media_cache"])
+    graph.add("frames", reusable("frames", extract_and_upload_frames), after=["download", "media_cache"])
+    graph.add("audio_extract", extract_audio, after=["download", "media_cache"], checkpoint=False)
+    graph.add("audio", reusable("audio", upload_audio), after=["audio_extract", "media_cache"])
+    graph.add("transcription", reusable("transcription", transcribe), after=["audio_extract", "media_cache"])
+
+    async def on_stage_done(name: str, result: object) -> None:
+        if name not in targets:
+            return
+        analysis_cache.apply_result(agent_source, name, result)
+        if name == "video_upload":
+            description = "Video uploaded to cloud storage!"
+        elif name == "frames":
+            description = f"{len(result)} frames uploaded to cloud storage"
+        elif name == "audio":
+            description = "Audio Extracted and uploaded"
+        else:
+            description = "🎤 transcription done"
+        finished.append(name)
+        await progress.checkpoint(description, get_percent())
 
+    try:
+        run = await graph.run(targets, analysis_cache.CachedStages(hit.results, stages), on_stage_done)
+        agent_source.timings = {name: round(seconds, 3) for name, seconds in run.timer.seconds.items()} | {"total": round(run.timer.total, 3)}
 
-def _save_source_status(agent_source: AgentSource, status_description: str) -> AgentSource:
-    agent_source.statusDescription = status_description
-    print(agent_source.statusDescription)
-    agent_source = agent_sources_repository.save_source(agent_source)
-    return agent_source
+        # Process completed
+        return await progress.checkpoint("Process completed", 100)
+    finally:
+        await progress.close()  # a late status patch must not overwrite the error of on_analysis_failed
 
 
 def extract_tiktok_url_components(url: str) -> tuple[str, str]:
@@ -152,5 +235,10 @@ def extract_tiktok_url_components(url: str) -> tuple[str, str]:
     return username, video_id
 
 
+def get_youtube_video_id(url: str) -> str | None:
+    match = re.search(r"(?:v=|youtu\.be/|shorts/|embed/)([\w-]{11})", url)
+    return match.group(1) if match else None
+
+
 def get_tiktok_sources(video_id: str) -> list[dict]:
     return agent_sources_repository.find_sources_by_video_platform_id(video_id)
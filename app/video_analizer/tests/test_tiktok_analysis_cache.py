@@ -0,0 +1,68 @@
+import asyncio
+from unittest.mock import patch
+
+from app.agents.models.agent_sources_model import AgentSource, VideoSource
+from app.modules.jobs.stage_graph import StageGraph
+from app.video_analizer.services import analysis_cache
+from app.video_analizer.services.analysis_cache import PIPELINE_VERSION, STAGE_VERSIONS, CachedStages
+
+STORAGE = {"url": "https://storage/video.mp4", "bucket": "b", "path": "tiktok/u/videos/1.mp4"}
+
+
+def _source(source_id: str, stages: dict[str, int], pipeline_version: int = PIPELINE_VERSION) -> dict:
+    return {
+        "id": source_id,
+        "name": "polilan - hola",
+        "video": {
+            "idPlatform": "1",
+            "video": STORAGE,
+            "frames": [{"image": {"url": "f0"}, "description": "", "title": ""}],
+            "audio": {"url": "a"},
+            "transcription": {"text": "hola"},
+        },
+        "analysis": {"mediaSha256": "abc", "pipelineVersion": pipeline_version, "stages": stages},
+    }
+
+
+def test_only_stages_with_the_current_versions_are_reused() -> None:
+    outdated = dict(STAGE_VERSIONS) | {"transcription": STAGE_VERSIONS["transcription"] - 1}
+    assert analysis_cache.get_stage_results(_source("s1", outdated)) == {"video_upload": STORAGE, "frames": [{"url": "f0"}], "audio": {"url": "a"}}
+    assert analysis_cache.get_stage_results(_source("s1", STAGE_VERSIONS, PIPELINE_VERSION - 1)) == {}
+    assert analysis_cache.get_stage_results({"id": "s1", "video": {"idPlatform": "1"}}) == {}
+
+
+def test_hits_merge_stages_of_several_sources_but_not_the_current_one() -> None:
+    sources = [_source("current", STAGE_VERSIONS), _source("partial", {"video_upload": 1}), _source("frames", {"frames": 1, "audio": 1})]
+    with patch("app.video_analizer.services.analysis_cache.agent_sources_repository.find_sources_by_video_platform_id", return_value=sources):
+        hit = analysis_cache.find_by_platform_id("1", exclude_id="current")
+
+    assert sorted(hit.results) == ["audio", "frames", "video_upload"]
+    assert hit.source["id"] == "frames" and hit.media_sha256 == "abc"
+    assert not hit.covers(["video_upload", "transcription"])
+
+
+def test_cached_stages_are_not_run_and_record_their_version() -> None:
+    calls: list[str] = []
+
+    def stage(name: str):  # noqa: ANN202
+        async def fn(inputs: dict) -> dict:
+            calls.append(name)
+            return {"url": name}
+
+        return fn
+
+    graph = StageGraph()
+    graph.add("download", stage("download"), checkpoint=False)
+    graph.add("video_upload", stage("video_upload"), after=["download"])
+    graph.add("transcription", stage("transcription"), after=["download"])
+    run = asyncio.run(graph.run(["video_upload", "transcription"], CachedStages({"video_upload": STORAGE})))
+
+    assert calls == ["download", "transcription"] and run.results["video_upload"] == STORAGE
+    assert run.timer.reused == ["video_upload"]
+
+    source = AgentSource(id="s2", video=VideoSource(idPlatform="1"))
+    analysis_cache.set_media_hash(source, analysis_cache.hash_media(b"video"))
+    analysis_cache.apply_result(source, "frames", [STORAGE])
+    assert source.video.frames[0].image == STORAGE
+    assert source.analysis.pipelineVersion == PIPELINE_VERSION and source.analysis.stages == {"frames": STAGE_VERSIONS["frames"]}
+    assert source.analysis.mediaSha256 == analysis_cache.hash_media(b"video") and len(source.analysis.mediaSha256) == 64
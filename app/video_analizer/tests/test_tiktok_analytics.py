@@ -0,0 +1,37 @@
+from unittest.mock import Mock, patch
+
+from app.video_analizer.repositories import tiktok_repository
+
+
+def test_comprehensive_analytics_single_facet_round_trip() -> None:
+    facet_result = {
+        "booleans": [{"_id": None, "total": 5, "is_delete_false": 5, "allow_share_true": 4, "allow_comment_true": 3}],
+        "dayOfWeek": [{"_id": 1, "count": 2}, {"_id": 7, "count": 3}],
+        "privateStatus": [{"_id": 0, "count": 5}],
+        "reviewed": [{"_id": 1, "count": 5}],
+        "downloadStatus": [{"_id": 0, "count": 4}, {"_id": 2, "count": 1}],
+    }
+    collection = Mock()
+    collection.aggregate.return_value = iter([facet_result])
+
+    with patch("app.video_analizer.repositories.tiktok_repository.get_collection", return_value=collection):
+        analytics = tiktok_repository.get_comprehensive_analytics()
+
+    collection.aggregate.assert_called_once()
+    assert "$facet" in collection.aggregate.call_args.args[0][-1]
+    assert analytics["totalPosts"] == 5
+    assert analytics["booleanFields"]["datasets"][0]["data"][:4] == [5, 4, 3, 0]
+    assert analytics["numericFields"]["reviewed"]["datasets"][0]["data"] == [0, 5]
+    assert analytics["numericFields"]["downloadStatus"]["labels"] == ["Value 0", "Value 2"]
+    assert analytics["postsByDayOfWeek"]["datasets"][0]["data"] == [2, 0, 0, 0, 0, 0, 3]
+
+
+def test_empty_collection() -> None:
+    collection = Mock()
+    collection.aggregate.return_value = iter([{"booleans": [], "dayOfWeek": [], "privateStatus": [], "reviewed": [], "downloadStatus": []}])
+
+    with patch("app.video_analizer.repositories.tiktok_repository.get_collection", return_value=collection):
+        analytics = tiktok_repository.get_comprehensive_analytics()
+
+    assert analytics["totalPosts"] == 0
+    assert analytics["numericFields"]["privateStatus"]["datasets"][0]["data"] == [0]
@@ -0,0 +1,104 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+import httpx
+
+from tools.tiktok_analizer import tiktok_api, tiktok_batch_extractor
+from tools.tiktok_analizer.tiktok_batch_extractor import AdaptiveTokenBucket
+
+URLS = [f"https://www.tiktok.com/@polilan_app/video/{7_000_000_000_000_000_000 + index}" for index in range(6)]
+
+
+def test_parse_feed_response() -> None:
+    assert tiktok_api.parse_feed_response(200, "ratelimit triggered") == (None, tiktok_api.RATE_LIMITED)
+    assert tiktok_api.parse_feed_response(200, '{"aweme_list": []}') == (None, "not_found")
+    assert tiktok_api.parse_feed_response(200, '{"aweme_list": [{"aweme_id": "1"}]}') == ({"aweme_id": "1"}, "ok")
+    assert tiktok_api.parse_feed_response(500, "<html>")[1] == "error"
+
+
+def test_feed_without_the_requested_video_is_not_found() -> None:
+    # a deleted video comes back as a feed of other videos
+    text = '{"aweme_list": [{"aweme_id": "2"}, {"aweme_id": "1"}]}'
+
+    assert tiktok_api.parse_feed_response(200, text, "1") == ({"aweme_id": "1"}, "ok")
+    assert tiktok_api.parse_feed_response(200, text, "3") == (None, "not_found")
+
+
+def test_bucket_halves_on_rate_limit_and_grows_on_success() -> None:
+    bucket = AdaptiveTokenBucket(rate=4, min_rate=1, max_rate=5, increase=0.5, cooldown_seconds=0)
+    bucket.on_rate_limited()
+    bucket.on_rate_limited()
+    bucket.on_rate_limited()
+    assert bucket.rate == 1
+    bucket.on_success()
+    assert bucket.rate == 1.5
+
+
+def _run(handler: object, max_attempts: int = 3) -> tuple[dict, list, list, list]:
+    saved: list[list[dict]] = []
+    queued: list[tuple] = []
+    removed: list[list[str]] = []
+
+    def save(batch: list[dict]) -> dict:
+        saved.append(batch)
+        return {"inserted": len(batch), "updated": 0, "unchanged": 0, "errors": []}
+
+    async def run() -> dict:
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        bucket = AdaptiveTokenBucket(rate=1000, burst=100, cooldown_seconds=0.01)
+        return await tiktok_batch_extractor.extract_urls(URLS, concurrency=3, max_attempts=max_attempts, save_batch_size=4, bucket=bucket, client=client)
+
+    with (
+        patch("tools.tiktok_analizer.tiktok_batch_extractor.tiktok_ingest_repository.ingest_awemes", side_effect=save),
+        patch("tools.tiktok_analizer.tiktok_batch_extractor.tiktok_retry_repository.get_due", return_value=[{"_id": "7", "url": None}]),
+        patch("tools.tiktok_analizer.tiktok_batch_extractor.tiktok_retry_repository.enqueue", side_effect=lambda *args: queued.append(args)),
+        patch("tools.tiktok_analizer.tiktok_batch_extractor.tiktok_retry_repository.remove", side_effect=removed.append),
+    ):
+        summary = asyncio.run(run())
+    return summary, saved, queued, removed
+
+
+def test_extracts_saves_in_batches_and_retries_rate_limits() -> None:
+    calls: dict[str, int] = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        aweme_id = request.url.params["aweme_id"]
+        calls[aweme_id] = calls.get(aweme_id, 0) + 1
+        if aweme_id == URLS[0][-19:] and calls[aweme_id] == 1:
+            return httpx.Response(200, text="ratelimit triggered")
+        return httpx.Response(200, text=json.dumps({"aweme_list": [{"aweme_id": aweme_id}]}))
+
+    summary, saved, queued, removed = _run(handler)
+
+    assert summary["total"] == 7 and summary["done"] == 7 and summary["saved"] == 7
+    assert summary["rate_limited"] == 1 and summary["queued_for_retry"] == 0
+    assert sorted(len(batch) for batch in saved) == [3, 4]
+    assert queued == [] and "7" in removed[0]
+
+
+def test_videos_that_keep_failing_go_to_the_retry_queue() -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.params["aweme_id"] == "7":
+            return httpx.Response(429, text="ratelimit triggered")
+        return httpx.Response(200, text='{"aweme_list": []}')
+
+    summary, saved, queued, removed = _run(handler, max_attempts=2)
+
+    assert summary["not_found"] == 6 and summary["queued_for_retry"] == 1
+    assert saved == []
+    assert queued == [("7", None, tiktok_api.RATE_LIMITED, None, 2)]
+    assert "7" not in removed[0]
+
+
+def test_unexpected_errors_count_as_done_and_go_to_the_retry_queue() -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.params["aweme_id"] == "7":
+            raise RuntimeError("unexpected")
+        return httpx.Response(200, text=json.dumps({"aweme_list": [{"aweme_id": request.url.params["aweme_id"]}]}))
+
+    summary, saved, queued, removed = _run(handler)
+
+    assert summary["done"] == 7 and summary["saved"] == 6
+    assert queued == [("7", None, "error", None, 0)]
+    assert "7" not in removed[0]
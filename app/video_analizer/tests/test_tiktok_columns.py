@@ -0,0 +1,42 @@
+from unittest.mock import Mock, patch
+
+import bson
+import numpy as np
+
+from app.video_analizer.services import tiktok_columns, tiktok_service
+
+DOCUMENTS = [
+    {"aweme_id": str(index), "create_time": 1709476200 + index * 3600, "statistics": {"play_count": index * 10, "digg_count": index, "comment_count": 1}}
+    for index in range(7)
+]
+
+
+def raw_batches(size: int) -> list[bytes]:
+    return [b"".join(bson.encode(document) for document in DOCUMENTS[start : start + size]) for start in range(0, len(DOCUMENTS), size)]
+
+
+def test_raw_batches_to_columns() -> None:
+    collection = Mock()
+    collection.find_raw_batches.return_value = raw_batches(3)
+
+    columns = tiktok_columns.find_columns(collection, {"author.unique_id": "x"})
+
+    assert collection.find_raw_batches.call_args.kwargs["projection"] == tiktok_columns.PROJECTION
+    assert list(columns["aweme_id"]) == [str(index) for index in range(7)]
+    assert columns["statistics_play_count"].tolist() == [index * 10 for index in range(7)]
+    assert columns["statistics_repost_count"].tolist() == [0] * 7
+    np.testing.assert_allclose(tiktok_columns.engagement(columns), [0] + [(index + 1) / (index * 10) for index in range(1, 7)])
+
+
+def test_get_data_from_tiktoks() -> None:
+    collection = Mock()
+    collection.find_raw_batches.return_value = raw_batches(4)
+
+    with patch("app.video_analizer.services.tiktok_service.get_collection", return_value=collection):
+        rows = tiktok_service.get_data_from_tiktoks("x")
+
+    assert len(rows) == 7
+    # 2024-03-03 14:30 UTC is 08:30 in Mexico City
+    assert rows[0]["cat_hour"] == 8
+    assert rows[0]["cat_day_of_week"] == "Sunday"
+    assert rows[0]["statistics_engagement"] == 0
@@ -0,0 +1,74 @@
+from datetime import UTC, datetime
+from unittest.mock import MagicMock, Mock, patch
+
+from pymongo import UpdateOne
+from pymongo.results import BulkWriteResult
+
+from app.video_analizer.repositories import tiktok_ingest_repository
+from app.video_analizer.services import tiktok_metrics
+
+CAPTURED = datetime(2024, 3, 3, tzinfo=UTC)
+AWEME = {
+    "aweme_id": "1",
+    "create_time": 1709476200,
+    "author": {"unique_id": "polilan_app"},
+    "statistics": {"play_count": 100, "digg_count": 7},
+    "video": {"play_addr": {"url_list": ["https://cdn/signed?expire=1"]}},
+}
+
+
+def test_hash_ignores_key_order_and_signed_urls() -> None:
+    resigned = {"statistics": {"digg_count": 7, "play_count": 100}, **{k: v for k, v in AWEME.items() if k != "statistics"}}
+    resigned["video"] = {"play_addr": {"url_list": ["https://cdn/signed?expire=2"]}}
+    more_plays = AWEME | {"statistics": {"play_count": 150, "digg_count": 7}}
+
+    assert tiktok_ingest_repository.payload_hash(resigned) == tiktok_ingest_repository.payload_hash(AWEME)
+    assert tiktok_ingest_repository.payload_hash(more_plays) != tiktok_ingest_repository.payload_hash(AWEME)
+
+
+def _ingest(existing: list[dict], upserted: dict, awemes: list[dict]) -> tuple[dict, MagicMock, Mock, Mock]:
+    awemes_collection = MagicMock()
+    awemes_collection.find.return_value = existing
+    awemes_collection.bulk_write.return_value = BulkWriteResult({"upserted": [{"index": i, "_id": _id} for i, _id in upserted.items()]}, True)
+    with (
+        patch("app.video_analizer.repositories.tiktok_ingest_repository.get_collection", return_value=awemes_collection),
+        patch("app.video_analizer.repositories.tiktok_ingest_repository.tiktok_statistics_repository.add_snapshots") as history,
+        patch("app.video_analizer.repositories.tiktok_ingest_repository.tiktok_rollup_repository.apply_awemes") as apply_awemes,
+        patch("app.video_analizer.repositories.tiktok_ingest_repository.tiktok_time_repository.invalidate"),
+    ):
+        summary = tiktok_ingest_repository.ingest_awemes(awemes, CAPTURED)
+    return summary, awemes_collection, history, apply_awemes
+
+
+def test_new_aweme_is_upserted_with_history_and_rollups() -> None:
+    summary, awemes, history, apply_awemes = _ingest([], {0: "oid"}, [AWEME, None, AWEME])
+
+    assert summary == {"inserted": 1, "updated": 0, "unchanged": 0, "errors": []}
+    (request,) = awemes.bulk_write.call_args.args[0]
+    stored = tiktok_metrics.add_metrics(dict(AWEME))
+    stored["payloadHash"] = tiktok_ingest_repository.payload_hash(stored)
+    assert stored["metrics"]["like_rate"] == 0.07
+    assert request == UpdateOne({"aweme_id": "1"}, {"$set": stored | {"updatedAt": CAPTURED}, "$setOnInsert": {"firstSeenAt": CAPTURED}}, upsert=True)
+    assert [aweme["aweme_id"] for aweme in history.call_args.args[0]] == ["1"] and history.call_args.args[1] == CAPTURED
+    assert [aweme["aweme_id"] for aweme in apply_awemes.call_args.args[0]] == ["1"]
+
+
+def test_unchanged_payload_is_not_written() -> None:
+    existing = [{"aweme_id": "1", "payloadHash": tiktok_ingest_repository.payload_hash(AWEME), "statistics": AWEME["statistics"]}]
+    summary, awemes, history, apply_awemes = _ingest(existing, {}, [AWEME])
+
+    assert summary["unchanged"] == 1
+    awemes.bulk_write.assert_not_called()
+    history.assert_not_called()
+    apply_awemes.assert_not_called()
+
+
+def test_rescrape_applies_only_the_statistics_delta() -> None:
+    existing = [{"aweme_id": "1", "payloadHash": "old", "statistics": AWEME["statistics"]}]
+    rescraped = AWEME | {"statistics": {"play_count": 150, "digg_count": 7}}
+    summary, _, history, apply_awemes = _ingest(existing, {}, [rescraped])
+
+    assert summary["updated"] == 1
+    assert [aweme["statistics"]["play_count"] for aweme in history.call_args.args[0]] == [150]
+    inserted, updated = apply_awemes.call_args.args
+    assert inserted == [] and updated[0][1] == AWEME["statistics"]
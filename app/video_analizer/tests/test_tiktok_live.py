@@ -0,0 +1,39 @@
+from bson import ObjectId
+
+from app.video_analizer.services import live_feed_service
+
+
+def _aweme_change(operation: str, updated: dict | None = None) -> dict:
+    document = {"aweme_id": "7", "desc": "hola", "create_time": 1, "author": {"unique_id": "polilan_app"}, "statistics": {"play_count": 10}, "metrics": {"engagement": 0.1}}
+    change = {"operationType": operation, "ns": {"coll": "tiktoks_aweme"}, "documentKey": {"_id": ObjectId()}, "fullDocument": document}
+    if updated is not None:
+        change["updateDescription"] = {"updatedFields": updated}
+    return change
+
+
+def test_tiktok_deltas() -> None:
+    new = live_feed_service.tiktok_delta(_aweme_change("insert"))
+    stats = live_feed_service.tiktok_delta(_aweme_change("update", {"statistics.play_count": 10}))
+
+    assert new["type"] == "tiktok.new" and new["key"] == "7" and new["data"]["author"] == "polilan_app"
+    assert stats == {"type": "tiktok.stats", "key": "7", "data": {"author": "polilan_app", "statistics": {"play_count": 10}, "metrics": {"engagement": 0.1}}}
+    assert live_feed_service.tiktok_delta(_aweme_change("update", {"desc": "otro"})) is None
+
+
+def test_source_status_delta_and_match() -> None:
+    change = {
+        "operationType": "replace",
+        "ns": {"coll": "agent_sources"},
+        "documentKey": {"_id": ObjectId()},
+        "fullDocument": {"id": "s1", "status": "processing", "statusDescription": "Extracting audio..."},
+    }
+    delta = live_feed_service.source_delta(change)
+    match = live_feed_service.build_match(source_ids=["s1"])
+
+    assert delta == {"type": "source.status", "key": "s1", "data": {"status": "processing", "statusDescription": "Extracting audio..."}}
+    assert match(delta)
+    assert not match({"type": "source.status", "key": "s2", "data": {}})
+    assert not match({"type": "tiktok.stats", "key": "7", "data": {"author": "polilan_app"}})
+    author_match = live_feed_service.build_match(user_id="polilan_app")
+    assert author_match({"type": "tiktok.new", "key": "7", "data": {"author": "polilan_app"}}) and not author_match(delta)
+    assert live_feed_service.build_match() is None
@@ -0,0 +1,57 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.video_analizer.repositories import tiktok_ranking_repository
+from app.video_analizer.services import tiktok_metrics
+
+
+def test_compute_metrics() -> None:
+    metrics = tiktok_metrics.compute_metrics({"play_count": 200, "digg_count": 20, "comment_count": 4, "share_count": 1, "collect_count": 5})
+
+    assert metrics["engagement"] == pytest.approx(30 / 200)
+    assert metrics["like_rate"] == pytest.approx(0.1)
+    assert metrics["save_rate"] == pytest.approx(0.025)
+    assert tiktok_metrics.compute_metrics({"play_count": 0, "digg_count": 3}) == {name: 0.0 for name in tiktok_metrics.METRICS}
+
+
+def test_top_k_uses_the_metric_index_order() -> None:
+    collection = MagicMock()
+    collection.find.return_value.sort.return_value.limit.return_value = [{"aweme_id": "1"}]
+
+    with patch("app.video_analizer.repositories.tiktok_ranking_repository.get_collection", return_value=collection):
+        rows = tiktok_ranking_repository.get_top_tiktoks("like_rate", "polilan_app", k=500)
+
+    assert rows == [{"aweme_id": "1"}]
+    assert collection.find.call_args.args[0] == {"metrics.like_rate": {"$exists": True}, "author.unique_id": "polilan_app"}
+    collection.find.return_value.sort.assert_called_once_with("metrics.like_rate", -1)
+    collection.find.return_value.sort.return_value.limit.assert_called_once_with(tiktok_ranking_repository.MAX_K)
+
+
+def test_top_k_never_asks_for_an_unlimited_cursor() -> None:
+    collection = MagicMock()
+    with patch("app.video_analizer.repositories.tiktok_ranking_repository.get_collection", return_value=collection):
+        tiktok_ranking_repository.get_top_tiktoks(k=0)
+        tiktok_ranking_repository.get_top_tiktoks(k=-5)
+
+    assert [call.args for call in collection.find.return_value.sort.return_value.limit.call_args_list] == [(1,), (1,)]
+
+
+def test_unknown_metric() -> None:
+    with pytest.raises(ValueError):
+        tiktok_ranking_repository.get_top_tiktoks("views")
+
+
+def test_percentiles_and_backfill_pipeline() -> None:
+    collection = MagicMock()
+    collection.aggregate.return_value = iter([{"_id": None, "count": 10, "values": [0.1, 0.3, 0.5]}])
+    collection.update_many.return_value.modified_count = 4
+
+    with patch("app.video_analizer.repositories.tiktok_ranking_repository.get_collection", return_value=collection):
+        result = tiktok_ranking_repository.get_metric_percentiles()
+        assert tiktok_ranking_repository.backfill_metrics() == 4
+
+    assert result["percentiles"] == {"0.5": 0.1, "0.9": 0.3, "0.99": 0.5}
+    query, update = collection.update_many.call_args.args
+    assert query == {"metrics": {"$exists": False}}
+    assert set(update[0]["$set"]["metrics"]) == set(tiktok_metrics.METRICS)
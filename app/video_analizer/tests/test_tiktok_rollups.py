@@ -0,0 +1,61 @@
+from unittest.mock import Mock, patch
+
+from pymongo import UpdateOne
+
+from app.video_analizer.repositories import tiktok_rollup_repository
+
+# 2024-03-03 14:30 UTC, a Sunday
+AWEME = {"aweme_id": "1", "create_time": 1709476200, "author": {"unique_id": "polilan_app"}, "statistics": {"play_count": 100, "digg_count": 7}}
+
+
+def test_updates_for_a_new_aweme() -> None:
+    author, day = tiktok_rollup_repository.build_rollup_updates(AWEME)
+
+    assert author[0] == {"_id": "author:polilan_app"}
+    statistics = {"statistics.play_count": 100, "statistics.digg_count": 7, "statistics.comment_count": 0, "statistics.share_count": 0, "statistics.collect_count": 0}
+    assert author[1]["$inc"] == {"posts": 1, **statistics}
+    assert day[0] == {"_id": "day:polilan_app:2024-03-03"}
+    assert day[1]["$setOnInsert"]["dayOfWeek"] == 1
+    assert day[1]["$inc"]["hours.14"] == 1
+
+
+def test_awemes_without_author_or_date_are_skipped() -> None:
+    assert tiktok_rollup_repository.build_rollup_updates({"create_time": 1709476200}) == []
+    assert tiktok_rollup_repository.build_rollup_updates({"author": {"unique_id": "x"}}) == []
+
+
+def test_apply_and_read_post_counts() -> None:
+    collection = Mock()
+    collection.find.return_value = [{"_id": "author:polilan_app", "author": "polilan_app", "posts": 3}]
+
+    with patch("app.video_analizer.repositories.tiktok_rollup_repository.get_collection", return_value=collection):
+        assert tiktok_rollup_repository.apply_awemes([AWEME, {}]) == 2
+        assert tiktok_rollup_repository.get_author_post_counts() == [{"_id": "polilan_app", "count": 3}]
+
+    author, day = tiktok_rollup_repository.build_rollup_updates(AWEME)
+    assert collection.bulk_write.call_args.args[0] == [UpdateOne(*author, upsert=True), UpdateOne(*day, upsert=True)]
+
+
+def test_updates_for_a_rescraped_aweme_only_add_the_difference() -> None:
+    author, day = tiktok_rollup_repository.build_rollup_updates(AWEME, previous_statistics={"play_count": 60, "digg_count": 7})
+
+    assert author[1]["$inc"] == {"posts": 0, "statistics.play_count": 40}
+    assert day[1]["$inc"] == {"posts": 0, "hours.14": 0, "statistics.play_count": 40}
+    assert tiktok_rollup_repository.build_rollup_updates(AWEME, previous_statistics=AWEME["statistics"]) == []
+
+
+def test_rebuild_replaces_in_place_and_deletes_the_orphans() -> None:
+    rollups, awemes = Mock(), Mock()
+    rollups.count_documents.return_value = 4
+    awemes.aggregate.return_value = []
+
+    with patch("app.video_analizer.repositories.tiktok_rollup_repository.get_collection", side_effect=lambda name: awemes if name == "tiktoks_aweme" else rollups):
+        assert tiktok_rollup_repository.rebuild() == 4
+
+    rollups.delete_many.assert_called_once()
+    rebuilt_at = rollups.delete_many.call_args.args[0]["rebuiltAt"]["$ne"]
+    for call in awemes.aggregate.call_args_list:
+        pipeline = call.args[0]
+        assert pipeline[-1]["$merge"]["whenMatched"] == "replace"
+        assert pipeline[-2]["$project"]["rebuiltAt"] == {"$literal": rebuilt_at}
+    assert awemes.aggregate.call_count == 2
@@ -0,0 +1,109 @@
+from datetime import UTC, datetime
+from unittest.mock import MagicMock, Mock, patch
+
+import pytest
+from pymongo import InsertOne
+
+from app.video_analizer.repositories import tiktok_statistics_repository
+
+CAPTURED = datetime(2024, 3, 3, tzinfo=UTC)
+
+
+def test_snapshot_shape() -> None:
+    aweme = {"aweme_id": "1", "author": {"unique_id": "polilan_app"}, "statistics": {"play_count": 100, "digg_count": None, "download_count": 3}}
+    snapshot = tiktok_statistics_repository.build_snapshot(aweme, CAPTURED)
+
+    assert snapshot["meta"] == {"aweme_id": "1", "author": "polilan_app"}
+    assert snapshot["statistics"] == {"play_count": 100, "digg_count": 0, "comment_count": 0, "share_count": 0, "collect_count": 0}
+
+
+def test_growth_takes_the_last_value_per_aweme_and_period() -> None:
+    pipeline = tiktok_statistics_repository.get_growth_pipeline({"meta.author": "polilan_app"}, "week")
+
+    per_aweme, per_period = pipeline[2]["$group"], pipeline[3]["$group"]
+    assert per_aweme["_id"]["period"] == {"$dateTrunc": {"date": "$capturedAt", "unit": "week"}}
+    assert per_aweme["play_count"] == {"$last": "$statistics.play_count"}
+    assert per_period["play_count"] == {"$sum": "$play_count"}
+
+
+def test_growth_curve_for_chartjs() -> None:
+    collection = Mock()
+    collection.aggregate.return_value = iter([{"_id": CAPTURED, "awemes": 1, "play_count": 10, "digg_count": 1, "comment_count": 0, "share_count": 0, "collect_count": 0}])
+
+    with patch("app.video_analizer.repositories.tiktok_statistics_repository.get_collection", return_value=collection):
+        curve = tiktok_statistics_repository.get_growth_curve(aweme_id="1", start=CAPTURED)
+
+    assert collection.aggregate.call_args.args[0][0]["$match"] == {"meta.aweme_id": "1", "capturedAt": {"$gte": CAPTURED}}
+    assert curve["labels"] == [CAPTURED.isoformat()]
+    assert curve["datasets"][0] == {"label": "play_count", "data": [10]}
+
+
+def test_deltas_sort_and_validation() -> None:
+    pipeline = tiktok_statistics_repository.get_deltas_pipeline({"meta.author": "polilan_app"}, "digg_count", 5)
+
+    assert pipeline[-2:] == [{"$sort": {"deltas.digg_count": -1}}, {"$limit": 5}]
+    with pytest.raises(ValueError):
+        tiktok_statistics_repository.get_deltas(author="polilan_app", sort_by="views")
+    with pytest.raises(ValueError):
+        tiktok_statistics_repository.get_growth_curve(aweme_id="1", unit="year")
+    with pytest.raises(ValueError):
+        tiktok_statistics_repository.get_growth_curve()
+
+
+def _database(collections: dict[str, dict]) -> MagicMock:
+    """collections: name -> list_collections info, handles per name"""
+    db = MagicMock()
+    db.list_collections.side_effect = lambda filter: iter([collections[filter["name"]]] if filter["name"] in collections else [])
+    db.list_collection_names.side_effect = lambda: list(collections)
+    handles: dict[str, MagicMock] = {}
+    db.__getitem__.side_effect = lambda name: handles.setdefault(name, MagicMock(name=name))
+    return db
+
+
+@pytest.fixture
+def statistics_db():  # noqa: ANN201
+    tiktok_statistics_repository._collection_ready = False
+    yield
+    tiktok_statistics_repository._collection_ready = False
+
+
+def test_first_write_creates_the_time_series_collection(statistics_db: None) -> None:
+    db = _database({})
+    collection = Mock(database=db)
+    with patch("app.video_analizer.repositories.tiktok_statistics_repository.get_collection", return_value=collection):
+        tiktok_statistics_repository.add_snapshots([{"aweme_id": "1"}], CAPTURED)
+        tiktok_statistics_repository.add_snapshots([{"aweme_id": "2"}], CAPTURED)
+
+    db.create_collection.assert_called_once()
+    assert db.create_collection.call_args.kwargs["timeseries"]["metaField"] == "meta"
+    assert collection.insert_many.call_count == 2
+
+
+def test_no_write_into_a_regular_collection(statistics_db: None) -> None:
+    collection = Mock(database=_database({"tiktoks_aweme_statistics": {"type": "collection"}}))
+    with (
+        patch("app.video_analizer.repositories.tiktok_statistics_repository.get_collection", return_value=collection),
+        pytest.raises(tiktok_statistics_repository.NotTimeSeriesError),
+    ):
+        tiktok_statistics_repository.add_snapshots([{"aweme_id": "1"}], CAPTURED)
+    collection.insert_many.assert_not_called()
+
+
+def test_migrate_resumes_from_legacy_and_reads_both_shapes(statistics_db: None) -> None:
+    flat = {"_id": 1, "capturedAt": CAPTURED, "aweme_id": "1", "author": "a", "statistics": {"play_count": 1}}
+    nested = {"_id": 2, "capturedAt": CAPTURED, "meta": {"aweme_id": "2", "author": "b"}, "statistics": {"play_count": 2}}
+    db = _database({"tiktoks_aweme_statistics": {"type": "timeseries"}, "tiktoks_aweme_statistics_legacy": {"type": "collection"}})
+    db["tiktoks_aweme_statistics_legacy"].find.return_value.limit.side_effect = [[flat, nested], []]
+    target = Mock(database=db)
+    target.bulk_write.return_value.inserted_count = 2
+
+    with patch("app.video_analizer.repositories.tiktok_statistics_repository.get_collection", return_value=target):
+        assert tiktok_statistics_repository.migrate() == 2
+
+    snapshots = [tiktok_statistics_repository.to_snapshot(flat), tiktok_statistics_repository.to_snapshot(nested)]
+    assert [snapshot["meta"] for snapshot in snapshots] == [{"aweme_id": "1", "author": "a"}, {"aweme_id": "2", "author": "b"}]
+    assert target.bulk_write.call_args.args[0] == [InsertOne(snapshot) for snapshot in snapshots]
+    db["tiktoks_aweme_statistics_legacy"].delete_many.assert_called_once_with({"_id": {"$in": [1, 2]}})
+    db.drop_collection.assert_called_once_with("tiktoks_aweme_statistics_legacy")
+    db.create_collection.assert_not_called()
+
@@ -0,0 +1,49 @@
+from datetime import datetime
+from unittest.mock import Mock, patch
+
+import pytest
+
+from app.video_analizer.repositories import tiktok_time_repository
+
+
+def test_pipeline_buckets_in_the_timezone() -> None:
+    pipeline = tiktok_time_repository.get_posting_times_pipeline("polilan_app", "Europe/Madrid", 4, now=1_000_000_000)
+
+    assert pipeline[0]["$match"] == {"create_time": {"$gte": 1_000_000_000 - 4 * 7 * 86400}, "author.unique_id": "polilan_app"}
+    heatmap_group = pipeline[-1]["$facet"]["heatmap"][0]["$group"]
+    assert heatmap_group["_id"]["hour"] == {"$hour": {"date": "$date", "timezone": "Europe/Madrid"}}
+    assert pipeline[-1]["$facet"]["weekly"][0]["$group"]["_id"]["$dateTrunc"]["timezone"] == "Europe/Madrid"
+
+
+def test_results_are_cached_per_author_timezone_and_window() -> None:
+    tiktok_time_repository.invalidate()
+    collection = Mock()
+    collection.aggregate.side_effect = lambda pipeline: iter(
+        [{"heatmap": [{"_id": {"day": 1, "hour": 20}, "posts": 3, "plays": 90}], "weekly": [{"_id": datetime(2024, 3, 4), "posts": 3, "plays": 90}]}]
+    )
+
+    with patch("app.video_analizer.repositories.tiktok_time_repository.get_collection", return_value=collection):
+        first = tiktok_time_repository.get_posting_times("polilan_app")
+        second = tiktok_time_repository.get_posting_times("polilan_app")
+        tiktok_time_repository.get_posting_times("polilan_app", "UTC")
+
+    assert first == second
+    assert collection.aggregate.call_count == 2
+    assert first["heatmap"]["posts"][0][20] == 3
+    assert first["weekly"]["labels"] == ["2024-03-04"]
+
+
+def test_unknown_timezone() -> None:
+    with pytest.raises(ValueError):
+        tiktok_time_repository.get_posting_times("polilan_app", "Mars/Olympus")
+
+
+def test_shared_backend_when_redis_is_configured(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("MONGO_CACHE_REDIS_URL", "redis://cache:6379/0")
+    monkeypatch.setattr(tiktok_time_repository, "_cache", None)
+
+    with patch("app.video_analizer.repositories.tiktok_time_repository.RedisCache") as redis_cache:
+        cache = tiktok_time_repository.get_cache()
+
+    redis_cache.assert_called_once_with("redis://cache:6379/0", tiktok_time_repository.CACHE_TTL_SECONDS)
+    assert cache is redis_cache.return_value
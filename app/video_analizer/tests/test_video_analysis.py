@@ -1,8 +1,12 @@
 import asyncio
 import os
 import sys
+from unittest.mock import patch
+
+import pytest
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../")))
+from app.video_analizer.models.model import VideoAnalysisModel
 from app.video_analizer.services import video_analizer_service
 
 
@@ -17,6 +21,15 @@ async def test_video_analysis() -> None:
     await video_analizer_service.download_tiktok_upload_files_and_update_db(tiktok_url)
 
 
+def test_invalid_url_raises_before_saving_the_source() -> None:
+    video = VideoAnalysisModel(url="https://www.tiktok.com/@polilan_app", website="tiktok")
+
+    with patch.object(video_analizer_service, "save_agent_source") as save_agent_source, pytest.raises(ValueError):
+        asyncio.run(video_analizer_service.analize_video(video))
+
+    save_agent_source.assert_not_called()
+
+
 if __name__ == "__main__":
     # The only way to run and test async functions.
     print("Running simple file")
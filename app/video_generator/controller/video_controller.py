@@ -1,7 +1,8 @@
 from dataclouder_core.exception import handler_exception
-from dataclouder_core.models.models import FiltersConfig
 from fastapi import APIRouter
 
+from app.modules.mongo.mongo_json import MongoJSONResponse
+from app.modules.mongo.pagination import PageFiltersConfig
 from app.video_generator.models.video_model import VideoModel
 from app.video_generator.services import video_service
 
@@ -20,16 +21,15 @@ async def get_video_by_id(id: str) -> dict:
     return {"id": id}
 
 
-@router.post("/")
+@router.post("/", response_class=MongoJSONResponse)
 @handler_exception
-async def save_video(video: VideoModel) -> VideoModel:
+async def save_video(video: VideoModel) -> MongoJSONResponse:
     video = video_service.save_video(video)
-    return video
+    return MongoJSONResponse(video)
 
 
-@router.post("/query")
+@router.post("/query", response_class=MongoJSONResponse)
 @handler_exception
-async def find_filtered_videos(filters: FiltersConfig) -> list:
-    print(filters)
+async def find_filtered_videos(filters: PageFiltersConfig) -> MongoJSONResponse:
     video = video_service.find_filtered_videos(filters)
-    return video
+    return MongoJSONResponse(video)
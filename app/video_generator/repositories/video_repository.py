@@ -1,31 +1,31 @@
 from bson import ObjectId
 from dataclouder_core.models.models import FiltersConfig
 
-from app.modules.mongo.mongo import db
+from app.modules.mongo import pagination
+from app.modules.mongo.collection_registry import CollectionName
+from app.modules.mongo.mongo import get_collection
+from app.modules.mongo.pagination import PageResult
 from app.video_generator.models.video_model import VideoModel
 
-col_name = "videos"
+col_name = CollectionName.VIDEOS
 
 
 def find_videos(id: str) -> dict:
     """Get words"""
-    collection = db[col_name]
+    collection = get_collection(col_name)
     result = collection.find_one({"_id": ObjectId(id)})
 
     return result
 
 
-def find_filtered_videos(filters: FiltersConfig) -> list:
-    """Get words"""
-    print(filters)
-    collection = db[col_name]
-    result = collection.find(filters.model_dump())
-    return result
+def find_filtered_videos(filters: FiltersConfig) -> PageResult:
+    """Get a page of videos, send nextCursor back in filters.cursor to get the next one"""
+    return pagination.paginate(col_name, filters)
 
 
 def save_video(video: VideoModel) -> VideoModel:
     """Save video insert if not exists, or update if exists"""
-    collection = db[col_name]
+    collection = get_collection(col_name)
 
     # Convert the model to dict for manipulation
     video_dict = video.model_dump()
@@ -40,12 +40,11 @@ def save_video(video: VideoModel) -> VideoModel:
         query = {"_id": ObjectId()}
 
     result = collection.find_one_and_replace(query, video_dict, upsert=True, return_document=True)
-    result["_id"] = str(result["_id"])
     return result
 
 
 def delete_video(id: str) -> VideoModel:
     """Delete video"""
-    collection = db[col_name]
+    collection = get_collection(col_name)
     collection.delete_one({"_id": ObjectId(id)})
     return {"message": "Video deleted"}
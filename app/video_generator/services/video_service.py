@@ -1,5 +1,6 @@
 from dataclouder_core.models.models import FiltersConfig
 
+from app.modules.mongo.pagination import PageResult
 from app.video_generator.models.video_model import VideoModel
 from app.video_generator.repositories import video_repository
 
@@ -8,7 +9,7 @@ def save_video(video: VideoModel) -> VideoModel:
     return video_repository.save_video(video)
 
 
-def find_filtered_videos(filters: FiltersConfig) -> VideoModel:
+def find_filtered_videos(filters: FiltersConfig) -> PageResult:
     return video_repository.find_filtered_videos(filters)
 
 
@@ -0,0 +1,23 @@
+"""Database guard of the benchmarks, they drop and seed collections so they only run against a bench database
+
+    from benchmarks import bench_db
+
+    bench_db.require_bench_db()  # before importing app modules
+
+MONGO_URI defaults to a local mongod and MONGO_DB to "bench", a MONGO_DB that doesn't start with "bench" (the app
+database of an .env or a shell with production settings) stops the script before anything is dropped.
+"""
+
+import os
+import sys
+
+PREFIX = "bench"
+
+
+def require_bench_db() -> str:
+    os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+    os.environ.setdefault("MONGO_DB", PREFIX)
+    name = os.environ["MONGO_DB"]
+    if not name.startswith(PREFIX):
+        sys.exit(f"refusing to run against MONGO_DB={name}: benchmarks drop collections, use a database named {PREFIX}*")
+    return name
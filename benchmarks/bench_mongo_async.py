@@ -0,0 +1,85 @@
+"""Sync mongo.py vs async mongo_async.py under concurrent requests
+
+Simulates N concurrent FastAPI handlers on a single event loop, each doing a lookup by id and a small list query.
+The sync path calls the blocking helpers straight from the coroutine (what the controllers did), the async path awaits mongo_async.
+
+    MONGO_URI=mongodb://localhost:27017 MONGO_DB=bench python -m benchmarks.bench_mongo_async --concurrency 100
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from benchmarks import bench_db
+
+bench_db.require_bench_db()
+
+from app.modules.mongo import mongo, mongo_async
+from app.modules.mongo.collection_registry import CollectionName
+
+# a collection of its own, dropped and seeded on every run
+COLLECTION = CollectionName.BENCH_DOCUMENTS
+
+
+def seed(total: int) -> None:
+    col = mongo.get_collection(COLLECTION)
+    col.drop()
+    docs = [{"id": f"doc-{i}", "group": i % 50, "name": f"name {i}", "payload": "x" * 512} for i in range(total)]
+    col.insert_many(docs)
+    col.create_index("id")
+    col.create_index("group")
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def sync_request(total: int) -> float:
+    mongo.get_document_by_id(COLLECTION, f"doc-{random.randrange(total)}")
+    mongo.get_documents_by_query_projection(COLLECTION, {"group": random.randrange(50)}, {"payload": 0}, limit=20)
+    return time.perf_counter()
+
+
+async def async_request(total: int) -> float:
+    await mongo_async.get_document_by_id(COLLECTION, f"doc-{random.randrange(total)}")
+    await mongo_async.get_documents_by_query_projection(COLLECTION, {"group": random.randrange(50)}, {"payload": 0}, limit=20)
+    return time.perf_counter()
+
+
+async def run(label: str, request: callable, concurrency: int, rounds: int, total: int) -> None:
+    latencies: list[float] = []
+    wall_start = time.perf_counter()
+    for _ in range(rounds):
+        # all requests arrive at once, latency is what a client sees: arrival -> response
+        submitted = time.perf_counter()
+        finished = await asyncio.gather(*[request(total) for _ in range(concurrency)])
+        latencies.extend((end - submitted) * 1000 for end in finished)
+    wall = time.perf_counter() - wall_start
+    print(
+        f"{label:>6} | requests {len(latencies):>5} | p50 {percentile(latencies, 50):8.2f} ms | p99 {percentile(latencies, 99):8.2f} ms "
+        f"| mean {statistics.mean(latencies):8.2f} ms | wall {wall:6.2f} s | {len(latencies) / wall:8.1f} req/s"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--docs", type=int, default=10_000)
+    args = parser.parse_args()
+
+    seed(args.docs)
+    # warm up both pools so connection setup is not measured
+    await async_request(args.docs)
+    await sync_request(args.docs)
+
+    await run("sync", sync_request, args.concurrency, args.rounds, args.docs)
+    await run("async", async_request, args.concurrency, args.rounds, args.docs)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
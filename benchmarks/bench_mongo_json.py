@@ -0,0 +1,113 @@
+"""Response serialization: current path vs MongoJSONResponse
+
+No database needed, documents are synthetic tiktok-like rows with ObjectId, datetime, Decimal128 and nested stats.
+    current: _id to str in place, Pydantic validation of the dict result, jsonable_encoder and json.dumps (FastAPI's path)
+    model:   current path plus one Pydantic model per document (like AgentSource(**document))
+    orjson:  MongoJSONResponse rendering the raw documents
+
+    python -m benchmarks.bench_mongo_json --docs 1000 --rounds 50
+"""
+
+import argparse
+import copy
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from bson import Decimal128, ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, TypeAdapter
+
+from app.modules.mongo.mongo_json import MongoJSONResponse
+
+
+class Statistics(BaseModel):
+    play_count: int
+    digg_count: int
+    comment_count: int
+    share_count: int
+
+
+class Author(BaseModel):
+    unique_id: str
+    nickname: str
+
+
+class TiktokDocument(BaseModel):
+    id: str
+    aweme_id: str
+    desc: str
+    create_time: datetime
+    score: str
+    author: Author
+    statistics: Statistics
+    tags: list[str]
+
+
+def make_documents(total: int) -> list[dict]:
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            "_id": ObjectId(),
+            "aweme_id": str(7_400_000_000_000_000_000 + index),
+            "desc": f"video number {index} #learning #english",
+            "create_time": start + timedelta(minutes=index),
+            "score": Decimal128(Decimal(index) / 7),
+            "author": {"unique_id": f"user_{index % 50}", "nickname": f"User {index % 50}"},
+            "statistics": {"play_count": index * 31, "digg_count": index * 7, "comment_count": index, "share_count": index // 3},
+            "tags": ["learning", "english", "shorts"],
+        }
+        for index in range(total)
+    ]
+
+
+page_adapter = TypeAdapter(dict)
+
+
+def current_path(documents: list[dict], with_models: bool) -> bytes:
+    for document in documents:
+        document["_id"] = str(document["_id"])
+        document["score"] = str(document["score"])
+    rows = documents
+    if with_models:
+        rows = [TiktokDocument(id=document["_id"], **document).model_dump() for document in documents]
+    content = page_adapter.validate_python({"rows": rows, "nextCursor": None, "count": None})
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def orjson_path(documents: list[dict]) -> bytes:
+    return MongoJSONResponse({"rows": documents, "nextCursor": None, "count": None}).body
+
+
+def measure(label: str, render: callable, documents: list[dict], rounds: int) -> float:
+    timings = []
+    size = 0
+    for _ in range(rounds):
+        # the current path mutates documents, every round gets fresh ones as if they came from the cursor
+        fresh = copy.deepcopy(documents)
+        start = time.perf_counter()
+        size = len(render(fresh))
+        timings.append((time.perf_counter() - start) * 1000)
+    median = statistics.median(timings)
+    print(f"{label:>8} | docs {len(documents):>6} | median {median:9.3f} ms | min {min(timings):9.3f} ms | {size / 1024:8.1f} KiB")
+    return median
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, nargs="+", default=[100, 1000, 10_000])
+    parser.add_argument("--rounds", type=int, default=30)
+    args = parser.parse_args()
+
+    for total in args.docs:
+        documents = make_documents(total)
+        current = measure("current", lambda docs: current_path(docs, with_models=False), documents, args.rounds)
+        model = measure("model", lambda docs: current_path(docs, with_models=True), documents, args.rounds)
+        fast = measure("orjson", orjson_path, documents, args.rounds)
+        print(f"{'':>8} | orjson is {current / fast:.1f}x faster than current, {model / fast:.1f}x than model\n")
+
+
+if __name__ == "__main__":
+    main()
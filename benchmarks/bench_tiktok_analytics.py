@@ -0,0 +1,95 @@
+"""tiktok_repository.get_comprehensive_analytics: legacy four round trips with $push vs the single $facet pipeline
+
+Seeds synthetic aweme documents (int create_time like the scraper stores) and times both versions at each size.
+The legacy version is copied here with the $toDate fix so it can run at all, at ~1M docs its $push arrays pass the
+16MB document limit and the aggregation fails.
+
+    MONGO_URI=mongodb://localhost:27017 MONGO_DB=bench python -m benchmarks.bench_tiktok_analytics --docs 10000 100000 1000000
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from benchmarks import bench_db
+
+bench_db.require_bench_db()
+
+from app.modules.mongo import mongo
+from app.modules.mongo.collection_registry import CollectionName
+from app.video_analizer.repositories import tiktok_repository
+
+SEED_BATCH = 10_000
+
+
+def make_document(index: int) -> dict:
+    return {
+        "aweme_id": str(7_000_000_000_000_000_000 + index),
+        "create_time": 1_600_000_000 + random.randrange(150_000_000),
+        "author": {"unique_id": f"user_{index % 200}"},
+        "statistics": {"play_count": random.randrange(1_000_000), "digg_count": random.randrange(50_000)},
+        "is_delete": random.random() < 0.01,
+        "allow_share": random.random() < 0.9,
+        "allow_comment": random.random() < 0.95,
+        "is_private": random.random() < 0.02,
+        "with_goods": random.random() < 0.05,
+        "in_reviewing": random.random() < 0.01,
+        "self_see": False,
+        "is_prohibited": False,
+        "private_status": 0,
+        "reviewed": random.choice([0, 1]),
+        "download_status": random.choice([0, 0, 0, 1]),
+        "desc": "x" * 200,
+    }
+
+
+def seed(total: int) -> None:
+    col = mongo.get_collection(CollectionName.TIKTOKS_AWEME)
+    col.drop()
+    for start in range(0, total, SEED_BATCH):
+        col.insert_many([make_document(index) for index in range(start, min(total, start + SEED_BATCH))], ordered=False)
+
+
+def legacy_analytics() -> dict:
+    col = mongo.get_collection(CollectionName.TIKTOKS_AWEME)
+    total = col.count_documents({})
+    boolean_sums = {name: {"$sum": {"$cond": [{"$eq": [f"${field}", value]}, 1, 0]}} for name, _, field, value in tiktok_repository.BOOLEAN_FIELDS}
+    booleans = list(col.aggregate([{"$group": {"_id": None, **boolean_sums}}]))[0]
+    pushes = {name: {"$push": f"${name}"} for name in ("private_status", "reviewed", "download_status")}
+    numeric = list(col.aggregate([{"$group": {"_id": None, **pushes}}]))[0]
+    counts = {
+        "private_status": numeric["private_status"].count(0),
+        "reviewed": [numeric["reviewed"].count(0), numeric["reviewed"].count(1)],
+        "download_status": numeric["download_status"].count(0),
+    }
+    return {"total": total, "booleans": booleans, "numeric": counts, "days": tiktok_repository.get_posts_by_day_of_week()}
+
+
+def measure(label: str, run: callable, total: int, rounds: int) -> None:
+    timings = []
+    try:
+        for _ in range(rounds):
+            start = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - start) * 1000)
+    except Exception as exc:
+        print(f"{label:>7} | docs {total:>8} | failed: {str(exc)[:120]}")
+        return
+    print(f"{label:>7} | docs {total:>8} | median {statistics.median(timings):10.1f} ms | min {min(timings):10.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    for total in args.docs:
+        seed(total)
+        measure("legacy", legacy_analytics, total, args.rounds)
+        measure("facet", tiktok_repository.get_comprehensive_analytics, total, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""tiktok_service.get_data_from_tiktoks: full documents + json_normalize vs projected columnar reads
+
+Seeds one author with N full-size aweme documents (author, music, video urls) and reports latency and peak Python
+memory of the legacy implementation and of the columnar one (pymongoarrow, raw BSON batches into Arrow). tracemalloc
+only sees Python objects, the Arrow buffers are reported apart as the peak of the Arrow memory pool.
+
+    MONGO_URI=mongodb://localhost:27017 MONGO_DB=bench python -m benchmarks.bench_tiktok_user_data --docs 10000
+"""
+
+import argparse
+import random
+import statistics
+import time
+import tracemalloc
+
+from benchmarks import bench_db
+
+bench_db.require_bench_db()
+
+import pandas as pd
+import pyarrow as pa
+
+from app.modules.mongo import mongo
+from app.modules.mongo.collection_registry import CollectionName
+from app.video_analizer.services import tiktok_columns, tiktok_service
+
+AUTHOR = "bench_author"
+
+
+def make_document(index: int) -> dict:
+    return {
+        "aweme_id": str(7_000_000_000_000_000_000 + index),
+        "desc": "video description #hashtag " * 8,
+        "create_time": 1_600_000_000 + random.randrange(150_000_000),
+        "author": {"unique_id": AUTHOR, "nickname": "Bench", "avatar_thumb": {"url_list": ["https://example.com/a.jpg"] * 3}, "signature": "x" * 200},
+        "music": {"id": index, "title": "original sound", "play_url": {"url_list": ["https://example.com/m.mp3"] * 3}},
+        "video": {"play_addr": {"url_list": ["https://example.com/v.mp4"] * 4}, "cover": {"url_list": ["https://example.com/c.jpg"] * 4}, "duration": 15000},
+        "statistics": {name: random.randrange(100_000) for name in tiktok_columns.STATISTICS},
+    }
+
+
+def seed(total: int) -> None:
+    col = mongo.get_collection(CollectionName.TIKTOKS_AWEME)
+    col.drop()
+    for start in range(0, total, 5000):
+        col.insert_many([make_document(index) for index in range(start, min(total, start + 5000))])
+    col.create_index("author.unique_id")
+
+
+def legacy(user_id: str) -> list[dict]:
+    tiktoks = list(mongo.get_collection(CollectionName.TIKTOKS_AWEME).find({"author.unique_id": user_id}))
+    df = pd.DataFrame(tiktoks)
+    df = tiktok_service.normalize_column(df, "statistics")
+    df["create_time"] = pd.to_datetime(df["create_time"], unit="s").dt.tz_localize("UTC").dt.tz_convert("America/Mexico_City").dt.tz_localize(None)
+    df["cat_hour"] = df["create_time"].dt.hour
+    df["cat_day_of_week"] = df["create_time"].dt.day_name()
+    interactions = sum(df[f"statistics_{name}"] for name in tiktok_columns.ENGAGEMENT_STATISTICS)
+    df["statistics_engagement"] = interactions / df["statistics_play_count"]
+    columns = ["aweme_id", *[f"statistics_{name}" for name in tiktok_columns.STATISTICS], "statistics_engagement", "create_time", "cat_hour", "cat_day_of_week"]
+    return df[columns].to_dict(orient="records")
+
+
+def measure(label: str, run: callable, rounds: int, total: int) -> None:
+    timings = []
+    peaks = []
+    for _ in range(rounds):
+        tracemalloc.start()
+        start = time.perf_counter()
+        run(AUTHOR)
+        timings.append((time.perf_counter() - start) * 1000)
+        peaks.append(tracemalloc.get_traced_memory()[1] / 1024 / 1024)
+        tracemalloc.stop()
+    per_10k = 10_000 / total
+    print(f"{label:>14} | docs {total:>7} | median {statistics.median(timings):9.1f} ms ({statistics.median(timings) * per_10k:8.1f} ms/10k) | peak {max(peaks):8.1f} MiB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=10_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    seed(args.docs)
+    measure("legacy", legacy, args.rounds, args.docs)
+    measure("pymongoarrow", tiktok_service.get_data_from_tiktoks, args.rounds, args.docs)
+    print(f"arrow memory pool peak {pa.default_memory_pool().max_memory() / 1024 / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
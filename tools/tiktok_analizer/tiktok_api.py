@@ -0,0 +1,66 @@
+"""TikTok feed API requests, without storage or database dependencies so the batch extractor stays light"""
+
+import json
+import logging
+
+import httpx
+import requests
+
+REQUEST_TIMEOUT_SECONDS = 20
+RATE_LIMITED = "ratelimited"
+
+
+def get_id_video(url: str) -> str:
+    """Extract video ID from TikTok URL"""
+    print("Getting id video")
+    if "/t/" in url:
+        # Handle redirects for /t/ URLs if needed
+        response = requests.get(url, allow_redirects=True)
+        url = response.url
+
+    video_identifier = "/video/"
+    photo_identifier = "/photo/"
+
+    if photo_identifier in url:
+        id_video = url[url.find(photo_identifier) + len(photo_identifier) : url.find(photo_identifier) + len(photo_identifier) + 19]
+    elif video_identifier in url:
+        id_video = url[url.find(video_identifier) + len(video_identifier) : url.find(video_identifier) + len(video_identifier) + 19]
+    else:
+        raise ValueError("URL format not recognized")
+
+    # Clean up ID if it contains query parameters
+    if "?" in id_video:
+        id_video = id_video[: id_video.find("?")]
+
+    return id_video
+
+
+def get_api_url(id_video: str) -> str:
+    return f"https://api22-normal-c-alisg.tiktokv.com/aweme/v1/feed/?aweme_id={id_video}&iid=7318518857994389254&device_id=7318517321748022790&channel=googleplay&app_name=musical_ly&version_code=300904&device_platform=android&device_type=ASUS_Z01QD&version=9"
+
+
+def parse_feed_response(status_code: int, text: str, aweme_id: str | None = None) -> tuple[dict | None, str]:
+    """Returns (aweme, status), status is "ok", RATE_LIMITED, "not_found" or "error". The feed answers a deleted or
+    private video with other videos, with aweme_id only that video is "ok" and a list without it is "not_found" """
+    if status_code == 429 or "ratelimit triggered" in text:
+        return None, RATE_LIMITED
+    try:
+        res = json.loads(text)
+    except json.JSONDecodeError as err:
+        logging.error(f"Error parsing JSON: {err}")
+        logging.error(f"Response body: {text}")
+        return None, "error"
+    awemes = [aweme for aweme in res.get("aweme_list") or [] if aweme_id is None or aweme.get("aweme_id") == aweme_id]
+    if not awemes:
+        return None, "not_found"
+    return awemes[0], "ok"
+
+
+async def fetch_data(client: httpx.AsyncClient, id_video: str) -> tuple[dict | None, str]:
+    """One feed request with a shared client (connection pool), network errors are status "error" """
+    try:
+        response = await client.request("OPTIONS", get_api_url(id_video))
+    except httpx.HTTPError as e:
+        logging.error(f"Error fetching video {id_video}: {e}")
+        return None, "error"
+    return parse_feed_response(response.status_code, response.text, id_video)
@@ -0,0 +1,255 @@
+"""Batch extraction of TikTok metadata, as fast as the API allows
+
+Workers share one httpx.AsyncClient (a connection pool) and take a token from an AdaptiveTokenBucket before every
+request. The bucket works like TCP congestion control: every success adds a bit of rate, a "ratelimit triggered"
+answer halves it and pauses every worker for a cooldown. Rate limited and failed videos are retried later in the same
+run, after max_attempts they go to the Mongo retry queue (tiktok_retry_repository) and the next run takes the due
+ones first. Payloads are saved with the idempotent ingest in chunks of save_batch_size.
+
+    summary = await tiktok_batch_extractor.extract_urls(urls, concurrency=8, on_progress=print)
+"""
+
+import asyncio
+import logging
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass, field
+
+import httpx
+
+from app.video_analizer.repositories import tiktok_ingest_repository, tiktok_retry_repository
+from tools.tiktok_analizer import tiktok_api
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveTokenBucket:
+    """Token bucket with additive increase / multiplicative decrease of the rate (tokens per second)"""
+
+    def __init__(  # noqa: PLR0913
+        self,
+        rate: float = 2.0,
+        min_rate: float = 0.2,
+        max_rate: float = 20.0,
+        burst: int = 4,
+        increase: float = 0.05,
+        cooldown_seconds: float = 10.0,
+    ) -> None:
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.cooldown_seconds = cooldown_seconds
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        async with self._lock:  # one waiter at a time keeps the order fair
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def on_success(self) -> None:
+        self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_rate_limited(self) -> None:
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = 0
+        self.paused_until = max(self.paused_until, time.monotonic() + self.cooldown_seconds)
+
+
+@dataclass
+class ExtractionProgress:
+    total: int = 0
+    done: int = 0
+    saved: int = 0
+    unchanged: int = 0
+    not_found: int = 0
+    rate_limited: int = 0
+    queued_for_retry: int = 0
+    rate: float = 0.0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def as_dict(self) -> dict:
+        return asdict(self) | {"elapsed": round(self.elapsed, 1), "rate": round(self.rate, 2)}
+
+
+@dataclass
+class _Job:
+    video_id: str
+    url: str | None
+    attempts: int = 0
+
+
+def get_video_id(url: str) -> str | None:
+    """Only /@user/video/<id> urls, short urls need a redirect and are resolved by get_titktok_video_data"""
+    try:
+        return tiktok_api.get_id_video(url) if "/t/" not in url else None
+    except ValueError:
+        return None
+
+
+def collect_jobs(urls: list[str], retries: list[dict]) -> dict[str, _Job]:
+    """One job per video id, the due videos of the retry queue come after the urls"""
+    jobs: dict[str, _Job] = {}
+    for url in urls:
+        video_id = get_video_id(url)
+        if video_id:
+            jobs.setdefault(video_id, _Job(video_id, url))
+        else:
+            logger.warning("skipping tiktok url without video id: %s", url)
+    for retry in retries:
+        jobs.setdefault(retry["_id"], _Job(retry["_id"], retry.get("url")))
+    return jobs
+
+
+class _BatchRun:
+    """State of one extract_urls call, shared by its workers"""
+
+    def __init__(  # noqa: PLR0913
+        self,
+        jobs: dict[str, _Job],
+        bucket: AdaptiveTokenBucket,
+        max_attempts: int,
+        save_batch_size: int,
+        on_progress: Callable[[dict], None] | None,
+        progress_every: int,
+    ) -> None:
+        self.jobs = jobs
+        self.bucket = bucket
+        self.max_attempts = max_attempts
+        self.save_batch_size = save_batch_size
+        self.on_progress = on_progress
+        self.progress_every = progress_every
+        self.progress = ExtractionProgress(total=len(jobs))
+        self.queue: asyncio.Queue[_Job] = asyncio.Queue()
+        for job in jobs.values():
+            self.queue.put_nowait(job)
+        self.pending: list[dict] = []
+        self.succeeded: list[str] = []
+        self.failed: dict[str, tuple[_Job, str]] = {}
+        self._save_lock = asyncio.Lock()
+
+    def report(self) -> None:
+        self.progress.rate = self.bucket.rate
+        if self.on_progress:
+            self.on_progress(self.progress.as_dict())
+        else:
+            logger.info("tiktok extraction %s", self.progress.as_dict())
+
+    async def flush(self) -> None:
+        async with self._save_lock:
+            batch, self.pending = self.pending, []
+            if not batch:
+                return
+            try:
+                summary = await asyncio.to_thread(tiktok_ingest_repository.ingest_awemes, batch)
+            except Exception:
+                logger.exception("error saving %s tiktoks, queued for retry", len(batch))
+                self.failed.update({aweme["aweme_id"]: (self.jobs[aweme["aweme_id"]], "save_error") for aweme in batch if aweme.get("aweme_id") in self.jobs})
+                return
+            self.progress.saved += summary["inserted"] + summary["updated"]
+            self.progress.unchanged += summary["unchanged"]
+
+    async def finish(self) -> None:
+        self.progress.done += 1
+        if self.progress.done % self.progress_every == 0:
+            self.report()
+        if len(self.pending) >= self.save_batch_size:
+            await self.flush()
+
+    async def process(self, job: _Job, http: httpx.AsyncClient) -> None:
+        await self.bucket.acquire()
+        data, status = await tiktok_api.fetch_data(http, job.video_id)
+        if status in ("ok", "not_found"):
+            if status == "ok":
+                self.bucket.on_success()
+                self.pending.append(data)
+            else:
+                self.progress.not_found += 1  # deleted or private, nothing to retry
+            self.succeeded.append(job.video_id)
+            await self.finish()
+            return
+        if status == tiktok_api.RATE_LIMITED:
+            self.progress.rate_limited += 1
+            self.bucket.on_rate_limited()
+        job.attempts += 1
+        if job.attempts < self.max_attempts:
+            self.queue.put_nowait(job)
+        else:
+            self.failed[job.video_id] = (job, status)
+            await self.finish()
+
+    async def worker(self, http: httpx.AsyncClient) -> None:
+        while True:
+            job = await self.queue.get()
+            try:
+                await self.process(job, http)
+            except Exception:
+                logger.exception("error extracting tiktok %s", job.video_id)
+                self.failed[job.video_id] = (job, "error")
+                await self.finish()
+            finally:
+                self.queue.task_done()
+
+    async def run(self, http: httpx.AsyncClient, concurrency: int) -> None:
+        workers = [asyncio.create_task(self.worker(http)) for _ in range(max(1, concurrency))]
+        try:
+            await self.queue.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        await self.flush()
+
+    async def save_retries(self) -> None:
+        """Failed videos go to the retry queue, the ones that succeeded leave it"""
+        for job, status in self.failed.values():
+            await asyncio.to_thread(tiktok_retry_repository.enqueue, job.video_id, job.url, status, None, job.attempts)
+        self.progress.queued_for_retry = len(self.failed)
+        await asyncio.to_thread(tiktok_retry_repository.remove, [video_id for video_id in self.succeeded if video_id not in self.failed])
+
+
+async def extract_urls(  # noqa: PLR0913
+    urls: list[str],
+    concurrency: int = 8,
+    max_attempts: int = 3,
+    save_batch_size: int = 100,
+    include_retries: bool = True,
+    bucket: AdaptiveTokenBucket | None = None,
+    on_progress: Callable[[dict], None] | None = None,
+    progress_every: int = 50,
+    client: httpx.AsyncClient | None = None,
+) -> dict:
+    retries = await asyncio.to_thread(tiktok_retry_repository.get_due) if include_retries else []
+    jobs = collect_jobs(urls, retries)
+    batch = _BatchRun(jobs, bucket or AdaptiveTokenBucket(), max_attempts, save_batch_size, on_progress, progress_every)
+    own_client = client is None
+    http = client or httpx.AsyncClient(timeout=tiktok_api.REQUEST_TIMEOUT_SECONDS, limits=httpx.Limits(max_connections=concurrency))
+    try:
+        await batch.run(http, concurrency)
+    finally:
+        if own_client:
+            await http.aclose()
+
+    await batch.save_retries()
+    batch.report()
+    return batch.progress.as_dict()
@@ -1,13 +1,16 @@
-import json
 import logging
 import os
 from typing import TypedDict, Union
 
+import httpx
 import requests
+from pymongo.errors import PyMongoError
 
-from app.modules.mongo.mongo import db
+from app.modules.execution import executors
 from app.storage import storage
 from app.storage.storage_models import CloudStorageDataDict
+from app.video_analizer.repositories import tiktok_ingest_repository, tiktok_retry_repository
+from tools.tiktok_analizer import tiktok_api
 
 
 class VideoSourceData(TypedDict):
@@ -16,38 +19,6 @@ class VideoSourceData(TypedDict):
     id: str
 
 
-def log_retry(url: str) -> None:
-    """Log URL to retry.txt when rate limit is triggered"""
-    print("Logging retry")
-    with open("retry.txt", "a") as f:
-        f.write(f"{url}\n")
-
-
-def get_id_video(url: str) -> str:
-    """Extract video ID from TikTok URL"""
-    print("Getting id video")
-    if "/t/" in url:
-        # Handle redirects for /t/ URLs if needed
-        response = requests.get(url, allow_redirects=True)
-        url = response.url
-
-    video_identifier = "/video/"
-    photo_identifier = "/photo/"
-
-    if photo_identifier in url:
-        id_video = url[url.find(photo_identifier) + len(photo_identifier) : url.find(photo_identifier) + len(photo_identifier) + 19]
-    elif video_identifier in url:
-        id_video = url[url.find(video_identifier) + len(video_identifier) : url.find(video_identifier) + len(video_identifier) + 19]
-    else:
-        raise ValueError("URL format not recognized")
-
-    # Clean up ID if it contains query parameters
-    if "?" in id_video:
-        id_video = id_video[: id_video.find("?")]
-
-    return id_video
-
-
 def _parse_media_urls(aweme: dict, watermark: bool = False) -> tuple[str, list]:
     """Extract media URLs from aweme object"""
     url_media = ""
@@ -77,24 +48,13 @@ def _parse_media_urls(aweme: dict, watermark: bool = False) -> tuple[str, list]:
     return url_media, image_urls
 
 
-async def request_data(id_video: str) -> dict:
-    api_url = f"https://api22-normal-c-alisg.tiktokv.com/aweme/v1/feed/?aweme_id={id_video}&iid=7318518857994389254&device_id=7318517321748022790&channel=googleplay&app_name=musical_ly&version_code=300904&device_platform=android&device_type=ASUS_Z01QD&version=9"
-
-    try:
-        response = requests.options(api_url)
-        try:
-            res = json.loads(response.text)
-        except json.JSONDecodeError as err:
-            logging.error(f"Error parsing JSON: {err}")
-            logging.error(f"Response body: {response.text}")
-            if "ratelimit triggered" in response.text:
-                log_retry(api_url)
-            return None
-        tiktok_data = res["aweme_list"][0]
-        return tiktok_data
-    except Exception as e:
-        logging.error(f"Error fetching video: {e}")
-        return None
+async def request_data(id_video: str, url: str | None = None) -> dict | None:
+    """Single video request, a rate limited video is queued in the retry queue for the batch extractor"""
+    async with httpx.AsyncClient(timeout=tiktok_api.REQUEST_TIMEOUT_SECONDS) as client:
+        tiktok_data, status = await tiktok_api.fetch_data(client, id_video)
+    if status == tiktok_api.RATE_LIMITED:
+        await executors.run_io(tiktok_retry_repository.enqueue, id_video, url, tiktok_api.RATE_LIMITED)
+    return tiktok_data
 
 
 async def get_titktok_video_data(url: str, watermark: bool = False) -> dict:
@@ -113,37 +73,23 @@ async def get_titktok_video_data(url: str, watermark: bool = False) -> dict:
             'id': str  # Video/Post ID
         }
     """
-    id_video = get_id_video(url)
+    # short /t/ urls are resolved with a blocking redirect request
+    id_video = await executors.run_io(tiktok_api.get_id_video, url)
     print("Getting api url", id_video)
 
-    try:
-        tiktok_data = await request_data(id_video)
-        save_in_db(tiktok_data)
-
-        url_media, image_urls = _parse_media_urls(tiktok_data, watermark)
-        return {"url": url_media, "images": image_urls, "id": id_video}, tiktok_data
-
-    except Exception as e:
-        logging.error(f"Error fetching video: {e}")
+    tiktok_data = await request_data(id_video, url)
+    if not tiktok_data:
+        logging.error(f"No tiktok data for video {id_video}")
         return None
 
-
-def remove_from_retry(url: str) -> None:
-    """Remove a URL from retry.txt after successful download"""
     try:
-        print("Removing from retry")
-        if not os.path.exists("retry.txt"):
-            return
-
-        with open("retry.txt") as f:
-            urls = f.read().splitlines()
+        await executors.run_io(save_in_db, tiktok_data)
+    except PyMongoError:
+        # the analysis can go on without the stored payload, but the failure must be visible
+        logging.exception(f"Error saving tiktok data of video {id_video}")
 
-        urls = [u for u in urls if u != url]
-
-        with open("retry.txt", "w") as f:
-            f.write("\n".join(urls))
-    except Exception as e:
-        logging.error(f"Error removing URL from retry file: {e}")
+    url_media, image_urls = _parse_media_urls(tiktok_data, watermark)
+    return {"url": url_media, "images": image_urls, "id": id_video}, tiktok_data
 
 
 def download_video(data: dict, folder: str = None, to_memory: bool = False) -> Union[None, bytes]:
@@ -233,14 +179,16 @@ async def download_tiktok_media(data: VideoSourceData) -> bytes | None:
             print("There are images, Not support for images yet.")
             return None
         elif data["url"]:
-            bytes_video = download_video(data, None, to_memory=True)
-            if isinstance(bytes_video, bytes):
-                return bytes_video
+            async with httpx.AsyncClient(timeout=tiktok_api.REQUEST_TIMEOUT_SECONDS, follow_redirects=True) as client:
+                response = await client.get(data["url"])
+            response.raise_for_status()
+            logging.info("Video downloaded to memory successfully")
+            return response.content
         else:
             logging.error("No media URL found in data")
             return None
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logging.error(f"Error downloading media: {e}")
         raise
     except Exception as e:
@@ -260,7 +208,7 @@ async def upload_media_to_storage(storage_ref: str, media_bytes: bytes) -> Cloud
         CloudStorageDataDict | None: Storage data if upload successful, None otherwise
     """
     try:
-        storage_data = storage.upload_bytes_to_ref(storage_ref, media_bytes)
+        storage_data = await executors.run_io(storage.upload_bytes_to_ref, storage_ref, media_bytes)
         print("Storage data", storage_data)
         return storage_data
     except Exception as e:
@@ -293,16 +241,25 @@ async def download_video_and_upload_to_storage(data: VideoSourceData) -> tuple[b
     return media_bytes, storage_data
 
 
-def save_in_db(data: dict) -> str | None:
+def save_in_db(data: dict) -> tiktok_ingest_repository.IngestSummary:
     """
-    Save media information to the database
+    Save media information to the database, the same video saved again updates its document (or is skipped if the
+    payload did not change)
 
     Args:
         data (dict): Dictionary containing media information
     """
-    try:
-        result = db["tiktoks_aweme"].insert_one(data)
-        return result.inserted_id
-    except Exception as e:
-        logging.error(f"Error saving tiktok data skipping: {e}")
-        return None
+    return save_many_in_db([data])
+
+
+def save_many_in_db(items: list[dict]) -> tiktok_ingest_repository.IngestSummary:
+    """
+    Upsert many media payloads in one bulk write, unordered so one bad payload does not stop the rest
+
+    Args:
+        items (list[dict]): Media information as returned by request_data, None items are skipped
+    """
+    summary = tiktok_ingest_repository.ingest_awemes(items)
+    for error in summary["errors"]:
+        logging.error(f"Error saving tiktok data skipping: {error['message']}")
+    return summary